@@ -34,12 +34,106 @@ class Settings:
 
     # ── Groq (LLM Inference) ─────────────────────────────────────────────────
     GROQ_KEY: str = os.getenv("GROQ_API_KEY", "")
+    # Optional comma-separated key pool; falls back to the single GROQ_API_KEY
+    GROQ_KEYS: list = [
+        k.strip() for k in os.getenv("GROQ_API_KEYS", "").split(",") if k.strip()
+    ] or [os.getenv("GROQ_API_KEY", "")]
 
     # ── AI Model Names ────────────────────────────────────────────────────────
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     CONSULTANT_MODEL: str = "llama-3.3-70b-versatile"   # Detailed, accurate
     WINGMAN_MODEL: str = "llama-3.1-8b-instant"          # Fast, low-latency
 
+    # ── Consultant Routing ────────────────────────────────────────────────────
+    # Send simple look-up questions to WINGMAN_MODEL, escalate to CONSULTANT_MODEL
+    CONSULTANT_ROUTING_ENABLED: bool = (
+        os.getenv("CONSULTANT_ROUTING_ENABLED", "true").lower() == "true"
+    )
+
+    # ── Wingman Latency ───────────────────────────────────────────────────────
+    # "speculative" starts advice on last turn's context while fresh context loads
+    WINGMAN_LATENCY_MODE: str = os.getenv("WINGMAN_LATENCY_MODE", "standard")
+    WINGMAN_SPECULATION_MIN_OVERLAP: float = float(
+        os.getenv("WINGMAN_SPECULATION_MIN_OVERLAP", "0.6")
+    )
+
+    # ── LLM Resilience ────────────────────────────────────────────────────────
+    LLM_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+    LLM_BREAKER_RESET_SECONDS: float = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "20"))
+
+    # ── LLM Backend ───────────────────────────────────────────────────────────
+    # "groq" (default) or "fake" — deterministic in-process stand-in for load tests
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "groq")
+    FAKE_LLM_LATENCY_MS: float = float(os.getenv("FAKE_LLM_LATENCY_MS", "150"))
+    FAKE_LLM_LATENCY_DIST: str = os.getenv("FAKE_LLM_LATENCY_DIST", "lognormal")  # fixed | uniform | lognormal
+    FAKE_LLM_LATENCY_SIGMA: float = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5"))
+    FAKE_LLM_TOKEN_MS: float = float(os.getenv("FAKE_LLM_TOKEN_MS", "15"))
+    FAKE_LLM_ERROR_RATE: float = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+    FAKE_LLM_RATE_LIMIT_RATE: float = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+    FAKE_LLM_SEED: int = int(os.getenv("FAKE_LLM_SEED", "42"))
+
+    # ── LLM Client Pool ───────────────────────────────────────────────────────
+    LLM_KEY_STRATEGY: str = os.getenv("LLM_KEY_STRATEGY", "least_loaded")  # or round_robin
+    LLM_MAX_CONNECTIONS_PER_KEY: int = int(os.getenv("LLM_MAX_CONNECTIONS_PER_KEY", "20"))
+    LLM_KEEPALIVE_SECONDS: float = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+    # ── Session Log Writer ────────────────────────────────────────────────────
+    # Buffer session_logs / sentiment_logs rows and bulk-insert them off-request
+    SESSION_LOG_ASYNC: bool = os.getenv("SESSION_LOG_ASYNC", "true").lower() == "true"
+    SESSION_LOG_QUEUE_SIZE: int = int(os.getenv("SESSION_LOG_QUEUE_SIZE", "5000"))
+    SESSION_LOG_BATCH_SIZE: int = int(os.getenv("SESSION_LOG_BATCH_SIZE", "200"))
+    SESSION_LOG_FLUSH_MS: float = float(os.getenv("SESSION_LOG_FLUSH_MS", "250"))
+    # Per-session in-memory transcript (turns) and how many sessions to keep
+    TRANSCRIPT_BUFFER_TURNS: int = int(os.getenv("TRANSCRIPT_BUFFER_TURNS", "2000"))
+    TRANSCRIPT_BUFFER_SESSIONS: int = int(os.getenv("TRANSCRIPT_BUFFER_SESSIONS", "1000"))
+    # How often running session metrics are upserted into session_analytics
+    SESSION_METRICS_FLUSH_SECONDS: float = float(os.getenv("SESSION_METRICS_FLUSH_SECONDS", "5"))
+    # End-of-session analytics jobs: concurrent jobs and attempts per job
+    ANALYTICS_JOB_WORKERS: int = int(os.getenv("ANALYTICS_JOB_WORKERS", "2"))
+    ANALYTICS_JOB_ATTEMPTS: int = int(os.getenv("ANALYTICS_JOB_ATTEMPTS", "3"))
+    # Coaching reports: transcript window size, concurrent window calls, and
+    # how much window-note text the final (detailed model) call may take
+    COACHING_WINDOW_CHARS: int = int(os.getenv("COACHING_WINDOW_CHARS", "6000"))
+    COACHING_MAP_CONCURRENCY: int = int(os.getenv("COACHING_MAP_CONCURRENCY", "4"))
+    COACHING_REDUCE_MAX_CHARS: int = int(os.getenv("COACHING_REDUCE_MAX_CHARS", "24000"))
+    # Per-user consultant history / session summary cache
+    USER_CONTEXT_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CONTEXT_CACHE_TTL_SECONDS", "300"))
+    USER_CONTEXT_CACHE_MAX_USERS: int = int(os.getenv("USER_CONTEXT_CACHE_MAX_USERS", "2000"))
+
+    # ── Live Session State ────────────────────────────────────────────────────
+    MAX_LIVE_SESSIONS: int = int(os.getenv("MAX_LIVE_SESSIONS", "500"))
+    # Idle time (since the last wingman turn) before a live session expires
+    SESSION_TTL_HOURS: float = float(os.getenv("SESSION_TTL_HOURS", "6"))
+    # Upper bound on how long the expiry scheduler sleeps between checks
+    SESSION_EXPIRY_MAX_SLEEP_S: float = float(os.getenv("SESSION_EXPIRY_MAX_SLEEP_S", "60"))
+    # "memory" (per-process) or "redis" (shared across workers; needs `redis`)
+    SESSION_STATE_BACKEND: str = os.getenv("SESSION_STATE_BACKEND", "memory")
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    # ── Entity Name Index ─────────────────────────────────────────────────────
+    # Resident per-user canonical-name index for fuzzy dedup; reloaded after the
+    # TTL so entities written by other workers are picked up
+    ENTITY_INDEX_TTL_SECONDS: float = float(os.getenv("ENTITY_INDEX_TTL_SECONDS", "600"))
+    ENTITY_INDEX_MAX_USERS: int = int(os.getenv("ENTITY_INDEX_MAX_USERS", "500"))
+    # "lexical" (trigram name index only) or "embedding" (then cached entity-name
+    # embeddings + lexical features for names the lexical match misses)
+    ENTITY_RESOLUTION_MODE: str = os.getenv("ENTITY_RESOLUTION_MODE", "lexical")
+    ENTITY_EMBEDDING_THRESHOLD: float = float(os.getenv("ENTITY_EMBEDDING_THRESHOLD", "0.7"))
+    # Weights of semantic, trigram and token-containment similarity
+    ENTITY_EMBEDDING_WEIGHTS: str = os.getenv("ENTITY_EMBEDDING_WEIGHTS", "0.45,0.25,0.30")
+    # Roleplay target context (entity + attributes + relations), per entity
+    ENTITY_CONTEXT_CACHE_TTL_SECONDS: float = float(os.getenv("ENTITY_CONTEXT_CACHE_TTL_SECONDS", "1800"))
+    ENTITY_CONTEXT_CACHE_MAX_ENTITIES: int = int(os.getenv("ENTITY_CONTEXT_CACHE_MAX_ENTITIES", "1000"))
+    # How often aggregated mention_count / last_seen_at increments are written
+    ENTITY_MENTION_FLUSH_SECONDS: float = float(os.getenv("ENTITY_MENTION_FLUSH_SECONDS", "2"))
+    # Persist extractions with set-based requests instead of per-row round-trips
+    ENTITY_BULK_PERSIST: bool = os.getenv("ENTITY_BULK_PERSIST", "true").lower() == "true"
+    # Bulk writes go through the persist_extraction SQL function (one atomic call);
+    # falls back to per-table requests while the function is not deployed
+    ENTITY_PERSIST_RPC: bool = os.getenv("ENTITY_PERSIST_RPC", "true").lower() == "true"
+
     # ── Server ────────────────────────────────────────────────────────────────
     HOST: str = "0.0.0.0"
     PORT: int = 8000
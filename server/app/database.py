@@ -18,6 +18,12 @@ def _create_supabase_client() -> Client:
     )
 
 
+def is_missing_function(error: Exception) -> bool:
+    """PostgREST's "function not found" (PGRST202 / 42883), as opposed to a failed call."""
+    text = str(error)
+    return "PGRST202" in text or "42883" in text or "Could not find the function" in text
+
+
 # Module-level singleton — import `db` anywhere
 try:
     db: Client = _create_supabase_client()
@@ -4,7 +4,7 @@ Mounts all routers, configures CORS, rate-limiting, and background tasks.
 """
 
 import asyncio
-from datetime import datetime, timedelta
+import time
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -15,6 +15,7 @@ from app.config import settings
 from app.utils.rate_limit import limiter
 
 from app.routes import health, sessions, consultant, voice, analytics, entities
+from app.services import analytics_svc, entity_svc, session_svc, session_state
 
 # ── FastAPI App ───────────────────────────────────────────────────────────────
 
@@ -61,35 +62,38 @@ app.include_router(v1)
 
 # ── Background Cleanup ───────────────────────────────────────────────────────
 
-_SESSION_TTL_HOURS = 6
-
-async def _cleanup_stale_sessions():
-    """Every 30 min, purge sessions older than TTL from in-memory state."""
+async def _expire_idle_sessions():
+    """Sleep until the next live session's idle TTL runs out, then expire only the due ones."""
     while True:
-        await asyncio.sleep(30 * 60)
-        cutoff = datetime.now() - timedelta(hours=_SESSION_TTL_HOURS)
-        stale = [
-            sid
-            for sid, ts in sessions.SESSION_TIMESTAMPS.items()
-            if ts < cutoff
-        ]
-        for sid in stale:
-            sessions.SESSION_TIMESTAMPS.pop(sid, None)
-            sessions.TURN_COUNTERS.pop(sid, None)
-            sessions.SESSION_METADATA.pop(sid, None)
-            for k, v in list(sessions.LIVE_SESSIONS.items()):
-                if v == sid:
-                    del sessions.LIVE_SESSIONS[k]
-        if stale:
-            print(f"🧹 TTL cleanup: removed {len(stale)} stale session(s)")
+        deadline = session_state.next_expiry()
+        delay = settings.SESSION_EXPIRY_MAX_SLEEP_S
+        if deadline is not None:
+            delay = min(max(deadline - time.time(), 0.05), delay)
+        await asyncio.sleep(delay)
+        try:
+            # Expiry hooks flush logs / graphs, so keep them off the event loop
+            expired = await asyncio.to_thread(session_state.expire_due)
+        except Exception as e:
+            print(f"❌ Session expiry error: {e}")
+            continue
+        if expired:
+            print(f"🧹 TTL expiry: released {len(expired)} idle session(s)")
 
 
 @app.on_event("startup")
 async def _start_cleanup_task():
-    asyncio.create_task(_cleanup_stale_sessions())
+    asyncio.create_task(_expire_idle_sessions())
     print("🚀 Bubbles Brain API v2.0 — Ready")
 
 
+@app.on_event("shutdown")
+async def _drain_session_logs():
+    """Finish analytics jobs, then write out buffered log rows and mention counts before exit."""
+    await asyncio.to_thread(analytics_svc.close)
+    await asyncio.to_thread(session_svc.close)
+    await asyncio.to_thread(entity_svc.close)
+
+
 # ── Direct Execution ──────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
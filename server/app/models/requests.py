@@ -37,6 +37,10 @@ class ConsultantRequest(BaseModel):
     session_id: Optional[str] = None
     mode: str = "consultant"
     persona: str = "casual"
+    latency_budget_ms: Optional[int] = Field(
+        None, ge=100, le=60000,
+        description="Soft end-to-end budget; tight budgets route to the 8B model",
+    )
 
 
 class BatchConsultantRequest(BaseModel):
@@ -55,6 +59,9 @@ class WingmanRequest(BaseModel):
     speaker_label: Optional[str] = None
     mode: str = Field("live_wingman", description="Session mode")
     persona: str = Field("casual", description="Persona tone")
+    latency_mode: Optional[str] = Field(
+        None, description="standard | speculative (defaults to server setting)"
+    )
 
 
 # ── Entity Endpoints ──────────────────────────────────────────────────────────
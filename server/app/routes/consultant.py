@@ -10,10 +10,10 @@ from typing import List
 from fastapi import APIRouter, Request
 from starlette.responses import StreamingResponse
 
-from app.config import settings
 from app.models.requests import ConsultantRequest, BatchConsultantRequest
-from app.services import graph_svc, vector_svc, brain_svc, session_svc, entity_svc
-from app.routes.sessions import SESSION_METADATA
+from app.services import graph_svc, vector_svc, brain_svc, session_svc, entity_svc, router_svc, session_state
+from app.services.brain_service import CONSULTANT_RETRY
+from app.utils.llm_stats import last_llm_call
 from app.utils.rate_limit import limiter
 from app.utils.text_sanitizer import sanitize_input
 
@@ -42,9 +42,8 @@ async def ask_consultant_endpoint(request: Request, req: ConsultantRequest):
         graph_svc.load_graph(req.user_id)
         return graph_svc.find_context(req.user_id, req.question, top_k=10)
 
-    target_entity_id = (
-        SESSION_METADATA.get(session_id, {}).get("target_entity_id") if session_id else None
-    )
+    record = session_state.get(session_id)
+    target_entity_id = record.target_entity_id if record else None
 
     def _entity_ctx():
         if target_entity_id:
@@ -62,16 +61,23 @@ async def ask_consultant_endpoint(request: Request, req: ConsultantRequest):
     if e_ctx:
         g_ctx = f"ROLEPLAY TARGET ENTITY CONTEXT:\n{e_ctx}\n\n" + g_ctx
 
-    # 2. Get answer
+    # 2. Route by complexity, then get answer
     safe_question = sanitize_input(req.question)
+    route = router_svc.route(
+        safe_question,
+        entity_hits=graph_svc.count_entity_hits(req.user_id, safe_question),
+        latency_budget_ms=req.latency_budget_ms,
+    )
     answer = brain_svc.ask_consultant(
         req.user_id, safe_question, h_ctx, g_ctx, v_ctx,
         session_summaries=s_ctx, mode=req.mode, persona=req.persona,
+        route=route, latency_budget_ms=req.latency_budget_ms,
     )
 
     # 3. Log Q&A
     session_svc.log_consultant_qa(
         req.user_id, req.question, answer, session_id=session_id,
+        llm_stats=last_llm_call("consultant"),
     )
 
     # 4. Save to memory + graph
@@ -102,9 +108,8 @@ async def ask_consultant_stream_endpoint(request: Request, req: ConsultantReques
         graph_svc.load_graph(req.user_id)
         return graph_svc.find_context(req.user_id, req.question, top_k=10)
 
-    target_entity_id = (
-        SESSION_METADATA.get(session_id, {}).get("target_entity_id") if session_id else None
-    )
+    record = session_state.get(session_id)
+    target_entity_id = record.target_entity_id if record else None
 
     def _entity_ctx():
         if target_entity_id:
@@ -126,6 +131,11 @@ async def ask_consultant_stream_endpoint(request: Request, req: ConsultantReques
     system_prompt = brain_svc._build_consultant_system_prompt(
         h_ctx, g_ctx, v_ctx, s_ctx, req.mode, req.persona,
     )
+    route = router_svc.route(
+        safe_question,
+        entity_hits=graph_svc.count_entity_hits(req.user_id, safe_question),
+        latency_budget_ms=req.latency_budget_ms,
+    )
 
     # Log user message immediately for Realtime
     session_svc.log_message(session_id, "user", safe_question)
@@ -137,14 +147,16 @@ async def ask_consultant_stream_endpoint(request: Request, req: ConsultantReques
     async def generate():
         full_response: List[str] = []
         try:
-            stream = await brain_svc.aclient.chat.completions.create(
-                messages=[
+            stream = await brain_svc.achat(
+                "consultant_stream",
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": _question},
                 ],
-                model=settings.CONSULTANT_MODEL,
+                route.model,
+                CONSULTANT_RETRY,
                 temperature=0.7,
-                max_tokens=800,
+                max_tokens=route.max_tokens,
                 stream=True,
             )
             async for chunk in stream:
@@ -166,18 +178,10 @@ async def ask_consultant_stream_endpoint(request: Request, req: ConsultantReques
         full_answer = "".join(full_response)
         if full_answer:
             try:
-                session_svc.log_message(_sid, "llm", full_answer)
-                from app.database import db as _db
-                _db.table("consultant_logs").insert(
-                    {
-                        "user_id": _uid,
-                        "question": _question,
-                        "answer": full_answer,
-                        "query": _question,
-                        "response": full_answer,
-                        "session_id": _sid,
-                    }
-                ).execute()
+                session_svc.log_consultant_qa(
+                    _uid, _question, full_answer, session_id=_sid,
+                    llm_stats=last_llm_call("consultant_stream"), log_question=False,
+                )
                 await vector_svc.save_memory(_uid, f"Q: {_question}\nA: {full_answer}")
                 graph_svc.save_graph(_uid)
             except Exception as e:
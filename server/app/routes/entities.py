@@ -22,39 +22,27 @@ async def ask_entity_endpoint(request: Request, req: EntityQueryRequest):
     user_id = req.user_id
     canonical = req.entity_name.strip().lower()
     try:
-        ent_res = db.table("entities").select(
-            "id, display_name, entity_type, description, mention_count"
-        ).eq("user_id", user_id).ilike("canonical_name", f"%{canonical}%").limit(1).execute()
-
-        if not ent_res.data:
+        # Entity from the cached per-user snapshot; memory search runs alongside
+        found, v_ctx = await asyncio.gather(
+            asyncio.to_thread(entity_svc.lookup_entity, user_id, req.entity_name),
+            asyncio.to_thread(vector_svc.search_memory, user_id, req.entity_name),
+        )
+        if not found:
             return {"answer": f"No info about '{req.entity_name}' yet.", "entity": None}
-        entity = ent_res.data[0]
-        eid = entity["id"]
-
-        attr_res = db.table("entity_attributes").select(
-            "attribute_key, attribute_value"
-        ).eq("entity_id", eid).execute()
-        attrs = "\n".join(f"  - {a['attribute_key']}: {a['attribute_value']}" for a in (attr_res.data or []))
-
-        rel_res = db.table("entity_relations").select("relation, target_id").eq("source_id", eid).execute()
-        rels = ""
-        if rel_res.data:
-            tids = list({r["target_id"] for r in rel_res.data})
-            tgt = db.table("entities").select("id, display_name").in_("id", tids).execute()
-            tmap = {t["id"]: t["display_name"] for t in (tgt.data or [])}
-            rels = "\n".join(f"  - {r['relation']}: {tmap.get(r['target_id'], r['target_id'])}" for r in rel_res.data)
+        entity = found["entity"]
+        attrs = "\n".join(f"  - {k}: {v}" for k, v in found["attributes"])
+        rels = "\n".join(f"  - {rel}: {target}" for rel, target in found["relations"])
 
         ctx = f"Entity: {entity.get('display_name', canonical)} ({entity['entity_type']})\nMentioned: {entity.get('mention_count',0)} time(s)\n"
         if entity.get("description"): ctx += f"Description: {entity['description']}\n"
         if attrs: ctx += f"Attributes:\n{attrs}\n"
         if rels: ctx += f"Relations:\n{rels}\n"
 
-        v_ctx = await asyncio.to_thread(vector_svc.search_memory, user_id, req.entity_name)
         prompt = f"You are Bubbles AI. Summarise what we know about '{entity.get('display_name', canonical)}' in 2-4 sentences using ONLY:\n{ctx}\nMEMORIES:\n{v_ctx}"
         try:
-            comp = brain_svc.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=settings.WINGMAN_MODEL, temperature=0.3, max_tokens=200)
+            comp = brain_svc.chat(
+                "ask_entity", [{"role": "user", "content": prompt}],
+                settings.WINGMAN_MODEL, temperature=0.3, max_tokens=200)
             answer = comp.choices[0].message.content.strip()
         except Exception:
             answer = f"Known facts:\n{ctx}"
@@ -83,6 +71,7 @@ async def delete_entity(entity_id: str):
         db.table("entity_relations").delete().eq("source_id", entity_id).execute()
         db.table("entity_relations").delete().eq("target_id", entity_id).execute()
         db.table("entities").delete().eq("id", entity_id).execute()
+        entity_svc.forget_entities([entity_id])
     return {"status": "deleted", "entity_id": entity_id}
 
 
@@ -7,7 +7,8 @@ from fastapi import APIRouter
 
 from app.config import settings
 from app.database import db
-from app.services import vector_svc
+from app.services import brain_svc, vector_svc
+from app.utils.metrics import metrics
 
 router = APIRouter()
 
@@ -58,7 +59,9 @@ def health_check():
 
     # 3. LLM (Groq) API key
     try:
-        if settings.GROQ_KEY and len(settings.GROQ_KEY) > 10:
+        if settings.LLM_BACKEND == "fake":
+            health_status["llm"] = "fake"
+        elif any(len(k) > 10 for k in settings.GROQ_KEYS):
             health_status["llm"] = "ok"
         else:
             health_status["llm"] = "no key"
@@ -72,3 +75,14 @@ def health_check():
         from starlette.responses import JSONResponse
         return JSONResponse(content=health_status, status_code=503)
     return health_status
+
+
+@router.get("/metrics")
+def metrics_snapshot():
+    """In-process counters/histograms plus per-model circuit breaker state."""
+    return {
+        "uptime": round(time.time() - _SERVER_START_TIME),
+        "llm_circuits": brain_svc.guard.snapshot(),
+        "llm_pool": brain_svc.pool.snapshot(),
+        **metrics.snapshot(),
+    }
@@ -5,46 +5,32 @@ Session routes — start, save, end, wingman transcript processing.
 import asyncio
 import json
 from datetime import datetime
-from typing import Dict, List
+from typing import AsyncIterator, List, Set
 
 from fastapi import APIRouter, Request
 from starlette.responses import StreamingResponse
 
+from app.config import settings
 from app.models.requests import (
     StartSessionRequest,
     SaveSessionRequest,
     EndSessionRequest,
     WingmanRequest,
 )
-from app.services import graph_svc, vector_svc, brain_svc, session_svc, entity_svc
+from app.services import (
+    graph_svc, vector_svc, brain_svc, session_svc, entity_svc, summary_svc, session_state,
+    analytics_svc,
+)
+from app.services.transcript_buffer import render_transcript
+from app.utils.llm_stats import last_llm_call
 from app.utils.rate_limit import limiter
+from app.utils.speculation import speculative_stream
 from app.utils.text_sanitizer import sanitize_input
 
 router = APIRouter()
 
-# ── In-memory state ───────────────────────────────────────────────────────────
-LIVE_SESSIONS: Dict[str, str] = {}       # user_id → session_id
-SESSION_TIMESTAMPS: Dict[str, datetime] = {}
-SESSION_METADATA: Dict[str, dict] = {}   # session_id → {is_ephemeral, persona, ...}
-TURN_COUNTERS: Dict[str, int] = {}
-_MAX_GLOBAL_SESSIONS = 500
-_SESSION_TTL_HOURS = 6
-
-
-# ── Helpers ───────────────────────────────────────────────────────────────────
-
-def _evict_if_over_capacity():
-    if len(SESSION_TIMESTAMPS) > _MAX_GLOBAL_SESSIONS:
-        sorted_sessions = sorted(SESSION_TIMESTAMPS.items(), key=lambda x: x[1])
-        to_remove = len(SESSION_TIMESTAMPS) - _MAX_GLOBAL_SESSIONS
-        for sid, _ in sorted_sessions[:to_remove]:
-            SESSION_TIMESTAMPS.pop(sid, None)
-            TURN_COUNTERS.pop(sid, None)
-            SESSION_METADATA.pop(sid, None)
-            for k, v in list(LIVE_SESSIONS.items()):
-                if v == sid:
-                    del LIVE_SESSIONS[k]
-        print(f"🧹 Evicted {to_remove} oldest session(s) from global state")
+# Live per-session state (ephemeral flag, roleplay target, turn count, last
+# context) lives in `session_state` — see app/services/session_state.py
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -63,53 +49,37 @@ async def start_session_endpoint(request: Request, req: StartSessionRequest):
         persona=req.persona,
     )
 
-    LIVE_SESSIONS[req.user_id] = session_id
-    SESSION_TIMESTAMPS[session_id] = datetime.now()
-    SESSION_METADATA[session_id] = {
-        "is_ephemeral": req.is_ephemeral,
-        "is_multiplayer": req.is_multiplayer,
-        "persona": req.persona,
-    }
-    if req.target_entity_id is not None:
-        SESSION_METADATA[session_id]["target_entity_id"] = req.target_entity_id
-
-    _evict_if_over_capacity()
+    # Registering evicts the least recently active sessions past capacity; their
+    # expiry hooks flush logs and graphs, so keep that off the event loop
+    await asyncio.to_thread(
+        session_state.create,
+        session_id,
+        req.user_id,
+        is_ephemeral=req.is_ephemeral,
+        is_multiplayer=req.is_multiplayer,
+        persona=req.persona,
+        target_entity_id=req.target_entity_id,
+    )
+    if req.target_entity_id:
+        # Warm the roleplay persona so the first turn makes no entity queries
+        asyncio.create_task(asyncio.to_thread(
+            entity_svc.get_entity_context, req.user_id, str(req.target_entity_id),
+        ))
     return {"session_id": session_id}
 
 
 # ══════════════════════════════════════════════════════════════════════════════
-# POST /process_transcript_wingman
+# Wingman pipeline helpers (shared by blocking + streaming endpoints)
 # ══════════════════════════════════════════════════════════════════════════════
 
-@router.post("/process_transcript_wingman")
-@limiter.limit("30/minute")
-async def process_transcript_wingman(request: Request, req: WingmanRequest):
-    """
-    Real-time wingman: log turn, generate advice, extract entities,
-    detect conflicts, extract events, save to memory.
-    """
-    user_id = req.user_id
-    transcript = sanitize_input(req.transcript)
-    session_id = req.session_id
-    speaker_role = req.speaker_role if req.speaker_role in ("user", "others") else "others"
-
-    is_ephemeral = SESSION_METADATA.get(session_id, {}).get("is_ephemeral", False)
-
-    # 0. Log incoming transcript
-    if session_id:
-        session_svc.log_message(
-            session_id, speaker_role, transcript,
-            speaker_label=req.speaker_label, is_ephemeral=is_ephemeral,
-        )
-
-    # 1. Load contexts in parallel
+async def _load_wingman_context(user_id: str, transcript: str, session_id: str):
+    """Fetch graph, vector and roleplay-entity context in parallel."""
     def _graph_ctx():
         graph_svc.load_graph(user_id)
         return graph_svc.find_context(user_id, transcript)
 
-    target_entity_id = (
-        SESSION_METADATA.get(session_id, {}).get("target_entity_id") if session_id else None
-    )
+    record = session_state.get(session_id)
+    target_entity_id = record.target_entity_id if record else None
 
     def _entity_ctx():
         if target_entity_id:
@@ -125,89 +95,290 @@ async def process_transcript_wingman(request: Request, req: WingmanRequest):
     if e_ctx:
         g_ctx = f"ROLEPLAY TARGET ENTITY CONTEXT:\n{e_ctx}\n\n" + g_ctx
 
-    # 2. Get advice (only for 'others' speech)
-    advice = "WAITING"
-    if speaker_role == "others":
-        advice = brain_svc.get_wingman_advice(
+    # Keep this turn's context as next turn's speculative starting point
+    if record is not None:
+        record.last_context = (g_ctx, v_ctx)
+    return g_ctx, v_ctx
+
+
+def _start_advice(
+    req: WingmanRequest, user_id: str, transcript: str, session_id: str,
+):
+    """
+    Kick off context loading and return (advice token stream, context task).
+    In speculative latency mode the stream starts immediately on last turn's
+    context and only restarts if the fresh context materially differs.
+    """
+    full_ctx = asyncio.ensure_future(
+        _load_wingman_context(user_id, transcript, session_id)
+    )
+
+    def _stream(g_ctx: str, v_ctx: str) -> AsyncIterator[str]:
+        return brain_svc.stream_wingman_advice(
             user_id, transcript, g_ctx, v_ctx, req.mode, req.persona,
         )
 
-    # 3. Log LLM advice
-    if session_id and advice and advice != "WAITING":
-        session_svc.log_message(session_id, "llm", advice, is_ephemeral=is_ephemeral)
+    latency_mode = req.latency_mode or settings.WINGMAN_LATENCY_MODE
+    record = session_state.get(session_id)
+    cached = record.last_context if record else None
+    if latency_mode == "speculative" and cached:
+        return (
+            speculative_stream(
+                "wingman", _stream, cached, full_ctx,
+                settings.WINGMAN_SPECULATION_MIN_OVERLAP,
+            ),
+            full_ctx,
+        )
+
+    async def _after_context():
+        g_ctx, v_ctx = await full_ctx
+        async for token in _stream(g_ctx, v_ctx):
+            yield token
+
+    return _after_context(), full_ctx
 
+
+async def _wingman_followups(
+    user_id: str, transcript: str, session_id: str, speaker_role: str, g_ctx: str,
+) -> AsyncIterator[tuple]:
+    """
+    Post-advice pipeline: extract entities, detect conflicts, extract events,
+    save to memory. Yields (event_name, payload) as each stage completes.
+    """
     # 4. Extract entities
-    extraction = brain_svc.extract_entities_full(transcript)
+    extraction = await asyncio.to_thread(brain_svc.extract_entities_full, transcript)
     new_rels = extraction.get("relations", [])
     if extraction.get("entities"):
         await asyncio.to_thread(
             entity_svc.persist_extraction, user_id, extraction, session_id,
         )
+    yield "entities", extraction
 
     # 5. Update graph + detect conflicts
+    conflicts: List[dict] = []
     if new_rels:
         graph_svc.update_local_graph(user_id, new_rels)
-        conflicts = brain_svc.detect_conflicts(new_rels, g_ctx)
+        conflicts = await asyncio.to_thread(brain_svc.detect_conflicts, new_rels, g_ctx)
         if conflicts:
             await asyncio.to_thread(entity_svc.save_conflicts, user_id, conflicts, session_id)
     graph_svc.save_graph(user_id)
+    yield "conflicts", conflicts
 
     # 6. Extract events
-    events = brain_svc.extract_events(transcript)
+    events = await asyncio.to_thread(brain_svc.extract_events, transcript)
     if events:
         await asyncio.to_thread(entity_svc.save_events, user_id, events, session_id)
+    yield "events", events
 
     # 7. Save to long-term memory
     await vector_svc.save_memory(user_id, f"{speaker_role.capitalize()}: {transcript}")
 
+
+# Strong references to fire-and-forget pipeline tasks until they finish
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _publish_followups(
+    user_id: str, transcript: str, session_id: str, speaker_role: str,
+    full_ctx: asyncio.Future, out: asyncio.Queue,
+):
+    """
+    Run the post-advice pipeline to completion as its own task, putting each
+    (event_name, payload) on `out` and None when done. A streaming client that
+    disconnects stops reading; the turn's entities, events and memory are
+    still saved.
+    """
+    try:
+        g_ctx, _ = await full_ctx
+        async for name, payload in _wingman_followups(
+            user_id, transcript, session_id, speaker_role, g_ctx,
+        ):
+            out.put_nowait((name, payload))
+        if session_id:
+            _count_turn_and_maybe_summarize(session_id)
+    except Exception as e:
+        print(f"❌ Wingman follow-ups error for session {session_id}: {e}")
+        out.put_nowait(("error", str(e)))
+    finally:
+        out.put_nowait(None)
+
+
+def _count_turn_and_maybe_summarize(session_id: str):
+    """Bump the turn counter; every 20 turns fire a background rolling summary."""
+    turns = session_state.bump_turn(session_id)
+    if not turns or turns % 20 != 0:
+        return
+    _sid = session_id
+
+    async def _rolling_summarize():
+        try:
+            # Only turns since the last roll are summarized
+            await asyncio.to_thread(summary_svc.roll, _sid)
+        except Exception as e:
+            print(f"❌ Rolling summarize error: {e}")
+
+    asyncio.create_task(_rolling_summarize())
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# POST /process_transcript_wingman
+# ══════════════════════════════════════════════════════════════════════════════
+
+@router.post("/process_transcript_wingman")
+@limiter.limit("30/minute")
+async def process_transcript_wingman(request: Request, req: WingmanRequest):
+    """
+    Real-time wingman: log turn, generate advice, extract entities,
+    detect conflicts, extract events, save to memory.
+    """
+    user_id = req.user_id
+    transcript = sanitize_input(req.transcript)
+    session_id = req.session_id
+    speaker_role = req.speaker_role if req.speaker_role in ("user", "others") else "others"
+
+    # Each turn pushes the session's idle expiry back
+    session_state.touch(session_id)
+    is_ephemeral = session_state.is_ephemeral(session_id)
+
+    # 0. Log incoming transcript
+    if session_id:
+        session_svc.log_message(
+            session_id, speaker_role, transcript,
+            speaker_label=req.speaker_label, is_ephemeral=is_ephemeral,
+        )
+
+    # 1–2. Load contexts in parallel, get advice (only for 'others' speech)
+    advice = "WAITING"
+    latency_mode = req.latency_mode or settings.WINGMAN_LATENCY_MODE
+    if speaker_role == "others" and latency_mode == "speculative":
+        tokens, full_ctx = _start_advice(req, user_id, transcript, session_id)
+        advice = "".join([t async for t in tokens]).strip() or "WAITING"
+        g_ctx, v_ctx = await full_ctx
+    else:
+        g_ctx, v_ctx = await _load_wingman_context(user_id, transcript, session_id)
+        if speaker_role == "others":
+            advice = brain_svc.get_wingman_advice(
+                user_id, transcript, g_ctx, v_ctx, req.mode, req.persona,
+            )
+
+    # 3. Log LLM advice
+    if session_id and advice and advice != "WAITING":
+        session_svc.log_message(
+            session_id, "llm", advice, is_ephemeral=is_ephemeral,
+            llm_stats=last_llm_call("wingman", "wingman_stream"),
+        )
+
+    # 4–7. Entities, conflicts, events, memory
+    async for _ in _wingman_followups(user_id, transcript, session_id, speaker_role, g_ctx):
+        pass
+
     # 8. Rolling summarization every 20 turns
     if session_id:
-        TURN_COUNTERS[session_id] = TURN_COUNTERS.get(session_id, 0) + 1
-        if TURN_COUNTERS[session_id] % 20 == 0:
-            _sid = session_id
-            _turn = TURN_COUNTERS[session_id]
-
-            async def _rolling_summarize():
-                from app.database import db as _db
-                try:
-                    logs_res = (
-                        _db.table("session_logs")
-                        .select("role, content")
-                        .eq("session_id", _sid)
-                        .order("created_at")
-                        .execute()
-                    )
-                    recent_rows = (logs_res.data or [])[-40:]
-                    partial_transcript = "\n".join(
-                        f"{r['role'].upper()}: {r['content']}" for r in recent_rows
-                    )
-                    if partial_transcript:
-                        rolling_summary = brain_svc.generate_summary(partial_transcript)
-                        if rolling_summary:
-                            prev_res = (
-                                _db.table("sessions")
-                                .select("summary")
-                                .eq("id", _sid)
-                                .execute()
-                            )
-                            prev_summary = ""
-                            if prev_res.data and prev_res.data[0].get("summary"):
-                                prev_summary = prev_res.data[0]["summary"]
-                            combined = (
-                                f"{prev_summary}\n---\n[Turn {_turn}] {rolling_summary}"
-                            ).strip()
-                            _db.table("sessions").update({"summary": combined}).eq(
-                                "id", _sid
-                            ).execute()
-                            print(f"🔄 Rolling summary appended at turn {_turn}")
-                except Exception as e:
-                    print(f"❌ Rolling summarize error: {e}")
-
-            asyncio.create_task(_rolling_summarize())
+        _count_turn_and_maybe_summarize(session_id)
 
     return {"advice": advice}
 
 
+# ══════════════════════════════════════════════════════════════════════════════
+# POST /process_transcript_wingman_stream  (SSE streaming)
+# ══════════════════════════════════════════════════════════════════════════════
+
+@router.post("/process_transcript_wingman_stream")
+@limiter.limit("30/minute")
+async def process_transcript_wingman_stream(request: Request, req: WingmanRequest):
+    """
+    Streaming wingman: advice tokens are pushed as soon as the 8B model emits
+    them, followed on the same SSE channel by `entities`, `conflicts` and
+    `events` payloads as the background pipeline finishes each stage.
+    """
+    user_id = req.user_id
+    transcript = sanitize_input(req.transcript)
+    session_id = req.session_id
+    speaker_role = req.speaker_role if req.speaker_role in ("user", "others") else "others"
+
+    # Each turn pushes the session's idle expiry back
+    session_state.touch(session_id)
+    is_ephemeral = session_state.is_ephemeral(session_id)
+
+    if session_id:
+        session_svc.log_message(
+            session_id, speaker_role, transcript,
+            speaker_label=req.speaker_label, is_ephemeral=is_ephemeral,
+        )
+
+    tokens, full_ctx = _start_advice(req, user_id, transcript, session_id)
+
+    def _sse(payload: dict) -> str:
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def generate():
+        advice_parts: List[str] = []
+        updates: asyncio.Queue = asyncio.Queue()
+        pipeline: List[asyncio.Task] = []
+
+        def _start_followups():
+            if not pipeline:
+                pipeline.append(_spawn(_publish_followups(
+                    user_id, transcript, session_id, speaker_role, full_ctx, updates,
+                )))
+
+        try:
+            if speaker_role == "others":
+                # Hold tokens back while they could still spell the "WAITING"
+                # sentinel, so the client never renders a partial "WAIT…".
+                held = ""
+                async for delta in tokens:
+                    advice_parts.append(delta)
+                    if held is None:
+                        yield _sse({"token": delta})
+                        continue
+                    held += delta
+                    if not "WAITING".startswith(held.lstrip()):
+                        yield _sse({"token": held})
+                        held = None
+
+            advice = "".join(advice_parts).strip() or "WAITING"
+            _start_followups()
+            yield _sse({"advice": advice})
+
+            if session_id and advice != "WAITING":
+                session_svc.log_message(
+                    session_id, "llm", advice, is_ephemeral=is_ephemeral,
+                    llm_stats=last_llm_call("wingman_stream"),
+                )
+
+            # Stream each stage while the client is connected
+            while True:
+                update = await updates.get()
+                if update is None:
+                    break
+                name, payload = update
+                yield _sse({name: payload})
+        except asyncio.CancelledError:
+            print(f"⚠️ Wingman stream cancelled for session {session_id}")
+            return
+        except Exception as e:
+            yield _sse({"error": str(e)})
+        finally:
+            # A disconnect mid-advice still runs the turn's pipeline
+            _start_followups()
+
+        yield _sse({"done": True, "session_id": session_id})
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 # POST /save_session
 # ══════════════════════════════════════════════════════════════════════════════
@@ -215,7 +386,7 @@ async def process_transcript_wingman(request: Request, req: WingmanRequest):
 @router.post("/save_session")
 @limiter.limit("10/minute")
 async def save_session_endpoint(request: Request, req: SaveSessionRequest):
-    """Save a completed session (no prior LIVE_SESSIONS entry)."""
+    """Save a completed session (no prior live session state)."""
     if req.is_ephemeral:
         return {"status": "success", "session_id": "ephemeral-skipped"}
 
@@ -274,28 +445,16 @@ async def save_session_endpoint(request: Request, req: SaveSessionRequest):
 @limiter.limit("10/minute")
 async def end_session_endpoint(request: Request, req: EndSessionRequest):
     """End an active session: summarize, mark completed, compute analytics."""
-    from app.routes.analytics import _compute_session_analytics
-    from app.database import db as _db
-
     try:
-        is_ephemeral = SESSION_METADATA.get(req.session_id, {}).get("is_ephemeral", False)
+        is_ephemeral = session_state.is_ephemeral(req.session_id)
 
         if is_ephemeral:
             session_svc.end_session(req.session_id, is_ephemeral=True)
         else:
-            logs_res = (
-                _db.table("session_logs")
-                .select("role, content")
-                .eq("session_id", req.session_id)
-                .order("created_at")
-                .execute()
-            )
-            full_transcript = "\n".join(
-                f"{r['role'].upper()}: {r['content']}"
-                for r in (logs_res.data or [])
-            )
-            summary = (
-                brain_svc.generate_summary(full_transcript) if full_transcript else ""
+            rows = await asyncio.to_thread(session_svc.transcript_rows, req.session_id)
+            full_transcript = render_transcript(rows)
+            summary = await asyncio.to_thread(
+                summary_svc.final_summary, req.session_id, full_transcript,
             )
             session_svc.end_session(req.session_id, summary=summary or None)
 
@@ -306,18 +465,13 @@ async def end_session_endpoint(request: Request, req: EndSessionRequest):
                 )
                 await vector_svc.save_memory(req.user_id, mem_content)
 
-        # Clean up in-memory state
-        for k, v in list(LIVE_SESSIONS.items()):
-            if v == req.session_id:
-                del LIVE_SESSIONS[k]
-        TURN_COUNTERS.pop(req.session_id, None)
-        SESSION_TIMESTAMPS.pop(req.session_id, None)
-        SESSION_METADATA.pop(req.session_id, None)
+        # Clean up in-memory state (remove hooks drop the rolling summary)
+        session_state.remove(req.session_id)
     except Exception as e:
         print(f"❌ end_session error: {e}")
         session_svc.end_session(req.session_id)
 
-    # Fire analytics in background
-    asyncio.create_task(_compute_session_analytics(req.session_id, req.user_id))
+    # Analytics job runs on the background pool (never on the event loop)
+    analytics_svc.submit(req.session_id, req.user_id)
 
     return {"status": "completed", "session_id": req.session_id}
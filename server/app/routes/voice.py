@@ -12,7 +12,8 @@ from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
 
 from app.config import settings
 from app.models.requests import VoiceCommandRequest, TokenRequest
-from app.services import graph_svc, vector_svc, brain_svc, session_svc
+from app.services import graph_svc, vector_svc, brain_svc, session_svc, router_svc
+from app.utils.llm_stats import last_llm_call
 from app.utils.rate_limit import limiter
 from app.utils.text_sanitizer import sanitize_input
 from livekit import api
@@ -66,12 +67,13 @@ async def voice_command(request: Request, req: VoiceCommandRequest):
             "5. 'general_chat' - User is just chatting or the intent is unclear\n\n"
             'Return JSON ONLY: {"intent": "<intent>", "query": "<extracted question if ask_consultant, else empty>"}'
         )
-        completion = brain_svc.client.chat.completions.create(
-            messages=[
+        completion = brain_svc.chat(
+            "voice_intent",
+            [
                 {"role": "system", "content": intent_prompt},
                 {"role": "user", "content": command},
             ],
-            model=settings.WINGMAN_MODEL,
+            settings.WINGMAN_MODEL,
             temperature=0.2,
             max_tokens=100,
             response_format={"type": "json_object"},
@@ -114,10 +116,17 @@ async def voice_command(request: Request, req: VoiceCommandRequest):
                 asyncio.to_thread(session_svc.fetch_session_summaries, user_id, 3),
             )
 
+            route = router_svc.route(
+                question, entity_hits=graph_svc.count_entity_hits(user_id, question),
+            )
             answer = brain_svc.ask_consultant(
                 user_id, question, h_ctx, g_ctx, v_ctx, session_summaries=s_ctx,
+                route=route,
+            )
+            session_svc.log_consultant_qa(
+                user_id, question, answer, session_id=vc_session_id,
+                llm_stats=last_llm_call("consultant"),
             )
-            session_svc.log_consultant_qa(user_id, question, answer, session_id=vc_session_id)
             session_svc.end_session(vc_session_id, summary=f"Q: {question[:100]}")
             graph_svc.save_graph(user_id)
 
@@ -128,12 +137,13 @@ async def voice_command(request: Request, req: VoiceCommandRequest):
     else:
         # General chat / fallback
         try:
-            chat_completion = brain_svc.client.chat.completions.create(
-                messages=[
+            chat_completion = brain_svc.chat(
+                "voice_chat",
+                [
                     {"role": "system", "content": "You are Bubbles, a friendly AI assistant. Keep responses short, warm, and conversational (1-2 sentences max)."},
                     {"role": "user", "content": command},
                 ],
-                model=settings.WINGMAN_MODEL,
+                settings.WINGMAN_MODEL,
                 temperature=0.7,
                 max_tokens=80,
             )
@@ -1,13 +1,19 @@
 """
 Service singletons — initialized once and shared across all routes.
-Import from here: `from app.services import graph_svc, vector_svc, brain_svc, session_svc, entity_svc`
+Import from here: `from app.services import graph_svc, vector_svc, brain_svc, session_svc, entity_svc, router_svc, summary_svc, session_state, analytics_svc, coaching_svc`
 """
 
+from app.config import settings
 from app.services.graph_service import GraphService
 from app.services.vector_service import VectorService
 from app.services.brain_service import BrainService
 from app.services.session_service import SessionService
 from app.services.entity_service import EntityService
+from app.services.model_router import ModelRouter
+from app.services.summary_service import SummaryService
+from app.services.session_state import SessionStateStore, build_backend
+from app.services.analytics_service import AnalyticsService
+from app.services.coaching_service import CoachingService
 
 # Initialize all services
 graph_svc = GraphService()
@@ -15,7 +21,32 @@ vector_svc = VectorService()
 brain_svc = BrainService()
 session_svc = SessionService()
 entity_svc = EntityService()
+router_svc = ModelRouter()
+summary_svc = SummaryService(brain_svc, session_svc)
+analytics_svc = AnalyticsService(
+    session_svc,
+    max_jobs=settings.ANALYTICS_JOB_WORKERS,
+    attempts=settings.ANALYTICS_JOB_ATTEMPTS,
+)
+coaching_svc = CoachingService(
+    brain_svc,
+    session_svc,
+    window_chars=settings.COACHING_WINDOW_CHARS,
+    concurrency=settings.COACHING_MAP_CONCURRENCY,
+    reduce_chars=settings.COACHING_REDUCE_MAX_CHARS,
+)
+session_state = SessionStateStore(
+    max_sessions=settings.MAX_LIVE_SESSIONS,
+    ttl_seconds=int(settings.SESSION_TTL_HOURS * 3600),
+    backend=build_backend(settings),
+)
+# Idle / evicted sessions: persist pending state before it is released
+session_state.on_expire(lambda rec: session_svc.release_session(rec.session_id))
+session_state.on_expire(lambda rec: graph_svc.save_graph(rec.user_id))
+session_state.on_remove(lambda rec: summary_svc.drop(rec.session_id))
 
-# Share the SentenceTransformer model so GraphService can do semantic search
-# without loading the model twice
+# Share the SentenceTransformer model so GraphService, ModelRouter and the
+# entity resolver can do semantic search without loading the model twice
 graph_svc.model = vector_svc.model
+router_svc.model = vector_svc.model
+entity_svc.resolver.model = vector_svc.model
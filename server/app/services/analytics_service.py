@@ -0,0 +1,172 @@
+"""
+AnalyticsService — per-session analytics jobs fired by end_session.
+_compute_session_analytics ran as an asyncio task but made its Supabase calls
+synchronously on the event loop, one after another. Jobs now run on a bounded
+worker pool: turn / talk-time metrics come from the running accumulator, and
+the duration plus memory / event / highlight counts come from one
+`session_analytics_inputs` RPC (sql/session_analytics.sql), or from the same
+reads issued in parallel while the function is not deployed. The row is
+upserted on session_id, so a job can be retried or run twice safely.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.database import db, is_missing_function
+from app.services.session_metrics import SessionMetrics
+from app.utils.llm_retry import RetryPolicy
+from app.utils.metrics import metrics
+
+
+class AnalyticsService:
+    """Bounded background executor for session analytics jobs."""
+
+    RPC = "session_analytics_inputs"
+
+    def __init__(self, session_svc, max_jobs: int = 2, attempts: int = 3):
+        self.session_svc = session_svc
+        self.policy = RetryPolicy(attempts=attempts, base_delay=1.0, max_delay=10.0)
+        self._jobs = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="analytics-job")
+        # A job's independent reads run here concurrently
+        self._io = ThreadPoolExecutor(max_workers=max_jobs * 4, thread_name_prefix="analytics-io")
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._rpc_available = True
+
+    # ── Jobs ──────────────────────────────────────────────────────────────────
+
+    def submit(self, session_id: str, user_id: str) -> Future:
+        """Queue a job without blocking; a queued or running job for the session is reused."""
+        with self._lock:
+            job = self._pending.get(session_id)
+            if job is not None and not job.done():
+                metrics.inc("analytics_jobs_total", outcome="deduplicated")
+                return job
+            job = self._jobs.submit(self._run, session_id, user_id)
+            self._pending[session_id] = job
+        job.add_done_callback(lambda _: self._finished(session_id, job))
+        return job
+
+    def _finished(self, session_id: str, job: Future):
+        with self._lock:
+            if self._pending.get(session_id) is job:
+                del self._pending[session_id]
+
+    def _run(self, session_id: str, user_id: str) -> Optional[dict]:
+        started = time.perf_counter()
+        for attempt in range(self.policy.attempts):
+            try:
+                row = self.compute(session_id, user_id)
+                db.table("session_analytics").upsert(row, on_conflict="session_id").execute()
+            except Exception as e:
+                delay = self.policy.delay_for(attempt, e)
+                if delay is None:
+                    print(f"❌ Analytics job failed for session {session_id}: {e}")
+                    metrics.inc("analytics_jobs_total", outcome="failed")
+                    return None
+                print(f"⚠️ Analytics job retry {attempt + 1} for session {session_id}: {e}")
+                metrics.inc("analytics_job_retries_total")
+                time.sleep(delay)
+                continue
+            if self.session_svc.live_metrics:
+                self.session_svc.live_metrics.drop(session_id)
+            metrics.inc("analytics_jobs_total", outcome="ok")
+            metrics.observe(
+                "analytics_job_ms", (time.perf_counter() - started) * 1000,
+                (50, 200, 500, 1000, 5000, 20000),
+            )
+            print(f"📊 Analytics computed for session {session_id}")
+            return row
+        return None
+
+    # ── Computation ───────────────────────────────────────────────────────────
+
+    def compute(self, session_id: str, user_id: str) -> dict:
+        """The session_analytics row (reads run concurrently; nothing is written)."""
+        live = self._io.submit(self._session_metrics, session_id)
+        inputs = self._inputs(session_id, user_id)
+
+        total_duration = None
+        if inputs.get("created_at") and inputs.get("ended_at"):
+            try:
+                from dateutil import parser as dtparser
+                t_start = dtparser.parse(inputs["created_at"])
+                t_end = dtparser.parse(inputs["ended_at"])
+                total_duration = (t_end - t_start).total_seconds()
+            except Exception:
+                pass
+
+        return {
+            "session_id": session_id,
+            "user_id": user_id,
+            **live.result(),
+            "total_duration_seconds": total_duration,
+            "memories_saved": inputs.get("memories_saved") or 0,
+            "events_extracted": inputs.get("events_extracted") or 0,
+            "highlights_created": inputs.get("highlights_created") or 0,
+            "computed_at": datetime.now().isoformat(),
+        }
+
+    def _session_metrics(self, session_id: str) -> dict:
+        """Running accumulator if resident, else replayed from the transcript."""
+        live = None
+        if self.session_svc.live_metrics:
+            live = self.session_svc.live_metrics.get(session_id)
+        if live is None:
+            live = SessionMetrics.from_rows(self.session_svc.transcript_rows(session_id)).row()
+        return live
+
+    def _inputs(self, session_id: str, user_id: str) -> dict:
+        """Session timestamps + memory / event / highlight counts."""
+        if self._rpc_available:
+            try:
+                res = db.rpc(
+                    self.RPC, {"p_session_id": session_id, "p_user_id": user_id}
+                ).execute()
+                return res.data or {}
+            except Exception as e:
+                if not is_missing_function(e):
+                    raise
+                print(f"⚠️ Analytics: {self.RPC} RPC unavailable, using parallel reads: {e}")
+                self._rpc_available = False
+
+        session = self._io.submit(
+            lambda: db.table("sessions")
+            .select("created_at, ended_at")
+            .eq("id", session_id)
+            .maybe_single()
+            .execute()
+        )
+        memories = self._io.submit(
+            lambda: db.table("memory")
+            .select("id", count="exact")
+            .eq("user_id", user_id)
+            .eq("session_id", session_id)
+            .execute()
+        )
+        events = self._io.submit(
+            lambda: db.table("events")
+            .select("id", count="exact")
+            .eq("session_id", session_id)
+            .execute()
+        )
+        highlights = self._io.submit(
+            lambda: db.table("highlights")
+            .select("id", count="exact")
+            .eq("session_id", session_id)
+            .execute()
+        )
+        sess_res = session.result()
+        inputs = dict(sess_res.data) if sess_res and sess_res.data else {}
+        inputs["memories_saved"] = memories.result().count
+        inputs["events_extracted"] = events.result().count
+        inputs["highlights_created"] = highlights.result().count
+        return inputs
+
+    def close(self):
+        """Let queued jobs finish (called at shutdown)."""
+        self._jobs.shutdown(wait=True)
+        self._io.shutdown(wait=True)
@@ -0,0 +1,278 @@
+"""
+CoachingService — map-reduce coaching reports over whole sessions.
+The report used to be one detailed-model call over the first 6000 characters
+of the transcript, generated inside the GET. Transcripts are now split into
+windows on turn boundaries; the fast model turns every window into compact
+notes concurrently, notes are merged (in rounds, while they outgrow one
+prompt) and the detailed model reduces them into the report schema. Talk
+share and filler counts come from SessionMetrics, so they cover every turn.
+Jobs run in the background with progress; reports are cached in coaching_reports.
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.database import db
+from app.services.brain_service import CONSULTANT_RETRY, EXTRACTION_RETRY
+from app.services.session_metrics import SessionMetrics
+from app.utils.metrics import metrics
+
+REPORT_KEYS = (
+    "user_talk_pct", "others_talk_pct", "key_topics", "key_decisions",
+    "action_items", "follow_up_people", "filler_words", "filler_word_count",
+    "tone_summary", "engagement_trend", "suggestions", "strengths", "report_text",
+)
+NOTE_KEYS = (
+    "topics", "decisions", "action_items", "people", "filler_words", "strengths", "improvements",
+)
+NO_TRANSCRIPT = "No transcript found."
+
+_REPORT_PROMPT = (
+    "You are an expert communication coach. Analyse this {source}. "
+    'Return JSON ONLY: {{"user_talk_pct":float, "others_talk_pct":float, '
+    '"key_topics":[str], "key_decisions":[str], "action_items":[str], '
+    '"follow_up_people":[str], "filler_words":[str], "filler_word_count":int, '
+    '"tone_summary":str, "engagement_trend":"improving|stable|declining", '
+    '"suggestions":[str], "strengths":[str], "report_text":str}}. Max 5 items per list.'
+)
+_MAP_PROMPT = (
+    "You are an expert communication coach. Below is ONE part of a longer conversation "
+    'transcript. Return JSON ONLY: {"topics":[str], "decisions":[str], "action_items":[str], '
+    '"people":[str], "filler_words":[str], "tone":str, "strengths":[str], '
+    '"improvements":[str]}. Max 5 items per list; only what this part shows.'
+)
+_MERGE_PROMPT = (
+    "Below are JSON notes on consecutive parts of ONE conversation, oldest first. "
+    "Merge them into a single JSON object with the same keys. Max 5 items per list; "
+    "drop repetition; describe how the tone developed. Return JSON ONLY."
+)
+
+
+def transcript_windows(rows: List[dict], max_chars: int) -> List[str]:
+    """Rendered transcript split on turn boundaries into windows of <= max_chars."""
+    windows: List[str] = []
+    lines: List[str] = []
+    size = 0
+    for row in rows:
+        line = f"{str(row.get('role', '')).upper()}: {row.get('content', '')}"[:max_chars]
+        if lines and size + len(line) + 1 > max_chars:
+            windows.append("\n".join(lines))
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line) + 1
+    if lines:
+        windows.append("\n".join(lines))
+    return windows
+
+
+def combine_notes(notes: List[dict]) -> dict:
+    """Plain merge of window notes (used when a model merge fails)."""
+    merged: Dict[str, list] = {key: [] for key in NOTE_KEYS}
+    for note in notes:
+        for key in NOTE_KEYS:
+            for item in note.get(key) or []:
+                if item not in merged[key] and len(merged[key]) < 5:
+                    merged[key].append(item)
+    tones = [n["tone"] for n in notes if n.get("tone")]
+    return {**merged, "tone": " → ".join(tones[:1] + tones[-1:]) if tones else ""}
+
+
+class _ReportJob:
+    __slots__ = ("task", "status", "windows", "done", "failed", "started_at", "error")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.status = "pending"   # pending → mapping → reducing → done | failed
+        self.windows = 0
+        self.done = 0
+        self.failed = 0
+        self.started_at = time.monotonic()
+        self.error: Optional[str] = None
+
+    def progress(self) -> dict:
+        return {
+            "status": self.status,
+            "windows_total": self.windows,
+            "windows_done": self.done,
+            "windows_failed": self.failed,
+            "elapsed_s": round(time.monotonic() - self.started_at, 1),
+        }
+
+
+class CoachingService:
+    """Background map-reduce report jobs, one per session at a time."""
+
+    def __init__(
+        self,
+        brain,
+        sessions,
+        window_chars: int = 6000,
+        concurrency: int = 4,
+        reduce_chars: int = 24000,
+    ):
+        self.brain = brain
+        self.sessions = sessions
+        self.window_chars = window_chars
+        self.concurrency = concurrency
+        self.reduce_chars = reduce_chars
+        self._jobs: Dict[str, _ReportJob] = {}
+
+    # ── Jobs (event loop only) ────────────────────────────────────────────────
+
+    def job(self, session_id: str) -> Optional[_ReportJob]:
+        return self._jobs.get(session_id)
+
+    def forget(self, session_id: str):
+        self._jobs.pop(session_id, None)
+
+    def start(self, session_id: str, user_id: str) -> _ReportJob:
+        """Start (or join) the session's report job."""
+        job = self._jobs.get(session_id)
+        if job is not None and job.status != "failed":
+            return job
+        job = self._jobs[session_id] = _ReportJob()
+        job.task = asyncio.create_task(self._run(session_id, user_id, job))
+        return job
+
+    async def _run(self, session_id: str, user_id: str, job: _ReportJob) -> Optional[dict]:
+        try:
+            row = await self.generate(session_id, user_id, job)
+            saved = await asyncio.to_thread(
+                lambda: db.table("coaching_reports").insert(row).execute()
+            )
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+            metrics.inc("coaching_reports_total", outcome="failed")
+            print(f"❌ Coaching report failed for session {session_id}: {e}")
+            return None
+        job.status = "done"
+        metrics.inc("coaching_reports_total", outcome="ok")
+        metrics.observe(
+            "coaching_report_ms", (time.monotonic() - job.started_at) * 1000,
+            (1000, 3000, 10000, 30000, 60000, 120000),
+        )
+        # Cached in coaching_reports from here on
+        if self._jobs.get(session_id) is job:
+            del self._jobs[session_id]
+        return saved.data[0] if saved.data else row
+
+    # ── Map-Reduce ────────────────────────────────────────────────────────────
+
+    async def generate(self, session_id: str, user_id: str, job: _ReportJob) -> dict:
+        """The coaching_reports row for a session (nothing is written)."""
+        rows = await asyncio.to_thread(self.sessions.transcript_rows, session_id)
+        if not rows:
+            raise LookupError(NO_TRANSCRIPT)
+        windows = transcript_windows(rows, self.window_chars)
+        job.windows = len(windows)
+
+        if len(windows) == 1:
+            job.status = "reducing"
+            report = await self._reduce("transcript", windows[0])
+            job.done = 1
+            model_used = settings.CONSULTANT_MODEL
+        else:
+            job.status = "mapping"
+            limit = asyncio.Semaphore(self.concurrency)
+            notes = await asyncio.gather(
+                *(self._map(window, limit, job) for window in windows)
+            )
+            notes = [n for n in notes if n is not None]
+            if not notes:
+                raise RuntimeError(f"all {len(windows)} transcript windows failed")
+            job.status = "reducing"
+            notes = await self._merge_until_fits(notes, limit)
+            report = await self._reduce(
+                "set of notes on consecutive parts of one conversation (oldest first)",
+                "\n".join(json.dumps(n) for n in notes),
+            )
+            model_used = f"{settings.WINGMAN_MODEL} → {settings.CONSULTANT_MODEL}"
+
+        # Exact figures over every turn instead of the model's estimates
+        stats = SessionMetrics.from_rows(rows)
+        talk = stats.user_words + stats.others_words
+        if talk:
+            report["user_talk_pct"] = round(100.0 * stats.user_words / talk, 1)
+            report["others_talk_pct"] = round(100.0 * stats.others_words / talk, 1)
+        report["filler_word_count"] = stats.user_fillers
+
+        return {
+            "session_id": session_id,
+            "user_id": user_id,
+            "model_used": model_used,
+            "generated_at": datetime.now().isoformat(),
+            **{k: v for k, v in report.items() if k in REPORT_KEYS},
+        }
+
+    async def _json_call(
+        self, op: str, prompt: str, content: str, model: str, policy, max_tokens: int,
+    ) -> dict:
+        comp = await self.brain.achat(
+            op,
+            [{"role": "system", "content": prompt}, {"role": "user", "content": content}],
+            model,
+            policy,
+            response_format={"type": "json_object"},
+            temperature=0.3,
+            max_tokens=max_tokens,
+        )
+        data = json.loads(comp.choices[0].message.content)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        return data
+
+    async def _map(self, window: str, limit: asyncio.Semaphore, job: _ReportJob) -> Optional[dict]:
+        async with limit:
+            try:
+                notes = await self._json_call(
+                    "coaching_map", _MAP_PROMPT, window, settings.WINGMAN_MODEL,
+                    EXTRACTION_RETRY, 400,
+                )
+                if not notes:
+                    raise ValueError("empty notes")
+            except Exception as e:
+                print(f"⚠️ Coaching report: window analysis failed: {e}")
+                job.failed += 1
+                return None
+        job.done += 1
+        return notes
+
+    async def _merge_until_fits(self, notes: List[dict], limit: asyncio.Semaphore) -> List[dict]:
+        """Merge neighbouring notes in rounds until they fit one reduce prompt."""
+        while len(notes) > 1 and sum(len(json.dumps(n)) + 1 for n in notes) > self.reduce_chars:
+            groups: List[List[dict]] = [[]]
+            size = 0
+            for note in notes:
+                n = len(json.dumps(note)) + 1
+                if len(groups[-1]) >= 2 and size + n > self.reduce_chars:
+                    groups.append([])
+                    size = 0
+                groups[-1].append(note)
+                size += n
+            notes = await asyncio.gather(*(self._merge(group, limit) for group in groups))
+            metrics.inc("coaching_merge_rounds_total")
+        return notes
+
+    async def _merge(self, group: List[dict], limit: asyncio.Semaphore) -> dict:
+        if len(group) == 1:
+            return group[0]
+        async with limit:
+            try:
+                return await self._json_call(
+                    "coaching_merge", _MERGE_PROMPT,
+                    "\n".join(json.dumps(n) for n in group)[: self.reduce_chars],
+                    settings.WINGMAN_MODEL, EXTRACTION_RETRY, 500,
+                )
+            except Exception as e:
+                print(f"⚠️ Coaching report: notes merge failed, combining plainly: {e}")
+                return combine_notes(group)
+
+    async def _reduce(self, source: str, content: str) -> dict:
+        return await self._json_call(
+            "coaching_report", _REPORT_PROMPT.format(source=source), content,
+            settings.CONSULTANT_MODEL, CONSULTANT_RETRY, 800,
+        )
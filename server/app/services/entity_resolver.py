@@ -0,0 +1,250 @@
+"""
+EntityResolver — embedding-based entity resolution for EntityService.
+String similarity can't merge "Dr. Khan" with "Ahmed Khan". Per user, this
+keeps a resident matrix of entity-name embeddings (shared SentenceTransformer)
+next to hashed character-trigram and token vectors, so a batch of new names is
+scored against every same-type entity in one vectorized pass:
+
+    score = w_sem · cos(embedding) + w_lex · cos(trigrams) + w_tok · token containment
+
+Titles ("dr", "mr", ...) are dropped before the lexical features. Vectors are
+computed once per name and appended as entities are created.
+"""
+
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.database import db
+from app.utils.metrics import metrics
+
+TITLE_WORDS = frozenset({
+    "dr", "mr", "mrs", "ms", "miss", "mx", "prof", "professor", "sir", "madam",
+    "uncle", "aunt", "auntie", "sheikh", "the",
+})
+# Relation endpoints are stored as "concept" — they may be any real type
+WILDCARD_TYPE = "concept"
+
+_LEX_DIM = 1024
+_TOK_DIM = 512
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def name_tokens(canonical: str) -> List[str]:
+    tokens = _TOKEN_RE.findall(canonical.lower())
+    return [t for t in tokens if t not in TITLE_WORDS] or tokens
+
+
+def _bucket(text: str, dim: int) -> int:
+    return zlib.crc32(text.encode("utf-8")) % dim
+
+
+def lexical_features(canonical: str) -> Tuple[np.ndarray, np.ndarray, int]:
+    """(unit trigram vector, binary token vector, token count) for a name."""
+    tokens = name_tokens(canonical)
+    padded = f"  {' '.join(tokens)} "
+    grams = np.zeros(_LEX_DIM, dtype=np.float32)
+    for i in range(len(padded) - 2):
+        grams[_bucket(padded[i:i + 3], _LEX_DIM)] += 1.0
+    grams /= np.linalg.norm(grams) + 1e-10
+    toks = np.zeros(_TOK_DIM, dtype=np.float32)
+    for t in set(tokens):
+        toks[_bucket(t, _TOK_DIM)] = 1.0
+    return grams, toks, max(len(set(tokens)), 1)
+
+
+class _UserVectors:
+    """Growable column-aligned arrays for one user's entities."""
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.types: List[str] = []
+        self.row_of: Dict[str, int] = {}     # entity_id → row
+        self.emb = np.zeros((capacity, dim), dtype=np.float32)
+        self.lex = np.zeros((capacity, _LEX_DIM), dtype=np.float32)
+        self.tok = np.zeros((capacity, _TOK_DIM), dtype=np.float32)
+        self.tok_count = np.zeros(capacity, dtype=np.float32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.loaded_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _grow(self, need: int):
+        cap = self.emb.shape[0]
+        if need <= cap:
+            return
+        new_cap = max(need, cap * 2)
+        for attr in ("emb", "lex", "tok"):
+            old = getattr(self, attr)
+            grown = np.zeros((new_cap, old.shape[1]), dtype=np.float32)
+            grown[:cap] = old
+            setattr(self, attr, grown)
+        for attr, dtype in (("tok_count", np.float32), ("alive", bool)):
+            old = getattr(self, attr)
+            grown = np.zeros(new_cap, dtype=dtype)
+            grown[:cap] = old
+            setattr(self, attr, grown)
+
+    def append(self, rows: Sequence[Tuple[str, str, str]], embeddings: np.ndarray):
+        """rows: (entity_id, canonical_name, entity_type); embeddings are unit rows."""
+        with self.lock:
+            start = len(self.ids)
+            self._grow(start + len(rows))
+            for offset, (entity_id, canonical, entity_type) in enumerate(rows):
+                i = start + offset
+                grams, toks, count = lexical_features(canonical)
+                self.ids.append(entity_id)
+                self.names.append(canonical)
+                self.types.append(entity_type or WILDCARD_TYPE)
+                self.row_of[entity_id] = i
+                self.emb[i] = embeddings[offset]
+                self.lex[i] = grams
+                self.tok[i] = toks
+                self.tok_count[i] = count
+                self.alive[i] = True
+
+    def kill(self, entity_id: str) -> bool:
+        with self.lock:
+            i = self.row_of.pop(entity_id, None)
+            if i is None:
+                return False
+            self.alive[i] = False
+            return True
+
+
+class EntityResolver:
+    """Per-user cached entity vectors + combined-score batch resolution."""
+
+    def __init__(
+        self,
+        threshold: float = 0.7,
+        weights: Tuple[float, float, float] = (0.45, 0.25, 0.30),
+        ttl_seconds: float = 600,
+        max_users: int = 200,
+    ):
+        self.model = None  # shared SentenceTransformer (set after VectorService init)
+        self.threshold = threshold
+        self.weights = weights
+        self.ttl = ttl_seconds
+        self.max_users = max_users
+        self._users: "OrderedDict[str, _UserVectors]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ── Vectors ───────────────────────────────────────────────────────────────
+
+    def _encode(self, names: List[str]) -> np.ndarray:
+        vecs = np.asarray(self.model.encode(names, convert_to_numpy=True), dtype=np.float32)
+        if vecs.ndim == 1:
+            vecs = vecs.reshape(1, -1)
+        return vecs / (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-10)
+
+    def _vectors(self, user_id: str) -> _UserVectors:
+        """The user's matrix; built with one select + one batched encode, then cached."""
+        with self._lock:
+            vectors = self._users.get(user_id)
+            if vectors is not None and time.monotonic() - vectors.loaded_at < self.ttl:
+                self._users.move_to_end(user_id)
+                return vectors
+        res = (
+            db.table("entities")
+            .select("id, canonical_name, entity_type")
+            .eq("user_id", user_id)
+            .execute()
+        )
+        rows = [(r["id"], r["canonical_name"], r.get("entity_type")) for r in res.data or []]
+        started = time.perf_counter()
+        embeddings = self._encode([r[1] for r in rows] or ["_"])
+        vectors = _UserVectors(embeddings.shape[1], capacity=max(64, len(rows)))
+        if rows:
+            vectors.append(rows, embeddings)
+        metrics.observe(
+            "entity_vectors_build_ms", (time.perf_counter() - started) * 1000,
+            (10, 50, 200, 1000, 5000, 20000),
+        )
+        with self._lock:
+            self._users[user_id] = vectors
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return vectors
+
+    def add(self, user_id: str, rows: Sequence[Tuple[str, str, str]]):
+        """New entities (id, canonical, type): appended if the user's matrix is resident."""
+        with self._lock:
+            vectors = self._users.get(user_id)
+        if vectors is None or not rows or self.model is None:
+            return
+        vectors.append(rows, self._encode([r[1] for r in rows]))
+
+    def forget(self, entity_ids: Sequence[str], user_id: str = None):
+        with self._lock:
+            if user_id:
+                users = [self._users[user_id]] if user_id in self._users else []
+            else:
+                users = list(self._users.values())
+        for entity_id in entity_ids:
+            for vectors in users:
+                if vectors.kill(entity_id):
+                    break
+
+    # ── Resolution ────────────────────────────────────────────────────────────
+
+    def scores(
+        self, vectors: _UserVectors, queries: Sequence[Tuple[str, str]],
+    ) -> np.ndarray:
+        """(len(queries), n) combined scores; -1 where the type block excludes a pair."""
+        n = len(vectors)
+        q_emb = self._encode([q[0] for q in queries])
+        feats = [lexical_features(q[0]) for q in queries]
+        q_lex = np.stack([f[0] for f in feats])
+        q_tok = np.stack([f[1] for f in feats])
+        q_count = np.array([f[2] for f in feats], dtype=np.float32)
+
+        w_sem, w_lex, w_tok = self.weights
+        with vectors.lock:
+            semantic = q_emb @ vectors.emb[:n].T
+            lexical = q_lex @ vectors.lex[:n].T
+            shared = q_tok @ vectors.tok[:n].T
+            containment = shared / np.minimum(q_count[:, None], vectors.tok_count[:n][None, :])
+            combined = w_sem * semantic + w_lex * lexical + w_tok * containment
+
+            # Type blocking: same type, or either side is a wildcard "concept"
+            types = np.array(vectors.types, dtype=object)
+            allowed = np.zeros_like(combined, dtype=bool)
+            for qi, (_, q_type) in enumerate(queries):
+                if not q_type or q_type == WILDCARD_TYPE:
+                    allowed[qi] = True
+                else:
+                    allowed[qi] = (types == q_type) | (types == WILDCARD_TYPE)
+            allowed &= vectors.alive[:n][None, :]
+        return np.where(allowed, combined, -1.0)
+
+    def resolve_many(
+        self, user_id: str, queries: Sequence[Tuple[str, str]],
+    ) -> List[Optional[Tuple[str, float]]]:
+        """[(entity_id, score) or None] for each (canonical, entity_type) query."""
+        if not queries or self.model is None:
+            return [None] * len(queries)
+        started = time.perf_counter()
+        vectors = self._vectors(user_id)
+        if not len(vectors):
+            return [None] * len(queries)
+        combined = self.scores(vectors, queries)
+        best = combined.argmax(axis=1)
+        out: List[Optional[Tuple[str, float]]] = []
+        for qi, col in enumerate(best):
+            score = float(combined[qi, col])
+            out.append((vectors.ids[col], score) if score >= self.threshold else None)
+        metrics.observe(
+            "entity_resolution_ms", (time.perf_counter() - started) * 1000,
+            (1, 5, 20, 50, 200, 1000),
+        )
+        return out
@@ -3,41 +3,236 @@ EntityService — entity CRUD, fuzzy matching, event/conflict persistence.
 Uses db_final schema: entities, entity_attributes, entity_relations, highlights, events.
 """
 
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime
-from difflib import SequenceMatcher
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from app.database import db
+from app.config import settings
+from app.database import db, is_missing_function
+from app.services.entity_resolver import EntityResolver
+from app.services.mention_counter import MentionCounter
+from app.utils.entity_lookup import EntitySnapshot
+from app.utils.metrics import metrics
+from app.utils.name_index import NameIndex
+from app.utils.ttl_cache import GroupedTTLCache
+
+FUZZY_MATCH_THRESHOLD = 0.85
+VALID_ENTITY_TYPES = ("person", "place", "organization", "event", "object", "concept")
+# Atomic bulk write of one extraction (sql/entity_functions.sql)
+PERSIST_RPC = "persist_extraction"
 
 
 class EntityService:
     """Persists structured entity data to SQL tables."""
 
     def __init__(self):
+        # user_id → (loaded_at, NameIndex); LRU over users
+        self._name_indexes: "OrderedDict[str, Tuple[float, NameIndex]]" = OrderedDict()
+        self._index_lock = threading.Lock()
+        # user_id → (loaded_at, EntitySnapshot) for /ask_entity; LRU over users
+        self._snapshots: "OrderedDict[str, Tuple[float, EntitySnapshot]]" = OrderedDict()
+        # entity_id → {user_id: (context text, attributes, {(relation, target_id)})}
+        self.context_cache = GroupedTTLCache(
+            "entity_context",
+            ttl_seconds=settings.ENTITY_CONTEXT_CACHE_TTL_SECONDS,
+            max_groups=settings.ENTITY_CONTEXT_CACHE_MAX_ENTITIES,
+        )
+        # Embedding resolution (ENTITY_RESOLUTION_MODE=embedding); model set after VectorService init
+        self.resolver = EntityResolver(
+            threshold=settings.ENTITY_EMBEDDING_THRESHOLD,
+            weights=tuple(float(w) for w in settings.ENTITY_EMBEDDING_WEIGHTS.split(",")),
+            ttl_seconds=settings.ENTITY_INDEX_TTL_SECONDS,
+            max_users=settings.ENTITY_INDEX_MAX_USERS,
+        )
+        # mention_count / last_seen_at increments, applied in bulk per interval
+        self.mentions = MentionCounter(db, settings.ENTITY_MENTION_FLUSH_SECONDS) if db else None
+        self._persist_rpc_available = True
         print("✅ Entity Service: Initialized")
 
+    # ── Name Index ────────────────────────────────────────────────────────────
+
+    def _name_index(self, user_id: str) -> NameIndex:
+        """The user's resident name index; loaded with one select, reloaded after the TTL."""
+        now = time.monotonic()
+        with self._index_lock:
+            cached = self._name_indexes.get(user_id)
+            if cached and now - cached[0] < settings.ENTITY_INDEX_TTL_SECONDS:
+                self._name_indexes.move_to_end(user_id)
+                return cached[1]
+        index = NameIndex()
+        res = (
+            db.table("entities")
+            .select("id, canonical_name")
+            .eq("user_id", user_id)
+            .execute()
+        )
+        for ent in res.data or []:
+            index.add(ent["canonical_name"], ent["id"])
+        metrics.inc("entity_name_index_loads_total")
+        with self._index_lock:
+            self._name_indexes[user_id] = (now, index)
+            self._name_indexes.move_to_end(user_id)
+            while len(self._name_indexes) > settings.ENTITY_INDEX_MAX_USERS:
+                self._name_indexes.popitem(last=False)
+        return index
+
+    def _index_insert(self, user_id: str, rows: List[Tuple[str, str, str]]):
+        """New entities (id, canonical, type) → resident name index and entity vectors."""
+        with self._index_lock:
+            cached = self._name_indexes.get(user_id)
+        if cached:
+            for entity_id, canonical, _ in rows:
+                cached[1].add(canonical, entity_id)
+        if self._semantic_resolution:
+            self.resolver.add(user_id, rows)
+
+    def forget_entities(self, entity_ids: List[str], user_id: str = None):
+        """Drop deleted entities from the resident name index(es) and entity vectors."""
+        self.resolver.forget(entity_ids, user_id)
+        with self._index_lock:
+            snapshots = [snap for _, snap in self._snapshots.values()]
+        for snap in snapshots:
+            for eid in entity_ids:
+                snap.remove(eid)
+        with self._index_lock:
+            if user_id:
+                cached = self._name_indexes.get(user_id)
+                indexes = [cached[1]] if cached else []
+            else:
+                indexes = [idx for _, idx in self._name_indexes.values()]
+        for eid in entity_ids:
+            self.context_cache.invalidate(eid)
+            for index in indexes:
+                if index.remove_id(eid):
+                    break
+
+    # ── Entity Lookup ─────────────────────────────────────────────────────────
+
+    _SNAPSHOT_COLUMNS = (
+        "id, canonical_name, display_name, entity_type, description, mention_count, "
+        "attributes:entity_attributes(attribute_key, attribute_value), "
+        "relations:entity_relations!source_id(relation, target_id)"
+    )
+
+    def _entity_snapshot(self, user_id: str) -> EntitySnapshot:
+        """User's entities with attributes + relations: one embedded select, then cached."""
+        now = time.monotonic()
+        with self._index_lock:
+            cached = self._snapshots.get(user_id)
+            if cached and now - cached[0] < settings.ENTITY_INDEX_TTL_SECONDS:
+                self._snapshots.move_to_end(user_id)
+                metrics.inc("cache_requests_total", cache="entity_snapshot", outcome="hit")
+                return cached[1]
+        metrics.inc("cache_requests_total", cache="entity_snapshot", outcome="miss")
+        res = (
+            db.table("entities")
+            .select(self._SNAPSHOT_COLUMNS)
+            .eq("user_id", user_id)
+            .execute()
+        )
+        snapshot = EntitySnapshot(res.data or [])
+        with self._index_lock:
+            self._snapshots[user_id] = (now, snapshot)
+            self._snapshots.move_to_end(user_id)
+            while len(self._snapshots) > settings.ENTITY_INDEX_MAX_USERS:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    def _drop_snapshot(self, user_id: str):
+        with self._index_lock:
+            self._snapshots.pop(user_id, None)
+
+    def lookup_entity(self, user_id: str, name: str) -> Optional[dict]:
+        """Best entity for a spoken name with its attributes and relations, or None.
+
+        Served from the user's cached snapshot (at most one DB call when cold).
+        """
+        if not db:
+            return None
+        try:
+            snapshot = self._entity_snapshot(user_id)
+        except Exception as e:
+            print(f"⚠️ Entity snapshot load failed, querying directly: {e}")
+            return self._lookup_entity_direct(user_id, name)
+        matches = snapshot.search(name, limit=1)
+        if not matches:
+            return None
+        quality, row = matches[0]
+        metrics.inc("entity_lookups_total", quality=f"{quality:.1f}")
+        entity = {
+            k: row.get(k)
+            for k in ("id", "display_name", "entity_type", "description", "mention_count")
+        }
+        return {
+            "entity": entity,
+            "attributes": [
+                (a["attribute_key"], a["attribute_value"]) for a in row.get("attributes") or []
+            ],
+            "relations": snapshot.relations_of(row["id"]),
+        }
+
+    def _lookup_entity_direct(self, user_id: str, name: str) -> Optional[dict]:
+        """Uncached fallback: substring match on canonical_name, then attrs + relations."""
+        canonical = name.strip().lower()
+        ent_res = db.table("entities").select(
+            "id, display_name, entity_type, description, mention_count"
+        ).eq("user_id", user_id).ilike("canonical_name", f"%{canonical}%").order(
+            "mention_count", desc=True
+        ).limit(1).execute()
+        if not ent_res.data:
+            return None
+        entity = ent_res.data[0]
+        eid = entity["id"]
+        attr_res = db.table("entity_attributes").select(
+            "attribute_key, attribute_value"
+        ).eq("entity_id", eid).execute()
+        rel_res = db.table("entity_relations").select("relation, target_id").eq("source_id", eid).execute()
+        relations = []
+        if rel_res.data:
+            tids = list({r["target_id"] for r in rel_res.data})
+            tgt = db.table("entities").select("id, display_name").in_("id", tids).execute()
+            tmap = {t["id"]: t["display_name"] for t in (tgt.data or [])}
+            relations = [(r["relation"], tmap.get(r["target_id"], r["target_id"])) for r in rel_res.data]
+        return {
+            "entity": entity,
+            "attributes": [(a["attribute_key"], a["attribute_value"]) for a in attr_res.data or []],
+            "relations": relations,
+        }
+
     # ── Fuzzy Matching ────────────────────────────────────────────────────────
 
+    @property
+    def _semantic_resolution(self) -> bool:
+        return settings.ENTITY_RESOLUTION_MODE == "embedding" and self.resolver.model is not None
+
+    def _resolve_semantic(self, user_id: str, queries: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """Embedding resolution for names the lexical match missed; None where unresolved."""
+        if not self._semantic_resolution or not queries:
+            return [None] * len(queries)
+        try:
+            results = self.resolver.resolve_many(user_id, queries)
+        except Exception as e:
+            print(f"❌ Entity Service Error in embedding resolution: {e}")
+            return [None] * len(queries)
+        for (canonical, _), hit in zip(queries, results):
+            if hit:
+                print(f"🧭 Entity resolution: '{canonical}' matched existing (score={hit[1]:.2f})")
+        metrics.inc("entity_semantic_matches_total", sum(1 for r in results if r))
+        return [r[0] if r else None for r in results]
+
     def _find_fuzzy_match(self, user_id: str, canonical: str) -> Optional[str]:
         """Return entity_id if a similar entity exists (0.85 threshold)."""
         if not db:
             return None
         try:
-            res = (
-                db.table("entities")
-                .select("id, canonical_name")
-                .eq("user_id", user_id)
-                .execute()
+            best_id, best_ratio, scored = self._name_index(user_id).best_match(
+                canonical, FUZZY_MATCH_THRESHOLD,
             )
-            best_id, best_ratio = None, 0.0
-            for ent in res.data or []:
-                ratio = SequenceMatcher(
-                    None, canonical, ent["canonical_name"]
-                ).ratio()
-                if ratio > best_ratio:
-                    best_ratio = ratio
-                    best_id = ent["id"]
-            if best_ratio >= 0.85:
+            metrics.observe("entity_fuzzy_candidates", scored, (0, 5, 20, 100, 500, 2000))
+            if best_id:
                 print(
                     f"🔁 Entity dedup: '{canonical}' matched existing "
                     f"(ratio={best_ratio:.2f})"
@@ -64,48 +259,39 @@ class EntityService:
         try:
             existing = (
                 db.table("entities")
-                .select("id, mention_count")
+                .select("id")
                 .eq("user_id", user_id)
                 .eq("canonical_name", canonical)
                 .execute()
             )
             if existing.data:
                 entity_id = existing.data[0]["id"]
-                db.table("entities").update(
-                    {
-                        "last_seen_at": datetime.now().isoformat(),
-                        "mention_count": (existing.data[0].get("mention_count", 1) or 1)
-                        + 1,
-                    }
-                ).eq("id", entity_id).execute()
+                self.mentions.add(entity_id, datetime.now().isoformat())
                 return entity_id
             else:
                 # Check for near-duplicate before inserting
-                fuzzy_id = self._find_fuzzy_match(user_id, canonical)
+                entity_type = entity_type if entity_type in VALID_ENTITY_TYPES else "person"
+                fuzzy_id = (
+                    self._find_fuzzy_match(user_id, canonical)
+                    or self._resolve_semantic(user_id, [(canonical, entity_type)])[0]
+                )
                 if fuzzy_id:
-                    db.table("entities").update(
-                        {"last_seen_at": datetime.now().isoformat()}
-                    ).eq("id", fuzzy_id).execute()
+                    self.mentions.add(fuzzy_id, datetime.now().isoformat(), delta=0)
                     return fuzzy_id
 
-                valid_types = (
-                    "person",
-                    "place",
-                    "organization",
-                    "event",
-                    "object",
-                    "concept",
-                )
                 row = {
                     "user_id": user_id,
                     "canonical_name": canonical,
                     "display_name": display,
-                    "entity_type": entity_type if entity_type in valid_types else "person",
+                    "entity_type": entity_type,
                 }
                 if description:
                     row["description"] = description
                 result = db.table("entities").insert(row).execute()
-                return result.data[0]["id"] if result.data else None
+                if not result.data:
+                    return None
+                self._index_insert(user_id, [(result.data[0]["id"], canonical, entity_type)])
+                return result.data[0]["id"]
         except Exception as e:
             print(f"❌ Entity Service Error upserting entity '{name}': {e}")
             return None
@@ -133,6 +319,7 @@ class EntityService:
                 ).execute()
             except Exception as e:
                 print(f"❌ Entity Service Error upserting attribute '{key}': {e}")
+        self.context_cache.invalidate(entity_id)
 
     def _upsert_relation(
         self,
@@ -158,15 +345,56 @@ class EntityService:
             db.table("entity_relations").upsert(
                 row, on_conflict="source_id,target_id,relation"
             ).execute()
+            self.context_cache.invalidate(source_id)
         except Exception as e:
             print(f"❌ Entity Service Error upserting relation '{relation}': {e}")
 
     # ── Entity Context ────────────────────────────────────────────────────────
 
     def get_entity_context(self, user_id: str, entity_id: str) -> str:
-        """Compile a context string for a specific entity."""
+        """Context string for a specific entity (cached until the entity changes)."""
         if not db:
             return ""
+        cached = self.context_cache.get(entity_id, user_id)
+        if cached is not None:
+            return cached[0]
+        token = self.context_cache.token()
+        built = self._build_entity_context(user_id, entity_id)
+        if built is None:
+            return ""
+        self.context_cache.set(entity_id, user_id, built, token)
+        return built[0]
+
+    def _context_changed(
+        self, user_id: str, entity_id: str,
+        attributes: Dict[str, str], edges: List[Tuple[str, str]],
+    ) -> bool:
+        """Would writing these attributes / (relation, target_id) edges alter the cached context?"""
+        cached = self.context_cache.peek(entity_id, user_id)
+        if cached is None:
+            return True  # also fences off a build that may be in flight
+        _, cached_attrs, cached_edges = cached
+        return (
+            any(cached_attrs.get(k) != v for k, v in attributes.items())
+            or any(edge not in cached_edges for edge in edges)
+        )
+
+    def _invalidate_contexts(self, user_id: str, attr_rows, edge_rows):
+        """Drop cached contexts of entities whose attributes / outgoing relations changed."""
+        attrs: Dict[str, Dict[str, str]] = {}
+        for row in attr_rows:
+            attrs.setdefault(row["entity_id"], {})[row["attribute_key"]] = row["attribute_value"]
+        edges: Dict[str, List[Tuple[str, str]]] = {}
+        for row in edge_rows:
+            edges.setdefault(row["source_id"], []).append((row["relation"], row["target_id"]))
+        for entity_id in set(attrs) | set(edges):
+            if self._context_changed(
+                user_id, entity_id, attrs.get(entity_id, {}), edges.get(entity_id, []),
+            ):
+                self.context_cache.invalidate(entity_id)
+
+    def _build_entity_context(self, user_id: str, entity_id: str):
+        """Compile (context text, attributes, relation edges) from four queries; None on error."""
         try:
             ent_res = (
                 db.table("entities")
@@ -176,7 +404,7 @@ class EntityService:
                 .execute()
             )
             if not ent_res.data:
-                return ""
+                return "", {}, frozenset()
             entity = ent_res.data[0]
 
             attr_res = (
@@ -223,19 +451,266 @@ class EntityService:
                 entity_context += f"Attributes:\n{attrs_text}\n"
             if relations_text:
                 entity_context += f"Relations:\n{relations_text}\n"
-            return entity_context
+            attrs = {a["attribute_key"]: a["attribute_value"] for a in (attr_res.data or [])}
+            edges = frozenset((r["relation"], r["target_id"]) for r in (rel_res.data or []))
+            return entity_context, attrs, edges
         except Exception as e:
             print(f"❌ Entity Service Error getting context: {e}")
-            return ""
+            return None
 
     # ── Batch Persistence ─────────────────────────────────────────────────────
 
     def persist_extraction(
         self, user_id: str, extraction: dict, source_session: str = None
     ):
-        """Persist a full extraction payload with rollback on failure."""
+        """Persist a full extraction payload (bulk unless ENTITY_BULK_PERSIST is off)."""
         if not db:
             return
+        if settings.ENTITY_BULK_PERSIST:
+            self._persist_extraction_bulk(user_id, extraction, source_session)
+        else:
+            self._persist_extraction_rowwise(user_id, extraction, source_session)
+            self._drop_snapshot(user_id)
+
+    @staticmethod
+    def _collect_extraction(extraction: dict):
+        """Canonical name → mention (first type/description wins, attributes merged)
+        plus deduplicated (source, target, relation) triples."""
+        mentions: "OrderedDict[str, dict]" = OrderedDict()
+
+        def _mention(name: str, entity_type: str, description=None, attributes=None):
+            canonical = name.strip().lower()
+            m = mentions.get(canonical)
+            if m is None:
+                m = mentions[canonical] = {
+                    "display": name.strip(),
+                    "type": entity_type,
+                    "description": description,
+                    "attributes": {},
+                }
+            for key, value in (attributes or {}).items():
+                if key and value is not None:
+                    m["attributes"][str(key)] = str(value)
+            return canonical
+
+        for ent in extraction.get("entities", []):
+            name = ent.get("name", "").strip()
+            if name:
+                _mention(
+                    name, ent.get("type", "person"), ent.get("description"),
+                    ent.get("attributes") or {},
+                )
+
+        relations: "OrderedDict[Tuple[str, str, str], None]" = OrderedDict()
+        for rel in extraction.get("relations", []):
+            src = rel.get("source", "").strip()
+            tgt = rel.get("target", "").strip()
+            relation = rel.get("relation", "").strip()
+            if src and tgt and relation:
+                relations[(_mention(src, "concept"), _mention(tgt, "concept"), relation)] = None
+        return mentions, list(relations)
+
+    def _resolve_entities_bulk(
+        self, user_id: str, mentions: dict, now: str,
+    ) -> Tuple[Dict[str, str], List[dict]]:
+        """(canonical → entity_id for every mention, rows to insert): one select for
+        exact names, the name index for near-duplicates, client-side ids for the rest.
+        Mention counts go to the aggregated counter, not the DB."""
+        res = (
+            db.table("entities")
+            .select("id, canonical_name")
+            .eq("user_id", user_id)
+            .in_("canonical_name", list(mentions))
+            .execute()
+        )
+        ids: Dict[str, str] = {row["canonical_name"]: row["id"] for row in res.data or []}
+        self.mentions.add_many(ids.values(), now)
+
+        index = self._name_index(user_id)
+        fuzzy_ids: List[str] = []
+        misses: List[Tuple[str, str]] = []  # (canonical, entity_type)
+        for canonical, m in mentions.items():
+            if canonical in ids:
+                continue
+            fuzzy_id, ratio, _ = index.best_match(canonical, FUZZY_MATCH_THRESHOLD)
+            if fuzzy_id:
+                print(f"🔁 Entity dedup: '{canonical}' matched existing (ratio={ratio:.2f})")
+                ids[canonical] = fuzzy_id
+                fuzzy_ids.append(fuzzy_id)
+            else:
+                entity_type = m["type"] if m["type"] in VALID_ENTITY_TYPES else "person"
+                misses.append((canonical, entity_type))
+
+        # All lexical misses resolved against the entity vectors in one pass
+        for (canonical, _), entity_id in zip(misses, self._resolve_semantic(user_id, misses)):
+            if entity_id:
+                ids[canonical] = entity_id
+                fuzzy_ids.append(entity_id)
+        self.mentions.add_many(fuzzy_ids, now, delta=0)
+
+        pending = NameIndex()              # new names in this batch, for in-batch dedup
+        new_rows = []
+        for canonical, entity_type in misses:
+            if canonical in ids:
+                continue
+            twin, _, _ = pending.best_match(canonical, FUZZY_MATCH_THRESHOLD)
+            if twin:
+                ids[canonical] = ids[twin]
+                continue
+            # Ids are assigned here so attributes / relations can reference new
+            # entities in the same write
+            m = mentions[canonical]
+            entity_id = str(uuid.uuid4())
+            pending.add(canonical, canonical)
+            ids[canonical] = entity_id
+            new_rows.append({
+                "id": entity_id,
+                "user_id": user_id,
+                "canonical_name": canonical,
+                "display_name": m["display"],
+                "entity_type": entity_type,
+                "description": m["description"] or None,
+            })
+        return ids, new_rows
+
+    def _persist_extraction_bulk(
+        self, user_id: str, extraction: dict, source_session: str = None
+    ):
+        """Entities, attributes and relations in one RPC, or a handful of set-based requests."""
+        mentions, relations = self._collect_extraction(extraction)
+        if not mentions:
+            return
+        now = datetime.now().isoformat()
+        try:
+            ids, new_rows = self._resolve_entities_bulk(user_id, mentions, now)
+        except Exception as e:
+            print(f"❌ Entity Service: persist_extraction FAILED: {e}")
+            return
+
+        # Last value wins per (entity, key) — several names may fold into one entity
+        attributes: Dict[Tuple[str, str], dict] = {}
+        for canonical, m in mentions.items():
+            entity_id = ids.get(canonical)
+            if not entity_id:
+                continue
+            for key, value in m["attributes"].items():
+                row = {
+                    "entity_id": entity_id,
+                    "attribute_key": key,
+                    "attribute_value": value,
+                    "updated_at": now,
+                }
+                if source_session:
+                    row["source_session"] = source_session
+                attributes[(entity_id, key)] = row
+
+        edges: Dict[Tuple[str, str, str], dict] = {}
+        for src, tgt, relation in relations:
+            src_id, tgt_id = ids.get(src), ids.get(tgt)
+            if src_id and tgt_id:
+                row = {
+                    "user_id": user_id,
+                    "source_id": src_id,
+                    "target_id": tgt_id,
+                    "relation": relation,
+                    "updated_at": now,
+                }
+                if source_session:
+                    row["source_session"] = source_session
+                edges[(src_id, tgt_id, relation)] = row
+
+        payload = (new_rows, list(attributes.values()), list(edges.values()))
+        written = self._write_extraction_rpc(*payload)
+        if written is None:
+            written = self._write_extraction_tables(*payload)
+        if not written:
+            return
+
+        self._index_insert(user_id, [
+            (row["id"], row["canonical_name"], row["entity_type"]) for row in new_rows
+        ])
+        self._invalidate_contexts(user_id, attributes.values(), edges.values())
+        if new_rows or attributes or edges:
+            self._drop_snapshot(user_id)
+        print(
+            f"✅ Entity Service: Persisted {len(set(ids.values()))} entities "
+            f"({len(new_rows)} new, {len(attributes)} attributes, "
+            f"{len(edges)} relations) for user {user_id}"
+        )
+
+    def _write_extraction_rpc(
+        self, entities: List[dict], attributes: List[dict], relations: List[dict]
+    ) -> Optional[bool]:
+        """One atomic call to the persist_extraction SQL function.
+
+        None when the function is unavailable (use table requests instead); False
+        when the transaction failed, in which case nothing was written.
+        """
+        if not settings.ENTITY_PERSIST_RPC or not self._persist_rpc_available:
+            return None
+        try:
+            db.rpc(PERSIST_RPC, {
+                "p_entities": entities,
+                "p_attributes": attributes,
+                "p_relations": relations,
+            }).execute()
+            metrics.inc("entity_persist_total", backend="rpc", outcome="ok")
+        except Exception as e:
+            if not is_missing_function(e):
+                # Rolled back server-side: nothing was written, nothing to undo
+                print(f"❌ Entity Service: persist_extraction FAILED (rolled back): {e}")
+                metrics.inc("entity_persist_total", backend="rpc", outcome="error")
+                return False
+            print(f"⚠️ Entity Service: {PERSIST_RPC} RPC unavailable, using table requests: {e}")
+            self._persist_rpc_available = False
+            return None
+        return True
+
+    def _write_extraction_tables(
+        self, entities: List[dict], attributes: List[dict], relations: List[dict]
+    ) -> bool:
+        """Fallback: one request per table; new entities are deleted again on failure."""
+        try:
+            if entities:
+                db.table("entities").insert(entities).execute()
+            if attributes:
+                db.table("entity_attributes").upsert(
+                    attributes, on_conflict="entity_id,attribute_key"
+                ).execute()
+            if relations:
+                db.table("entity_relations").upsert(
+                    relations, on_conflict="source_id,target_id,relation"
+                ).execute()
+        except Exception as e:
+            print(f"❌ Entity Service: persist_extraction FAILED: {e}")
+            metrics.inc("entity_persist_total", backend="tables", outcome="error")
+            self._rollback_entities([row["id"] for row in entities])
+            return False
+        metrics.inc("entity_persist_total", backend="tables", outcome="ok")
+        return True
+
+    def close(self):
+        """Apply pending mention counts (called at shutdown)."""
+        if self.mentions:
+            self.mentions.close()
+
+    def _rollback_entities(self, entity_ids: List[str]):
+        """Delete entities created by a failed table write (pre-existing ones are kept)."""
+        if not entity_ids:
+            return
+        print(f"   Rolling back {len(entity_ids)} orphaned entities...")
+        try:
+            db.table("entity_attributes").delete().in_("entity_id", entity_ids).execute()
+            db.table("entity_relations").delete().in_("source_id", entity_ids).execute()
+            db.table("entity_relations").delete().in_("target_id", entity_ids).execute()
+            db.table("entities").delete().in_("id", entity_ids).execute()
+        except Exception as cleanup_err:
+            print(f"   ⚠️ Rollback error: {cleanup_err}")
+
+    def _persist_extraction_rowwise(
+        self, user_id: str, extraction: dict, source_session: str = None
+    ):
+        """Original per-entity path: one round-trip per entity / attribute / relation."""
         entity_name_to_id: Dict[str, str] = {}
         created_entity_ids: List[str] = []
 
@@ -297,6 +772,7 @@ class EntityService:
                     db.table("entities").delete().eq("id", eid).execute()
                 except Exception as cleanup_err:
                     print(f"   ⚠️ Rollback error for entity {eid}: {cleanup_err}")
+            self.forget_entities(created_entity_ids, user_id)
 
     # ── Conflicts & Events ────────────────────────────────────────────────────
 
@@ -0,0 +1,388 @@
+"""
+FakeLLM — deterministic in-process stand-in for the Groq SDK (LLM_BACKEND=fake).
+Returns schema-valid JSON for every extraction prompt, supports streaming, and
+injects configurable latency and error rates for load / tail-latency testing.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from typing import List
+
+import httpx
+from groq import InternalServerError, RateLimitError
+from groq.types.chat import ChatCompletion, ChatCompletionChunk
+
+_URL = "https://fake-llm.local/openai/v1/chat/completions"
+_CAPITALIZED = re.compile(r"\b([A-Z][a-z]{2,})\b")
+_TIME_WORDS = re.compile(
+    r"(?i)\b(tomorrow|tonight|today|next \w+|monday|tuesday|wednesday|thursday|"
+    r"friday|saturday|sunday|\d{1,2}\s?(?:am|pm)|deadline|meeting)\b"
+)
+_STOPWORDS = {
+    "The", "This", "That", "What", "When", "Where", "Who", "Why", "How", "And",
+    "But", "Yes", "Yeah", "Okay", "Hey", "User", "Others", "Llm", "Return", "Json",
+}
+_ADVICE = [
+    "Ask a follow-up question about what they just said.",
+    "Mirror their last point, then share your own view briefly.",
+    "Slow down and let them finish before responding.",
+    "Acknowledge their concern before moving on.",
+    "Bring up the topic you discussed last time.",
+]
+
+
+class FakeLLMConfig:
+    """Latency / error knobs for the stand-in backend."""
+
+    def __init__(
+        self,
+        latency_ms: float = 150.0,
+        latency_dist: str = "lognormal",
+        latency_sigma: float = 0.5,
+        token_ms: float = 15.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = 42,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.token_ms = token_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.seed = seed
+
+
+class FakeLLMEngine:
+    """Shared RNG + response synthesis; one engine backs every fake client."""
+
+    def __init__(self, config: FakeLLMConfig):
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+
+    # ── Latency & Faults ──────────────────────────────────────────────────────
+
+    def sample_latency(self) -> float:
+        """Seconds of time-to-first-byte drawn from the configured distribution."""
+        c = self.config
+        with self._lock:
+            if c.latency_dist == "fixed":
+                ms = c.latency_ms
+            elif c.latency_dist == "uniform":
+                ms = self._rng.uniform(0, 2 * c.latency_ms)
+            else:  # lognormal: median = latency_ms, long right tail
+                ms = c.latency_ms * self._rng.lognormvariate(0, c.latency_sigma)
+        return max(ms, 0.0) / 1000.0
+
+    def maybe_fail(self):
+        """Raise a Groq-shaped 429 / 500 according to the configured rates."""
+        with self._lock:
+            roll = self._rng.random()
+        request = httpx.Request("POST", _URL)
+        if roll < self.config.rate_limit_rate:
+            response = httpx.Response(
+                429, request=request,
+                headers={"retry-after": "1", "x-ratelimit-remaining-requests": "0"},
+            )
+            raise RateLimitError("fake rate limit", response=response, body=None)
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            response = httpx.Response(500, request=request)
+            raise InternalServerError("fake upstream error", response=response, body=None)
+
+    # ── Content Synthesis ─────────────────────────────────────────────────────
+
+    @staticmethod
+    def _digest(model: str, messages: List[dict]) -> int:
+        raw = model + json.dumps(messages, sort_keys=True, default=str)
+        return int(hashlib.sha256(raw.encode()).hexdigest()[:12], 16)
+
+    @staticmethod
+    def _names(text: str) -> List[str]:
+        seen: List[str] = []
+        for name in _CAPITALIZED.findall(text):
+            if name not in _STOPWORDS and name not in seen:
+                seen.append(name)
+        return seen[:4]
+
+    def _json_payload(self, prompt: str, text: str) -> dict:
+        names = self._names(text)
+        if '"user_talk_pct"' in prompt:
+            return {
+                "user_talk_pct": 50.0, "others_talk_pct": 50.0,
+                "key_topics": names[:3] or ["general conversation"],
+                "key_decisions": [], "action_items": [],
+                "follow_up_people": names[:2], "filler_words": ["um"],
+                "filler_word_count": text.lower().count(" um"),
+                "tone_summary": "Friendly and balanced.",
+                "engagement_trend": "stable",
+                "suggestions": ["Ask more open questions."],
+                "strengths": ["Good listening."],
+                "report_text": "A balanced conversation with steady engagement.",
+            }
+        if '"topics"' in prompt:  # coaching: notes on one transcript window
+            lower = text.lower()
+            return {
+                "topics": names[:3] or ["general conversation"],
+                "decisions": [], "action_items": [],
+                "people": names[:3],
+                "filler_words": [w for w in ("um", "uh", "like") if f" {w} " in f" {lower} "],
+                "tone": "friendly", "strengths": ["Good listening."],
+                "improvements": ["Ask more open questions."],
+            }
+        if "JSON notes on consecutive parts" in prompt:  # coaching: merge notes
+            merged: dict = {}
+            for line in text.splitlines():
+                try:
+                    note = json.loads(line)
+                except ValueError:
+                    continue  # the last note may be cut off at the prompt limit
+                for key, value in note.items():
+                    if isinstance(value, list):
+                        items = merged.setdefault(key, [])
+                        items.extend(v for v in value if v not in items)
+                        del items[5:]
+                    else:
+                        merged.setdefault(key, value)
+            return merged
+        if '"intent"' in prompt:
+            lower = text.lower()
+            if "start" in lower and "session" in lower:
+                return {"intent": "start_session", "query": ""}
+            if "session" in lower or "history" in lower:
+                return {"intent": "view_sessions", "query": ""}
+            if "home" in lower:
+                return {"intent": "go_home", "query": ""}
+            if "?" in text or lower.startswith(("what", "who", "how", "why", "when")):
+                return {"intent": "ask_consultant", "query": text}
+            return {"intent": "general_chat", "query": ""}
+        if '"conflicts"' in prompt:
+            return {"conflicts": []}
+        if '"events"' in prompt:
+            match = _TIME_WORDS.search(text)
+            if not match:
+                return {"events": []}
+            return {"events": [{
+                "title": f"Follow up {('with ' + names[0]) if names else ''}".strip(),
+                "due_text": match.group(0),
+                "related_entity": names[0] if names else None,
+                "description": text[:120],
+            }]}
+        if '"entities"' in prompt:
+            entities = [
+                {"name": n, "type": "person", "attributes": {"mentioned": "yes"}}
+                for n in names
+            ]
+            relations = (
+                [{"source": names[0], "target": names[1], "relation": "knows"}]
+                if len(names) >= 2 else []
+            )
+            return {"entities": entities, "relations": relations}
+        if "'relationships'" in prompt or '"relationships"' in prompt:
+            return {"relationships": (
+                [{"source": names[0], "target": names[1], "relation": "knows"}]
+                if len(names) >= 2 else []
+            )}
+        return {}
+
+    def _text(self, prompt: str, text: str, h: int, max_tokens: int) -> str:
+        if "Wingman AI" in prompt:
+            return "WAITING" if h % 3 == 0 else _ADVICE[h % len(_ADVICE)]
+        if "roleplay" in prompt:
+            return "Honestly, I've been thinking about that too."
+        if prompt.startswith("Summarise") or "Merge them into a single" in prompt:
+            names = ", ".join(self._names(text)) or "several topics"
+            return f"The conversation covered {names}. Both sides shared updates."
+        words = (
+            "Based on what you've shared, focus on one concrete next step and "
+            "revisit it after your next conversation. "
+        ).split()
+        n = max(min(max_tokens // 2, 120), 8)
+        return " ".join(words[i % len(words)] for i in range(n)) + " — Bubbles"
+
+    def respond(self, model: str, messages: List[dict], params: dict) -> str:
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = next(
+            (m["content"] for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        prompt = system or user
+        h = self._digest(model, messages)
+        if (params.get("response_format") or {}).get("type") == "json_object":
+            return json.dumps(self._json_payload(prompt, user))
+        return self._text(prompt, user, h, int(params.get("max_tokens") or 256))
+
+    # ── Wire Objects ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def usage(messages: List[dict], content: str) -> dict:
+        prompt_tokens = sum(
+            int(len(str(m.get("content", "")).split()) * 1.3) for m in messages
+        )
+        completion_tokens = int(len(content.split()) * 1.3) + 1
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def completion(self, model: str, messages: List[dict], content: str) -> ChatCompletion:
+        return ChatCompletion.model_validate({
+            "id": f"fake-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": self.usage(messages, content),
+        })
+
+    def chunks(self, model: str, messages: List[dict], content: str) -> List[ChatCompletionChunk]:
+        cid = f"fake-{uuid.uuid4().hex[:12]}"
+        pieces = re.findall(r"\S+\s*", content) or [content]
+        out = [
+            ChatCompletionChunk.model_validate({
+                "id": cid, "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {"content": p}, "finish_reason": None}],
+            })
+            for p in pieces
+        ]
+        out.append(ChatCompletionChunk.model_validate({
+            "id": cid, "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"id": cid, "usage": self.usage(messages, content)},
+        }))
+        return out
+
+    @staticmethod
+    def headers() -> httpx.Headers:
+        return httpx.Headers({
+            "x-ratelimit-limit-requests": "14400",
+            "x-ratelimit-remaining-requests": "14399",
+            "x-ratelimit-reset-requests": "6s",
+            "x-ratelimit-limit-tokens": "1000000",
+            "x-ratelimit-remaining-tokens": "999000",
+            "x-ratelimit-reset-tokens": "60ms",
+        })
+
+
+# ── Sync Client ───────────────────────────────────────────────────────────────
+
+class _FakeRaw:
+    def __init__(self, result, headers):
+        self.headers = headers
+        self._result = result
+
+    def parse(self):
+        return self._result
+
+
+class _FakeStream:
+    def __init__(self, chunks, delay: float):
+        self._chunks = chunks
+        self._delay = delay
+
+    def __iter__(self):
+        for i, chunk in enumerate(self._chunks):
+            if i:
+                time.sleep(self._delay)
+            yield chunk
+
+
+class _FakeCompletions:
+    def __init__(self, engine: FakeLLMEngine):
+        self._engine = engine
+        self.with_raw_response = self
+
+    def create(self, *, messages, model, stream: bool = False, **params):
+        time.sleep(self._engine.sample_latency())
+        self._engine.maybe_fail()
+        content = self._engine.respond(model, messages, params)
+        if stream:
+            result = _FakeStream(
+                self._engine.chunks(model, messages, content), self._engine.config.token_ms / 1000
+            )
+        else:
+            result = self._engine.completion(model, messages, content)
+        return _FakeRaw(result, self._engine.headers())
+
+
+class _FakeChat:
+    def __init__(self, completions):
+        self.completions = completions
+
+
+class FakeGroq:
+    """Drop-in for `groq.Groq` exposing chat.completions[.with_raw_response].create."""
+
+    def __init__(self, engine: FakeLLMEngine):
+        self.chat = _FakeChat(_FakeCompletions(engine))
+
+
+# ── Async Client ──────────────────────────────────────────────────────────────
+
+class _FakeAsyncRaw(_FakeRaw):
+    async def parse(self):
+        return self._result
+
+
+class _FakeAsyncStream:
+    def __init__(self, chunks, delay: float):
+        self._chunks = chunks
+        self._delay = delay
+
+    async def __aiter__(self):
+        for i, chunk in enumerate(self._chunks):
+            if i:
+                await asyncio.sleep(self._delay)
+            yield chunk
+
+
+class _FakeAsyncCompletions:
+    def __init__(self, engine: FakeLLMEngine):
+        self._engine = engine
+        self.with_raw_response = self
+
+    async def create(self, *, messages, model, stream: bool = False, **params):
+        await asyncio.sleep(self._engine.sample_latency())
+        self._engine.maybe_fail()
+        content = self._engine.respond(model, messages, params)
+        if stream:
+            result = _FakeAsyncStream(
+                self._engine.chunks(model, messages, content), self._engine.config.token_ms / 1000
+            )
+        else:
+            result = self._engine.completion(model, messages, content)
+        return _FakeAsyncRaw(result, self._engine.headers())
+
+
+class FakeAsyncGroq:
+    """Drop-in for `groq.AsyncGroq`."""
+
+    def __init__(self, engine: FakeLLMEngine):
+        self.chat = _FakeChat(_FakeAsyncCompletions(engine))
+
+
+def build_engine(settings) -> FakeLLMEngine:
+    """Create the shared engine from `Settings.FAKE_LLM_*` values."""
+    return FakeLLMEngine(
+        FakeLLMConfig(
+            latency_ms=settings.FAKE_LLM_LATENCY_MS,
+            latency_dist=settings.FAKE_LLM_LATENCY_DIST,
+            latency_sigma=settings.FAKE_LLM_LATENCY_SIGMA,
+            token_ms=settings.FAKE_LLM_TOKEN_MS,
+            error_rate=settings.FAKE_LLM_ERROR_RATE,
+            rate_limit_rate=settings.FAKE_LLM_RATE_LIMIT_RATE,
+            seed=settings.FAKE_LLM_SEED,
+        )
+    )
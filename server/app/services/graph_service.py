@@ -122,6 +122,17 @@ class GraphService:
         context_str = "\n".join(list(set(facts))[:top_k])
         return context_str if context_str else "No known graph facts."
 
+    def count_entity_hits(self, user_id: str, text: str) -> int:
+        """Number of known graph nodes mentioned verbatim in `text`."""
+        G = self.active_graphs.get(user_id)
+        if G is None or len(G.nodes()) == 0:
+            return 0
+        text_lower = text.lower()
+        return sum(
+            1 for node in G.nodes()
+            if len(str(node)) > 2 and str(node).lower() in text_lower
+        )
+
     # ── Graph Mutation ────────────────────────────────────────────────────────
 
     def update_local_graph(self, user_id: str, updates: List[dict]):
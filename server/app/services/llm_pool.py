@@ -0,0 +1,276 @@
+"""
+LLMClientPool — multi-key Groq client manager.
+One tuned keep-alive / HTTP/2 client pair per API key, least-loaded or
+round-robin key selection, and per-key token buckets fed by rate-limit headers.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient, DefaultHttpxClient, Groq
+
+from app.services.fake_llm import FakeAsyncGroq, FakeGroq
+from app.utils.llm_retry import retry_after_seconds
+from app.utils.metrics import metrics
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse Groq reset headers such as '2m59.56s', '7.66s' or '120ms'."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNIT_SECONDS[u] for n, u in parts)
+
+
+class _TokenBucket:
+    """Local mirror of one upstream rate-limit window (requests or tokens)."""
+
+    __slots__ = ("limit", "remaining", "reset_at")
+
+    def __init__(self):
+        self.limit: Optional[float] = None
+        self.remaining: Optional[float] = None
+        self.reset_at = 0.0
+
+    def refill(self, now: float):
+        if self.limit is not None and now >= self.reset_at:
+            self.remaining = self.limit
+
+    def take(self, amount: float):
+        if self.remaining is not None:
+            self.remaining = max(self.remaining - amount, 0.0)
+
+    def sync(self, limit, remaining, reset_in, now: float):
+        """Overwrite local estimate with authoritative header values."""
+        try:
+            if limit is not None:
+                self.limit = float(limit)
+            if remaining is not None:
+                self.remaining = float(remaining)
+        except ValueError:
+            return
+        if reset_in is not None:
+            self.reset_at = now + reset_in
+
+    def fraction(self) -> float:
+        if self.limit is None or self.remaining is None or self.limit <= 0:
+            return 1.0
+        return self.remaining / self.limit
+
+    def can_afford(self, amount: float) -> bool:
+        return self.remaining is None or self.remaining >= amount
+
+
+class KeySlot:
+    """One API key with its clients, in-flight count and rate-limit buckets."""
+
+    __slots__ = (
+        "index", "label", "client", "aclient", "in_flight", "calls",
+        "requests", "tokens", "cooldown_until",
+    )
+
+    def __init__(self, index: int, client, aclient):
+        self.index = index
+        self.label = f"key{index}"
+        self.client = client
+        self.aclient = aclient
+        self.in_flight = 0
+        self.calls = 0
+        self.requests = _TokenBucket()
+        self.tokens = _TokenBucket()
+        self.cooldown_until = 0.0
+
+    def available(self, now: float, est_tokens: float) -> bool:
+        return (
+            now >= self.cooldown_until
+            and self.requests.can_afford(1)
+            and self.tokens.can_afford(est_tokens)
+        )
+
+    def next_ready_at(self) -> float:
+        return max(self.cooldown_until, self.requests.reset_at, self.tokens.reset_at)
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "key": self.label,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "remaining_requests": self.requests.remaining,
+            "remaining_tokens": self.tokens.remaining,
+            "cooldown_s": round(max(self.cooldown_until - now, 0.0), 2),
+        }
+
+
+class LLMClientPool:
+    """Hands out per-key Groq clients so throughput scales with the number of keys."""
+
+    STRATEGIES = ("least_loaded", "round_robin")
+
+    def __init__(
+        self,
+        keys: List[str],
+        strategy: str = "least_loaded",
+        max_connections: int = 20,
+        keepalive_seconds: float = 60.0,
+        http2: bool = True,
+        timeout: float = 30.0,
+        fake_engine=None,
+    ):
+        keys = [k for k in keys if k] or [""]
+        self.fake_engine = fake_engine
+        self.strategy = strategy if strategy in self.STRATEGIES else "least_loaded"
+        self._rr = 0
+        self._lock = threading.Lock()
+        self.slots: List[KeySlot] = [
+            KeySlot(
+                i,
+                self._build_client(k, max_connections, keepalive_seconds, http2, timeout),
+                self._build_aclient(k, max_connections, keepalive_seconds, http2, timeout),
+            )
+            for i, k in enumerate(keys)
+        ]
+        print(
+            f"🔑 LLM Pool: {len(self.slots)} key(s), strategy={self.strategy}, "
+            f"http2={http2}, backend={'fake' if fake_engine else 'groq'}"
+        )
+
+    # ── Client Construction ───────────────────────────────────────────────────
+
+    @staticmethod
+    def _limits(max_connections: int, keepalive_seconds: float) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_seconds,
+        )
+
+    def _build_client(self, key, max_connections, keepalive_seconds, http2, timeout):
+        if self.fake_engine is not None:
+            return FakeGroq(self.fake_engine)
+        # SDK-level retries are disabled; LLMCallGuard owns retry + breaker logic
+        return Groq(
+            api_key=key,
+            max_retries=0,
+            http_client=DefaultHttpxClient(
+                http2=http2,
+                limits=self._limits(max_connections, keepalive_seconds),
+                timeout=httpx.Timeout(timeout, connect=5.0),
+            ),
+        )
+
+    def _build_aclient(self, key, max_connections, keepalive_seconds, http2, timeout):
+        if self.fake_engine is not None:
+            return FakeAsyncGroq(self.fake_engine)
+        return AsyncGroq(
+            api_key=key,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                http2=http2,
+                limits=self._limits(max_connections, keepalive_seconds),
+                timeout=httpx.Timeout(timeout, connect=5.0),
+            ),
+        )
+
+    # ── Key Selection ─────────────────────────────────────────────────────────
+
+    def _pick(self, est_tokens: float) -> KeySlot:
+        now = time.monotonic()
+        for slot in self.slots:
+            slot.requests.refill(now)
+            slot.tokens.refill(now)
+        candidates = [s for s in self.slots if s.available(now, est_tokens)]
+        if not candidates:
+            # Every key is throttled — use the one that frees up soonest
+            metrics.inc("llm_pool_exhausted_total")
+            return min(self.slots, key=lambda s: (s.next_ready_at(), s.in_flight))
+        if self.strategy == "round_robin":
+            return min(candidates, key=lambda s: (s.index - self._rr) % len(self.slots))
+        return min(
+            candidates,
+            key=lambda s: (s.in_flight, -s.tokens.fraction(), (s.index - self._rr) % len(self.slots)),
+        )
+
+    def acquire(self, est_tokens: float = 0) -> KeySlot:
+        """Reserve a key slot; pair every call with `release`."""
+        with self._lock:
+            slot = self._pick(est_tokens)
+            slot.in_flight += 1
+            slot.calls += 1
+            slot.requests.take(1)
+            slot.tokens.take(est_tokens)
+            self._rr = (self._rr + 1) % len(self.slots)
+        metrics.inc("llm_pool_dispatch_total", key=slot.label)
+        return slot
+
+    def release(self, slot: KeySlot):
+        with self._lock:
+            slot.in_flight = max(slot.in_flight - 1, 0)
+
+    @contextmanager
+    def lease(self, est_tokens: float = 0) -> Iterator[KeySlot]:
+        slot = self.acquire(est_tokens)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    # ── Rate-Limit Accounting ─────────────────────────────────────────────────
+
+    def record_headers(self, slot: KeySlot, headers):
+        """Sync a slot's buckets from x-ratelimit-* response headers."""
+        if not headers:
+            return
+        now = time.monotonic()
+        with self._lock:
+            slot.requests.sync(
+                headers.get("x-ratelimit-limit-requests"),
+                headers.get("x-ratelimit-remaining-requests"),
+                parse_reset_duration(headers.get("x-ratelimit-reset-requests")),
+                now,
+            )
+            slot.tokens.sync(
+                headers.get("x-ratelimit-limit-tokens"),
+                headers.get("x-ratelimit-remaining-tokens"),
+                parse_reset_duration(headers.get("x-ratelimit-reset-tokens")),
+                now,
+            )
+        if slot.tokens.remaining is not None:
+            metrics.set_gauge(
+                "llm_pool_remaining_tokens", slot.tokens.remaining, key=slot.label
+            )
+
+    def record_error(self, slot: KeySlot, exc: BaseException):
+        """On 429, bench the key for its Retry-After window so others take over."""
+        if getattr(exc, "status_code", None) != 429:
+            return
+        cooldown = retry_after_seconds(exc) or 1.0
+        with self._lock:
+            slot.cooldown_until = time.monotonic() + cooldown
+        metrics.inc("llm_pool_rate_limited_total", key=slot.label)
+        print(f"🔑 LLM Pool: {slot.label} rate-limited, cooling down {cooldown:.1f}s")
+
+    def has_available_key(self, est_tokens: float = 0) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return any(s.available(now, est_tokens) for s in self.slots)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "keys": [s.snapshot(now) for s in self.slots],
+            }
@@ -0,0 +1,230 @@
+"""
+SessionLogWriter — buffered, ordered bulk writer for session_logs and
+sentiment_logs.
+Request handlers enqueue rows into a bounded queue; one background thread
+bulk-inserts them by size or interval. Rows are written in enqueue order, so
+per-session order is preserved. `flush()` gives read-your-writes before
+transcripts are read back, and `close()` drains at shutdown.
+"""
+
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.metrics import metrics
+
+# Tables are written in this order within a batch (parents before side rows)
+_TABLE_ORDER = ("session_logs", "sentiment_logs")
+
+_FLUSH = object()
+_STOP = object()
+
+
+class SessionLogWriter:
+    """Bounded queue + single writer thread doing bulk inserts."""
+
+    def __init__(
+        self,
+        db,
+        queue_size: int = 5000,
+        batch_size: int = 200,
+        flush_interval: float = 0.25,
+        attempts: int = 3,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.attempts = attempts
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._seq = 0                          # last sequence number handed out
+        self._written_seq = 0                  # every item <= this is persisted (or dropped)
+        self._session_seq: Dict[str, int] = {}  # session_id → its last queued seq
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    # ── Producer Side ─────────────────────────────────────────────────────────
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="session-log-writer", daemon=True
+                    )
+                    self._thread.start()
+
+    def enqueue(self, session_id: str, rows: List[Tuple[str, dict]]):
+        """Queue `(table, row)` pairs for one session, in order.
+
+        If the queue is full (DB badly lagging) the rows are written inline
+        instead of dropped; their created_at / turn_index still carry order.
+        """
+        if not self.try_enqueue(session_id, rows):
+            self.write_overflow(rows)
+
+    def try_enqueue(self, session_id: str, rows: List[Tuple[str, dict]]) -> bool:
+        """Queue without blocking; False if the rows must go through `write_overflow`.
+
+        Lets callers that queue under their own lock do the slow inline write
+        after releasing it.
+        """
+        if not rows:
+            return True
+        if self._closed:
+            return False
+        self._ensure_started()
+        # Sequence numbers are taken under the lock together with the put, so
+        # queue order == sequence order and flush targets are exact.
+        with self._lock:
+            try:
+                self._queue.put_nowait((self._seq + 1, session_id, rows))
+                self._seq += 1
+                self._session_seq[session_id] = self._seq
+                queued = True
+            except queue.Full:
+                queued = False
+        metrics.set_gauge("session_log_queue_depth", self._queue.qsize())
+        return queued
+
+    def write_overflow(self, rows: List[Tuple[str, dict]]):
+        """Write rows the queue did not take (full, or the writer is closed)."""
+        if not self._closed:
+            metrics.inc("session_log_overflow_total")
+            print(f"⚠️ Log Writer: queue full, writing {len(rows)} row(s) inline")
+        self._write_inline(rows)
+
+    def flush(self, session_id: Optional[str] = None, timeout: float = 5.0) -> bool:
+        """Block until rows queued so far (for `session_id`, or all) are written."""
+        with self._lock:
+            target = self._session_seq.get(session_id, 0) if session_id else self._seq
+            if target <= self._written_seq:
+                return True
+        try:
+            self._queue.put(_FLUSH, timeout=timeout)
+        except queue.Full:
+            pass
+        deadline = time.monotonic() + timeout
+        with self._done:
+            while self._written_seq < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"⚠️ Log Writer: flush timed out (session={session_id})")
+                    return False
+                self._done.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Drain everything queued and stop the writer thread."""
+        self._closed = True
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        print(f"🛑 Log Writer: drained (written_seq={self._written_seq})")
+
+    # ── Writer Thread ─────────────────────────────────────────────────────────
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch, n_rows = [], 0
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    # Pick up anything that raced in behind the stop marker
+                    while True:
+                        try:
+                            extra = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if extra is not _FLUSH and extra is not _STOP:
+                            batch.append(extra)
+                    break
+                if item is _FLUSH:
+                    break
+                batch.append(item)
+                n_rows += len(item[2])
+                if n_rows >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch: list):
+        started = time.perf_counter()
+        by_table: Dict[str, List[dict]] = {}
+        for _, _, rows in batch:
+            for table, row in rows:
+                by_table.setdefault(table, []).append(row)
+        tables = [t for t in _TABLE_ORDER if t in by_table]
+        tables += [t for t in by_table if t not in _TABLE_ORDER]
+        for table in tables:
+            self._insert(table, self._uniform(by_table[table]))
+        metrics.observe("session_log_flush_ms", (time.perf_counter() - started) * 1000)
+        metrics.observe(
+            "session_log_batch_rows", sum(len(r) for r in by_table.values()),
+            (1, 5, 10, 25, 50, 100, 200, 500),
+        )
+        metrics.set_gauge("session_log_queue_depth", self._queue.qsize())
+        self._mark_written(batch[-1][0], [sid for _, sid, _ in batch])
+
+    @staticmethod
+    def _uniform(rows: List[dict]) -> List[dict]:
+        """PostgREST bulk inserts need identical keys; pad optional columns with None."""
+        keys = set().union(*rows)
+        if all(len(r) == len(keys) for r in rows):
+            return rows
+        return [{k: r.get(k) for k in keys} for r in rows]
+
+    def _insert(self, table: str, rows: List[dict]):
+        """Bulk insert with retries; falls back to row-by-row so one bad row can't sink the batch."""
+        for attempt in range(1, self.attempts + 1):
+            try:
+                self.db.table(table).insert(rows).execute()
+                metrics.inc("session_log_rows_total", len(rows), table=table, outcome="ok")
+                return
+            except Exception as e:
+                if attempt == self.attempts:
+                    print(f"⚠️ Log Writer: bulk insert into {table} failed ({e}), retrying per row")
+                else:
+                    time.sleep(0.2 * attempt)
+        for row in rows:
+            try:
+                self.db.table(table).insert(row).execute()
+                metrics.inc("session_log_rows_total", table=table, outcome="ok")
+            except Exception as e:
+                metrics.inc("session_log_rows_total", table=table, outcome="dropped")
+                print(f"❌ Log Writer: dropped {table} row for {row.get('session_id')}: {e}")
+
+    def _write_inline(self, rows: List[Tuple[str, dict]]):
+        for table, row in rows:
+            try:
+                self.db.table(table).insert(row).execute()
+            except Exception as e:
+                print(f"❌ Log Writer: inline insert into {table} failed: {e}")
+
+    def _mark_written(self, seq: int, session_ids: List[str]):
+        with self._done:
+            if seq > self._written_seq:
+                self._written_seq = seq
+            for sid in session_ids:
+                if self._session_seq.get(sid, 0) <= self._written_seq:
+                    self._session_seq.pop(sid, None)
+            self._done.notify_all()
@@ -0,0 +1,128 @@
+"""
+MentionCounter — aggregated entity mention counters.
+Every mention of a known entity used to issue its own read-modify-write
+`update` of mention_count / last_seen_at, which cost a round-trip per mention
+and lost increments when turns ran concurrently. Mentions are now summed in
+memory (delta, max last_seen) and a background thread applies them once per
+interval through the `bump_entity_mentions` RPC (sql/entity_functions.sql),
+which increments in place. Without the RPC, each entity gets one aggregated
+update per interval.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from app.database import is_missing_function
+from app.utils.metrics import metrics
+
+
+class MentionCounter:
+    """entity_id → [pending delta, latest last_seen_at]; flushed periodically."""
+
+    RPC = "bump_entity_mentions"
+
+    def __init__(self, db, flush_interval: float = 2.0):
+        self.db = db
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, List] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time, in order
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rpc_available = True
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="mention-counter", daemon=True
+                    )
+                    self._thread.start()
+
+    # ── Producer Side ─────────────────────────────────────────────────────────
+
+    def add(self, entity_id: str, seen_at: str, delta: int = 1):
+        """Record `delta` mentions (0 = only refresh last_seen_at)."""
+        self.add_many([entity_id], seen_at, delta)
+
+    def add_many(self, entity_ids: Iterable[str], seen_at: str, delta: int = 1):
+        with self._lock:
+            for entity_id in entity_ids:
+                entry = self._pending.get(entity_id)
+                if entry is None:
+                    self._pending[entity_id] = [delta, seen_at]
+                else:
+                    entry[0] += delta
+                    if seen_at > entry[1]:  # ISO timestamps compare lexically
+                        entry[1] = seen_at
+        if self._stop.is_set():
+            self.flush()
+        else:
+            self._ensure_started()
+
+    # ── Flushing ──────────────────────────────────────────────────────────────
+
+    def flush(self) -> int:
+        """Apply everything pending; failed batches are merged back for the next flush."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            updates = [
+                {"id": entity_id, "delta": delta, "last_seen_at": seen_at}
+                for entity_id, (delta, seen_at) in batch.items()
+            ]
+            try:
+                self._write(updates)
+            except Exception as e:
+                print(f"❌ Mention Counter: flush of {len(updates)} entities failed: {e}")
+                metrics.inc("entity_mention_flush_errors_total")
+                with self._lock:
+                    for u in updates:
+                        entry = self._pending.setdefault(u["id"], [0, u["last_seen_at"]])
+                        entry[0] += u["delta"]
+                        entry[1] = max(entry[1], u["last_seen_at"])
+                return 0
+            metrics.inc("entity_mention_flushes_total")
+            metrics.observe("entity_mention_flush_entities", len(updates), (1, 5, 20, 100, 500))
+            return len(updates)
+
+    def _write(self, updates: List[dict]):
+        if self._rpc_available:
+            try:
+                self.db.rpc(self.RPC, {"updates": updates}).execute()
+                return
+            except Exception as e:
+                if not is_missing_function(e):
+                    raise  # transient: the batch is merged back and retried via the RPC
+                # Function not deployed → aggregated per-entity updates from now on
+                print(f"⚠️ Mention Counter: {self.RPC} RPC unavailable, using table updates: {e}")
+                self._rpc_available = False
+        current = (
+            self.db.table("entities")
+            .select("id, mention_count, last_seen_at")
+            .in_("id", [u["id"] for u in updates])
+            .execute()
+        )
+        rows = {r["id"]: r for r in current.data or []}
+        for u in updates:
+            row = rows.get(u["id"])
+            if row is None:
+                continue  # entity deleted meanwhile
+            update = {"last_seen_at": max(row.get("last_seen_at") or "", u["last_seen_at"])}
+            if u["delta"]:
+                update["mention_count"] = (row.get("mention_count", 1) or 1) + u["delta"]
+            self.db.table("entities").update(update).eq("id", u["id"]).execute()
+
+    def close(self):
+        """Stop the flusher and apply what is left (called at shutdown)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 5)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
@@ -0,0 +1,163 @@
+"""
+ModelRouter — latency-aware routing between WINGMAN_MODEL (8B) and
+CONSULTANT_MODEL (70B) for consultant questions.
+Cheap features only: length, known-entity hits, embedding similarity to
+simple/complex intent exemplars, and an optional per-request latency budget.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+# Look-up style questions the 8B model answers as well as the 70B
+_SIMPLE_INTENTS = [
+    "who is Ali?",
+    "what is my sister's name?",
+    "when is my next meeting?",
+    "where does Sara work?",
+    "what did I talk about last time?",
+    "remind me what we discussed",
+    "what is Omar's phone number?",
+    "how old is my brother?",
+    "what's the deadline for the report?",
+    "who did I meet yesterday?",
+]
+
+# Open-ended reasoning / planning questions that deserve the 70B model
+_COMPLEX_INTENTS = [
+    "how should I handle the conflict with my manager?",
+    "help me plan a strategy for the negotiation next week",
+    "why do my conversations with my father keep going badly?",
+    "compare my last three sessions and tell me how I've improved",
+    "what should I say to convince the investors?",
+    "give me detailed advice on improving my relationship",
+    "analyse my communication style and suggest changes",
+]
+
+_REASONING_CUES = (
+    "why", "how should", "how do i", "how can i", "should i", "strategy",
+    "plan", "advice", "analy", "compare", "improve", "explain", "convince",
+)
+
+# Fallback latency estimates (ms) until live metrics exist
+_DEFAULT_LATENCY_MS = {"small": 700.0, "large": 2500.0}
+
+
+@dataclass(frozen=True)
+class RouteDecision:
+    """Which model to call and why."""
+
+    model: str
+    max_tokens: int
+    tier: str            # "simple" | "complex"
+    reason: str
+    score: float         # >0 leans simple, <0 leans complex
+    est_savings_ms: float = 0.0
+
+    @property
+    def can_escalate(self) -> bool:
+        return self.tier == "simple" and self.model != settings.CONSULTANT_MODEL
+
+
+class ModelRouter:
+    """Classifies question complexity and picks the cheapest adequate model."""
+
+    SIMPLE_MAX_TOKENS = 300
+
+    def __init__(self):
+        self.model = None  # Shared SentenceTransformer (set after VectorService init)
+        self._simple_vecs: Optional[np.ndarray] = None
+        self._complex_vecs: Optional[np.ndarray] = None
+        print("✅ Model Router: Initialized")
+
+    # ── Features ──────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _unit(vecs: np.ndarray) -> np.ndarray:
+        return vecs / (np.linalg.norm(vecs, axis=-1, keepdims=True) + 1e-10)
+
+    def _intent_similarity(self, question: str) -> Optional[tuple]:
+        """Max cosine similarity to (simple, complex) exemplars, or None."""
+        if self.model is None:
+            return None
+        try:
+            if self._simple_vecs is None:
+                self._simple_vecs = self._unit(
+                    self.model.encode(_SIMPLE_INTENTS, convert_to_numpy=True)
+                )
+                self._complex_vecs = self._unit(
+                    self.model.encode(_COMPLEX_INTENTS, convert_to_numpy=True)
+                )
+            q = self._unit(self.model.encode(question, convert_to_numpy=True))
+            return float((self._simple_vecs @ q).max()), float((self._complex_vecs @ q).max())
+        except Exception as e:
+            print(f"⚠️ Model Router: embedding failed, using lexical features: {e}")
+            return None
+
+    @staticmethod
+    def _expected_latency_ms(model: str, tier: str) -> float:
+        """Observed mean consultant latency for a model, else a static default."""
+        hist = metrics.histogram("llm_call_duration_ms", model=model, op="consultant")
+        if hist and hist["count"] >= 5:
+            return hist["avg"]
+        return _DEFAULT_LATENCY_MS["small" if tier == "simple" else "large"]
+
+    # ── Routing ───────────────────────────────────────────────────────────────
+
+    def route(
+        self,
+        question: str,
+        entity_hits: int = 0,
+        latency_budget_ms: Optional[int] = None,
+    ) -> RouteDecision:
+        """Pick a model for `question` under an optional latency budget."""
+        small, large = settings.WINGMAN_MODEL, settings.CONSULTANT_MODEL
+        words = len(question.split())
+        lower = question.lower()
+
+        score = 0.0
+        if words <= 12:
+            score += 1.0
+        elif words > 40:
+            score -= 1.5
+        if entity_hits:
+            score += 0.5 if words <= 20 else 0.0
+        if any(cue in lower for cue in _REASONING_CUES):
+            score -= 1.0
+        sims = self._intent_similarity(question)
+        if sims is not None:
+            score += 3.0 * (sims[0] - sims[1])
+
+        tier = "simple" if score > 0.5 else "complex"
+        reason = "classifier"
+
+        small_ms = self._expected_latency_ms(small, "simple")
+        large_ms = self._expected_latency_ms(large, "complex")
+        if tier == "complex" and latency_budget_ms is not None and large_ms > latency_budget_ms:
+            tier, reason = "simple", "budget"
+
+        if not settings.CONSULTANT_ROUTING_ENABLED:
+            tier, reason = "complex", "disabled"
+
+        if tier == "simple":
+            decision = RouteDecision(
+                small, self.SIMPLE_MAX_TOKENS, tier, reason, round(score, 3),
+                est_savings_ms=max(large_ms - small_ms, 0.0),
+            )
+        else:
+            decision = RouteDecision(large, 800, tier, reason, round(score, 3))
+
+        metrics.inc("consultant_route_total", tier=decision.tier, reason=decision.reason)
+        if decision.est_savings_ms:
+            metrics.observe("consultant_route_est_savings_ms", decision.est_savings_ms)
+        print(
+            f"🧭 Model Router: {decision.tier} → {decision.model} "
+            f"(score={decision.score}, reason={decision.reason}, words={words}, "
+            f"entity_hits={entity_hits}, budget={latency_budget_ms}, "
+            f"est_savings={decision.est_savings_ms:.0f}ms)"
+        )
+        return decision
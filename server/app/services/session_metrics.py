@@ -0,0 +1,315 @@
+"""
+SessionMetrics — running talk-time / engagement metrics per session.
+GET /session_analytics used to reload every session_logs row, re-tokenize all
+content and re-read sentiment_logs on every view. Turns are now folded into a
+compact accumulator as they are logged (O(1) per turn), and a background
+thread upserts changed sessions into session_analytics, so the GET is a
+single-row read. Sessions first seen after a restart are rebuilt once from
+their transcript before new turns are applied.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app.utils.metrics import metrics
+
+FILLER_WORDS = frozenset({"um", "uh", "like", "literally", "basically", "actually"})
+WORDS_PER_SECOND = 2.5
+# Roles that get a sentiment_logs row (the sentiment trend)
+SENTIMENT_ROLES = ("user", "others", "llm")
+# Trend size cap: past it, neighbouring points are averaged pairwise
+TREND_POINTS = 64
+
+
+class SessionMetrics:
+    """Accumulator for one session; `add` is idempotent per turn_index."""
+
+    __slots__ = (
+        "last_turn", "total_turns", "user_turns", "others_turns", "llm_turns",
+        "user_words", "others_words", "user_fillers",
+        "run_role", "run_words", "longest_run_words",
+        "latency_sum", "latency_count", "sentiment_sum", "sentiment_count",
+        "trend", "trend_width",
+    )
+
+    def __init__(self):
+        self.last_turn = 0
+        self.total_turns = self.user_turns = self.others_turns = self.llm_turns = 0
+        self.user_words = self.others_words = self.user_fillers = 0
+        self.run_role: Optional[str] = None
+        self.run_words = self.longest_run_words = 0
+        self.latency_sum, self.latency_count = 0.0, 0
+        self.sentiment_sum, self.sentiment_count = 0.0, 0
+        # [first turn_index, score sum, points, last label] per bucket of
+        # `trend_width` turns; at most TREND_POINTS buckets
+        self.trend: List[list] = []
+        self.trend_width = 1
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> "SessionMetrics":
+        """Replay a transcript (session_logs rows in turn order)."""
+        acc = cls()
+        for row in rows:
+            acc.add(row)
+        return acc
+
+    def add(self, row: dict) -> bool:
+        """Fold one session_logs row in; False if its turn was already counted."""
+        turn_index = row.get("turn_index")
+        if turn_index is not None:
+            if turn_index <= self.last_turn:
+                return False
+            self.last_turn = turn_index
+        role = row.get("role")
+        words_list = str(row.get("content") or "").split()
+        words = len(words_list)
+
+        self.total_turns += 1
+        if role == "user":
+            self.user_turns += 1
+            self.user_words += words
+            self.user_fillers += sum(
+                1 for w in words_list if w.lower().strip(".,!?") in FILLER_WORDS
+            )
+        elif role == "others":
+            self.others_turns += 1
+            self.others_words += words
+        elif role == "llm":
+            self.llm_turns += 1
+            if row.get("latency_ms"):
+                self.latency_sum += row["latency_ms"]
+                self.latency_count += 1
+
+        # Longest run of consecutive turns by one role
+        if role == self.run_role:
+            self.run_words += words
+        else:
+            self.run_role, self.run_words = role, words
+        self.longest_run_words = max(self.longest_run_words, self.run_words)
+
+        score = row.get("sentiment_score")
+        if score is not None:
+            self.sentiment_sum += score
+            self.sentiment_count += 1
+            if role in SENTIMENT_ROLES:
+                self._add_trend_point(turn_index, score, row.get("sentiment_label"))
+        return True
+
+    def _add_trend_point(self, turn_index, score: float, label):
+        """Bounded trend: amortised O(1); halves the resolution when full."""
+        last = self.trend[-1] if self.trend else None
+        if last is not None and last[2] < self.trend_width:
+            last[1] += score
+            last[2] += 1
+            last[3] = label
+            return
+        self.trend.append([turn_index, score, 1, label])
+        if len(self.trend) > TREND_POINTS:
+            self.trend = [
+                [a[0], a[1] + b[1], a[2] + b[2], b[3]]
+                for a, b in zip(self.trend[0::2], self.trend[1::2])
+            ] + ([self.trend[-1]] if len(self.trend) % 2 else [])
+            self.trend_width *= 2
+
+    def row(self) -> dict:
+        """session_analytics columns."""
+        talk = self.user_words + self.others_words
+        if talk:
+            ratio = min(self.user_words, self.others_words) / max(self.user_words, self.others_words)
+            engagement = round((ratio * 5) + min(self.total_turns / 20.0 * 5, 5), 1)
+        else:
+            engagement = 0.0
+        avg_sentiment = (
+            self.sentiment_sum / self.sentiment_count if self.sentiment_count else None
+        )
+        dominant = None
+        if avg_sentiment is not None:
+            if avg_sentiment >= 0.1:
+                dominant = "positive"
+            elif avg_sentiment <= -0.1:
+                dominant = "negative"
+            else:
+                dominant = "neutral"
+        return {
+            "total_turns": self.total_turns,
+            "user_turns": self.user_turns,
+            "others_turns": self.others_turns,
+            "llm_turns": self.llm_turns,
+            "avg_advice_latency_ms": (
+                self.latency_sum / self.latency_count if self.latency_count else None
+            ),
+            "avg_sentiment_score": avg_sentiment,
+            "dominant_sentiment": dominant,
+            "talk_time_user_seconds": self.user_words / WORDS_PER_SECOND,
+            "talk_time_others_seconds": self.others_words / WORDS_PER_SECOND,
+            "longest_monologue_seconds": self.longest_run_words / WORDS_PER_SECOND,
+            "user_filler_count": self.user_fillers,
+            "mutual_engagement_score": engagement,
+            # Bucket means (single turns until the session outgrows TREND_POINTS)
+            "sentiment_trend": [
+                {"turn_index": t, "score": total / n, "label": label}
+                for t, total, n, label in self.trend
+            ],
+        }
+
+
+class _Entry:
+    __slots__ = ("user_id", "metrics", "backlog", "dirty")
+
+    def __init__(self, user_id: Optional[str], cold: bool):
+        self.user_id = user_id
+        self.metrics = SessionMetrics()
+        # Turns seen before a cold entry is rebuilt from its transcript
+        self.backlog: Optional[List[dict]] = [] if cold else None
+        self.dirty = False
+
+
+class SessionMetricsStore:
+    """session_id → SessionMetrics for live sessions; dirty ones upserted per interval."""
+
+    def __init__(
+        self,
+        db,
+        load_rows: Callable[[str], List[dict]],
+        flush_interval: float = 5.0,
+        max_sessions: int = 1000,
+    ):
+        self.db = db
+        self.load_rows = load_rows  # full transcript of a session (for cold entries)
+        self.flush_interval = flush_interval
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._evicted: Dict[str, dict] = {}  # rows of dirty sessions pushed out by the LRU
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="session-metrics", daemon=True
+                    )
+                    self._thread.start()
+
+    # ── Producer Side ─────────────────────────────────────────────────────────
+
+    def record(self, session_id: str, user_id: Optional[str], row: dict):
+        """Fold a newly logged turn in (called while the turn index is reserved)."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                # Not the session's first turn → older turns were logged before
+                # this process saw it; rebuild from the transcript on first use
+                entry = self._sessions[session_id] = _Entry(
+                    user_id, cold=(row.get("turn_index") or 1) > 1
+                )
+                while len(self._sessions) > self.max_sessions:
+                    old_id, old = self._sessions.popitem(last=False)
+                    if old.dirty and old.backlog is None and old.user_id:
+                        self._evicted[old_id] = self._row(old_id, old)
+            self._sessions.move_to_end(session_id)
+            entry.user_id = entry.user_id or user_id
+            if entry.backlog is not None:
+                entry.backlog.append(row)
+            else:
+                entry.metrics.add(row)
+            entry.dirty = True
+        self._ensure_started()
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """Current metric columns of a resident session (rebuilt first if cold), else None."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if entry.backlog is not None:
+            self._warm(session_id, entry)
+        with self._lock:
+            return entry.metrics.row()
+
+    def _warm(self, session_id: str, entry: _Entry):
+        rows = self.load_rows(session_id)
+        rebuilt = SessionMetrics.from_rows(rows)
+        metrics.inc("session_metrics_rebuilds_total")
+        with self._lock:
+            if entry.backlog is None:
+                return  # warmed concurrently
+            for row in entry.backlog:
+                rebuilt.add(row)  # turns already in the transcript are skipped
+            entry.metrics, entry.backlog = rebuilt, None
+
+    def _row(self, session_id: str, entry: _Entry) -> dict:
+        return {"session_id": session_id, "user_id": entry.user_id, **entry.metrics.row()}
+
+    # ── Flushing ──────────────────────────────────────────────────────────────
+
+    def flush(self, session_id: str = None) -> int:
+        """Upsert dirty sessions (or one) into session_analytics in one request."""
+        with self._flush_lock:
+            with self._lock:
+                ids = [session_id] if session_id else list(self._sessions)
+                todo = [
+                    (sid, self._sessions[sid]) for sid in ids
+                    if sid in self._sessions and self._sessions[sid].dirty
+                ]
+            for sid, entry in todo:
+                if entry.backlog is not None:
+                    try:
+                        self._warm(sid, entry)
+                    except Exception as e:
+                        print(f"⚠️ Session Metrics: rebuild failed for {sid}: {e}")
+            with self._lock:
+                if session_id is None:
+                    rows, self._evicted = list(self._evicted.values()), {}
+                else:
+                    rows = [self._evicted.pop(session_id)] if session_id in self._evicted else []
+                for sid, entry in todo:
+                    if entry.backlog is None and entry.user_id:
+                        rows.append(self._row(sid, entry))
+                        entry.dirty = False
+            if not rows:
+                return 0
+            try:
+                self.db.table("session_analytics").upsert(
+                    rows, on_conflict="session_id"
+                ).execute()
+            except Exception as e:
+                print(f"❌ Session Metrics: upsert of {len(rows)} sessions failed: {e}")
+                metrics.inc("session_metrics_flush_errors_total")
+                with self._lock:
+                    for row in rows:
+                        entry = self._sessions.get(row["session_id"])
+                        if entry is not None:
+                            entry.dirty = True
+                        else:
+                            self._evicted[row["session_id"]] = row
+                return 0
+            metrics.inc("session_metrics_flushes_total")
+            return len(rows)
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._evicted.pop(session_id, None)
+
+    def release(self, session_id: str):
+        """Write out a session's pending metrics, then forget it."""
+        self.flush(session_id)
+        self.drop(session_id)
+
+    def close(self):
+        """Stop the flusher and write what is left (called at shutdown)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 5)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
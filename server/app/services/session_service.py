@@ -3,17 +3,63 @@ SessionService — session lifecycle, turn logging, consultant history.
 Uses the unified db_final schema (sessions, session_logs, consultant_logs, sentiment_logs).
 """
 
+import threading
 import uuid
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from typing import Dict, List, Optional, Any
 
+from app.config import settings
 from app.database import db
+from app.services.log_writer import SessionLogWriter
+from app.services.session_metrics import SessionMetricsStore
+from app.services.transcript_buffer import TURN_FIELDS, TranscriptBuffer
+from app.utils.metrics import metrics
+from app.utils.sentiment import analyze as analyze_sentiment, analyze_batch
+from app.utils.ttl_cache import GroupedTTLCache
+from app.utils.llm_stats import LLMCallStats
 
 
 class SessionService:
     """Creates sessions, logs turns, fetches history."""
 
     def __init__(self):
+        # session_id → user_id, filled at session creation (DB lookup on miss)
+        self._owners: Dict[str, str] = {}
+        # session_id → last session_logs turn index written by this process
+        self._turns: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Side-writes (sentiment_logs) run alongside the main insert
+        self._io = ThreadPoolExecutor(max_workers=4, thread_name_prefix="session-log")
+        # Buffered bulk writer for session_logs / sentiment_logs
+        self.writer: Optional[SessionLogWriter] = None
+        if db and settings.SESSION_LOG_ASYNC:
+            self.writer = SessionLogWriter(
+                db,
+                queue_size=settings.SESSION_LOG_QUEUE_SIZE,
+                batch_size=settings.SESSION_LOG_BATCH_SIZE,
+                flush_interval=settings.SESSION_LOG_FLUSH_MS / 1000,
+            )
+        # Recent turns per live session for summary / analytics / coaching
+        self.transcripts = TranscriptBuffer(
+            max_turns=settings.TRANSCRIPT_BUFFER_TURNS,
+            max_sessions=settings.TRANSCRIPT_BUFFER_SESSIONS,
+        )
+        # Running talk-time / engagement metrics, upserted into session_analytics
+        self.live_metrics: Optional[SessionMetricsStore] = None
+        if db:
+            self.live_metrics = SessionMetricsStore(
+                db,
+                load_rows=self.transcript_rows,
+                flush_interval=settings.SESSION_METRICS_FLUSH_SECONDS,
+                max_sessions=settings.TRANSCRIPT_BUFFER_SESSIONS,
+            )
+        # user_id → consultant history / session summaries (consultant context)
+        self.user_context = GroupedTTLCache(
+            "user_context",
+            ttl_seconds=settings.USER_CONTEXT_CACHE_TTL_SECONDS,
+            max_groups=settings.USER_CONTEXT_CACHE_MAX_USERS,
+        )
         print("✅ Session Service: Initialized")
 
     # ── Session Creation ──────────────────────────────────────────────────────
@@ -57,6 +103,7 @@ class SessionService:
                 .execute()
             )
             session_id = result.data[0]["id"]
+            self._remember_session(session_id, user_id)
             print(
                 f"📝 Session Service: Started session {session_id} "
                 f"for user {user_id} (mode={mode})"
@@ -88,12 +135,107 @@ class SessionService:
                 data["summary"] = summary
             result = db.table("sessions").insert(data).execute()
             if result.data:
-                return result.data[0]["id"]
+                session_id = result.data[0]["id"]
+                self._remember_session(session_id, user_id)
+                return session_id
             return str(uuid.uuid4())
         except Exception as e:
             print(f"❌ Session Service Error creating session: {e}")
             return str(uuid.uuid4())
 
+    # ── Session Ownership & Turn Index ────────────────────────────────────────
+
+    def _remember_session(self, session_id: str, user_id: str):
+        """Cache ownership of a freshly created session; its turn counter starts at 0."""
+        with self._lock:
+            self._owners[session_id] = user_id
+            self._turns.setdefault(session_id, 0)
+        self.transcripts.open(session_id)
+
+    def _forget_session(self, session_id: str):
+        with self._lock:
+            self._owners.pop(session_id, None)
+            self._turns.pop(session_id, None)
+
+    def _session_owner(self, session_id: str) -> Optional[str]:
+        """user_id for a session — cached; one DB read for sessions created elsewhere."""
+        with self._lock:
+            user_id = self._owners.get(session_id)
+        if user_id:
+            return user_id
+        try:
+            res = (
+                db.table("sessions")
+                .select("user_id")
+                .eq("id", session_id)
+                .maybe_single()
+                .execute()
+            )
+            user_id = res.data["user_id"] if res and res.data else None
+        except Exception:
+            user_id = None
+        if user_id:
+            with self._lock:
+                self._owners.setdefault(session_id, user_id)
+        return user_id
+
+    def _seed_turns(self, session_id: str):
+        """Seed the turn counter once from session_logs for sessions this
+        process has not seen (e.g. after a restart); later turns never count."""
+        with self._lock:
+            seeded = session_id in self._turns
+        if not seeded:
+            # Rows still in the log writer's queue must be counted too
+            self.flush_logs(session_id)
+            try:
+                res = (
+                    db.table("session_logs")
+                    .select("id", count="exact")
+                    .eq("session_id", session_id)
+                    .limit(1)
+                    .execute()
+                )
+                existing = res.count or 0
+            except Exception:
+                existing = 0
+            with self._lock:
+                self._turns.setdefault(session_id, existing)
+
+    def _take_turns(self, session_id: str, n: int = 1) -> int:
+        """Reserve `n` turn indexes and return the first. Caller holds `_lock`."""
+        first = self._turns.get(session_id, 0) + 1
+        self._turns[session_id] = first + n - 1
+        return first
+
+    def _stamp_and_write(self, session_id: str, rows: List[tuple]) -> int:
+        """Assign turn indexes + created_at and queue the rows, atomically.
+
+        `rows` is a list of `(table, row)`; every session_logs row takes a new
+        turn and following side rows (sentiment_logs) share it. Holding the
+        lock across the enqueue keeps turn order == write order when turns of
+        one session are logged concurrently; if the writer's queue is full the
+        inline write happens after the lock is released.
+        """
+        self._seed_turns(session_id)
+        queued = True
+        with self._lock:
+            turn_idx = 0
+            for table, row in rows:
+                if table == "session_logs":
+                    turn_idx = self._take_turns(session_id)
+                    row["created_at"] = datetime.now(timezone.utc).isoformat()
+                    row["turn_index"] = turn_idx
+                    self.transcripts.append(session_id, row)
+                    if self.live_metrics:
+                        self.live_metrics.record(session_id, self._owners.get(session_id), row)
+                else:
+                    row["turn_index"] = turn_idx
+            if self.writer:
+                queued = self.writer.try_enqueue(session_id, rows)
+        if not queued:
+            self.writer.write_overflow(rows)
+        return turn_idx
+
     # ── Turn Logging ──────────────────────────────────────────────────────────
 
     def log_message(
@@ -104,52 +246,36 @@ class SessionService:
         speaker_label: str = None,
         confidence: float = None,
         is_ephemeral: bool = False,
+        llm_stats: Optional[LLMCallStats] = None,
     ) -> Optional[Dict[str, Any]]:
-        """Log a single message to session_logs with inline sentiment."""
+        """Log a single message to session_logs with lexicon sentiment.
+
+        `llm_stats` (for "llm" rows) fills latency_ms / model_used / tokens_used.
+        """
         if not db or not session_id or not content.strip():
             return None
         if is_ephemeral:
             return None
 
         try:
-            # ── Inline sentiment analysis ─────────────────────────────────
-            sentiment_score = 0.0
-            sentiment_label = "neutral"
-
-            lower_content = content.lower()
-            positive_words = [
-                "great", "awesome", "good", "happy", "love",
-                "excited", "amazing", "perfect", "thanks", "glad",
-            ]
-            negative_words = [
-                "bad", "angry", "hate", "terrible", "sad",
-                "frustrated", "annoyed", "worst", "failed", "mad",
-            ]
+            sentiment_score, sentiment_label, _ = analyze_sentiment(content)
 
-            pos_count = sum(lower_content.count(w) for w in positive_words)
-            neg_count = sum(lower_content.count(w) for w in negative_words)
-
-            if pos_count > neg_count:
-                sentiment_score = min(0.4 * pos_count, 1.0)
-                sentiment_label = "positive"
-            elif neg_count > pos_count:
-                sentiment_score = max(-0.4 * neg_count, -1.0)
-                sentiment_label = "negative"
-
-            # Stress & arousal inference
-            fillers = [" um", " uh", " like", " literally", " you know"]
-            filler_count = sum(lower_content.count(f) for f in fillers)
-            arousal = content.count("!") + content.count("?")
-            hesitation = content.count("-") + content.count("...")
-            stress_level = min(
-                (filler_count * 0.2) + (arousal * 0.1) + (hesitation * 0.2), 1.0
-            )
-            if stress_level > 0.5:
-                sentiment_label += "_stressed"
-            elif stress_level > 0.2:
-                sentiment_label += "_tense"
+            # ── Build session_log + sentiment_logs rows ───────────────────
+            # Owner and turn index come from memory, so the two rows are
+            # independent of each other's insert results.
+            user_id = self._session_owner(session_id)
+
+            sent_row = None
+            if user_id and role in ["user", "others", "llm"]:
+                sent_row = {
+                    "session_id": session_id,
+                    "user_id": user_id,
+                    "speaker_role": role,
+                    "sentiment_score": sentiment_score,
+                    "score": sentiment_score,
+                    "label": sentiment_label,
+                }
 
-            # ── Insert session_log row ────────────────────────────────────
             row = {
                 "session_id": session_id,
                 "role": role,
@@ -161,42 +287,32 @@ class SessionService:
                 row["speaker_label"] = speaker_label
             if confidence is not None:
                 row["confidence"] = confidence
+            if llm_stats is not None:
+                row.update(llm_stats.log_fields())
 
-            res = db.table("session_logs").insert(row).execute()
-            logged_row = res.data[0] if res.data else row
+            # created_at is stamped client-side so buffered bulk inserts keep
+            # real turn order
+            rows = [("session_logs", row)]
+            if sent_row:
+                rows.append(("sentiment_logs", sent_row))
+            self._stamp_and_write(session_id, rows)
+            if self.writer:
+                return row
 
-            # ── Write to sentiment_logs ───────────────────────────────────
-            try:
-                sess_res = (
-                    db.table("sessions")
-                    .select("user_id")
-                    .eq("id", session_id)
-                    .maybe_single()
-                    .execute()
-                )
-                user_id = sess_res.data["user_id"] if sess_res.data else None
-            except Exception:
-                user_id = None
-
-            if user_id and role in ["user", "others", "llm"]:
-                logs_res = (
-                    db.table("session_logs")
-                    .select("id", count="exact")
-                    .eq("session_id", session_id)
-                    .execute()
+            # Synchronous path: both inserts concurrently
+            sent_future = None
+            if sent_row:
+                sent_future = self._io.submit(
+                    lambda: db.table("sentiment_logs").insert(sent_row).execute()
                 )
-                turn_idx = logs_res.count or 1
+            res = db.table("session_logs").insert(row).execute()
+            logged_row = res.data[0] if res.data else row
 
-                sent_row = {
-                    "session_id": session_id,
-                    "user_id": user_id,
-                    "turn_index": turn_idx,
-                    "speaker_role": role,
-                    "sentiment_score": sentiment_score,
-                    "score": sentiment_score,
-                    "label": sentiment_label,
-                }
-                db.table("sentiment_logs").insert(sent_row).execute()
+            if sent_future is not None:
+                try:
+                    sent_future.result()
+                except Exception as e:
+                    print(f"⚠️ Session Service: sentiment_logs insert failed: {e}")
 
             return logged_row
         except Exception as e:
@@ -206,31 +322,138 @@ class SessionService:
     def log_batch_messages(
         self, session_id: str, logs: List[Dict[str, Any]], is_ephemeral: bool = False
     ):
-        """Log a batch of messages to session_logs."""
+        """Log a batch of messages to session_logs (and sentiment_logs), scored in one pass."""
         if not db or not logs or is_ephemeral:
             return
         try:
-            db_logs = []
-            for log in logs:
-                role = log.get("speaker", "unknown").lower()
-                content = log.get("text", "")
-                if content:
-                    db_logs.append(
+            turns = [
+                (log.get("speaker", "unknown").lower(), log.get("text", ""))
+                for log in logs
+            ]
+            turns = [(role, content) for role, content in turns if content]
+            if not turns:
+                return
+            user_id = self._session_owner(session_id)
+            rows = []
+            for (role, content), sent in zip(turns, analyze_batch(c for _, c in turns)):
+                rows.append(
+                    (
+                        "session_logs",
                         {
                             "session_id": session_id,
                             "role": role,
                             "content": content,
-                        }
+                            "sentiment_score": sent.score,
+                            "sentiment_label": sent.label,
+                        },
                     )
-            if db_logs:
-                db.table("session_logs").insert(db_logs).execute()
-                print(
-                    f"📝 Session Service: Logged {len(db_logs)} messages "
-                    f"for session {session_id}"
                 )
+                if user_id and role in ["user", "others", "llm"]:
+                    rows.append(
+                        (
+                            "sentiment_logs",
+                            {
+                                "session_id": session_id,
+                                "user_id": user_id,
+                                "speaker_role": role,
+                                "sentiment_score": sent.score,
+                                "score": sent.score,
+                                "label": sent.label,
+                            },
+                        )
+                    )
+            self._stamp_and_write(session_id, rows)
+            if not self.writer:
+                for table in ("session_logs", "sentiment_logs"):
+                    table_rows = [r for t, r in rows if t == table]
+                    if table_rows:
+                        db.table(table).insert(table_rows).execute()
+            print(
+                f"📝 Session Service: Logged {len(turns)} messages "
+                f"for session {session_id}"
+            )
         except Exception as e:
             print(f"❌ Session Service Error logging batch: {e}")
 
+    # ── Transcript Reads ──────────────────────────────────────────────────────
+
+    def transcript_rows(self, session_id: str) -> List[Dict[str, Any]]:
+        """All turns of a session in order (role, content, sentiment_score, latency_ms).
+
+        Served from the in-memory buffer; on a miss the DB copy is read once and,
+        for sessions live in this process, installed in the buffer.
+        """
+        rows = self.transcripts.full(session_id)
+        if rows is not None:
+            metrics.inc("transcript_reads_total", source="buffer")
+            return rows
+        metrics.inc("transcript_reads_total", source="db")
+        if not db or not session_id:
+            return []
+        version = self.transcripts.version(session_id)
+        self.flush_logs(session_id)
+        try:
+            res = (
+                db.table("session_logs")
+                .select(", ".join(TURN_FIELDS))
+                .eq("session_id", session_id)
+                .order("created_at")
+                .execute()
+            )
+            rows = res.data or []
+        except Exception as e:
+            print(f"❌ Session Service Error fetching transcript: {e}")
+            return []
+        if session_id in self._owners:
+            self.transcripts.hydrate(session_id, rows, version)
+        return rows
+
+    def recent_transcript_rows(self, session_id: str, n: int) -> List[Dict[str, Any]]:
+        """The last `n` turns — buffer first, else a LIMIT query (not the whole log)."""
+        rows = self.transcripts.recent(session_id, n)
+        if rows is not None:
+            metrics.inc("transcript_reads_total", source="buffer")
+            return rows
+        metrics.inc("transcript_reads_total", source="db")
+        if not db or not session_id:
+            return []
+        self.flush_logs(session_id)
+        try:
+            res = (
+                db.table("session_logs")
+                .select(", ".join(TURN_FIELDS))
+                .eq("session_id", session_id)
+                .order("created_at", desc=True)
+                .limit(n)
+                .execute()
+            )
+            return list(reversed(res.data or []))
+        except Exception as e:
+            print(f"❌ Session Service Error fetching recent transcript: {e}")
+            return []
+
+    def flush_logs(self, session_id: str = None, timeout: float = 5.0) -> bool:
+        """Read-your-writes: wait until buffered log rows (for one session, or all) are in the DB."""
+        if not self.writer:
+            return True
+        return self.writer.flush(session_id, timeout=timeout)
+
+    def release_session(self, session_id: str, timeout: float = 5.0):
+        """Expired live session: write out its buffered rows, then free its in-memory state."""
+        self.flush_logs(session_id, timeout=timeout)
+        if self.live_metrics:
+            self.live_metrics.release(session_id)
+        self._forget_session(session_id)
+        self.transcripts.drop(session_id)
+
+    def close(self):
+        """Drain buffered log rows and pending metrics (called at shutdown)."""
+        if self.writer:
+            self.writer.close()
+        if self.live_metrics:
+            self.live_metrics.close()
+        self._io.shutdown(wait=True)
+
     # ── Session Completion ────────────────────────────────────────────────────
 
     def end_session(self, session_id: str, summary: str = None, is_ephemeral: bool = False):
@@ -241,6 +464,7 @@ class SessionService:
             print(f"🕵️ Session Service: Ephemeral session {session_id} ended")
             return
         try:
+            user_id = self._session_owner(session_id)
             update = {
                 "status": "completed",
                 "ended_at": datetime.now().isoformat(),
@@ -249,6 +473,9 @@ class SessionService:
             if summary:
                 update["summary"] = summary
             db.table("sessions").update(update).eq("id", session_id).execute()
+            self._forget_session(session_id)
+            if user_id:
+                self.user_context.invalidate(user_id)
             print(f"✅ Session Service: Session {session_id} marked completed")
         except Exception as e:
             print(f"❌ Session Service Error ending session: {e}")
@@ -257,9 +484,14 @@ class SessionService:
 
     def log_consultant_qa(
         self, user_id: str, question: str, answer: str, session_id: str = None,
-        is_ephemeral: bool = False,
+        is_ephemeral: bool = False, llm_stats: Optional[LLMCallStats] = None,
+        log_question: bool = True,
     ):
-        """Log Q&A to consultant_logs and session_logs."""
+        """Log Q&A to consultant_logs and session_logs.
+
+        Pass `log_question=False` when the question turn was already logged
+        (streaming consultant logs it up front).
+        """
         if not db or is_ephemeral:
             return
         try:
@@ -273,17 +505,23 @@ class SessionService:
                     "session_id": session_id,
                 }
             ).execute()
+            self.user_context.invalidate(user_id)
             if session_id:
-                self.log_message(session_id, "user", question)
-                self.log_message(session_id, "llm", answer)
+                if log_question:
+                    self.log_message(session_id, "user", question)
+                self.log_message(session_id, "llm", answer, llm_stats=llm_stats)
             print(f"📝 Session Service: Logged consultant Q&A for {user_id}")
         except Exception as e:
             print(f"❌ Session Service Error logging consultant Q&A: {e}")
 
     def fetch_consultant_history(self, user_id: str, limit: int = 5) -> str:
-        """Fetch recent Q&A pairs from consultant_logs."""
+        """Fetch recent Q&A pairs from consultant_logs (cached per user)."""
         if not db:
             return "No past consultant history."
+        cached = self.user_context.get(user_id, ("history", limit))
+        if cached is not None:
+            return cached
+        token = self.user_context.token()
         try:
             res = (
                 db.table("consultant_logs")
@@ -297,16 +535,21 @@ class SessionService:
             for item in reversed(res.data):
                 history_lines.append(f"Q: {item['question']}")
                 history_lines.append(f"A: {item['answer']}")
-            history_str = "\n".join(history_lines)
-            return history_str if history_str else "No past consultant history."
+            history_str = "\n".join(history_lines) or "No past consultant history."
+            self.user_context.set(user_id, ("history", limit), history_str, token)
+            return history_str
         except Exception as e:
             print(f"❌ Session Service Error fetching consultant history: {e}")
             return "Error fetching past consultant history."
 
     def fetch_session_summaries(self, user_id: str, limit: int = 3) -> str:
-        """Fetch recent completed session summaries."""
+        """Fetch recent completed session summaries (cached per user)."""
         if not db:
             return "No previous session summaries."
+        cached = self.user_context.get(user_id, ("summaries", limit))
+        if cached is not None:
+            return cached
+        token = self.user_context.token()
         try:
             res = (
                 db.table("sessions")
@@ -318,16 +561,16 @@ class SessionService:
                 .limit(limit)
                 .execute()
             )
-            if not res.data:
-                return "No previous session summaries."
             lines = []
-            for s in reversed(res.data):
+            for s in reversed(res.data or []):
                 mode_tag = s.get("mode", "session").upper()
                 title = s.get("title", "Session")
                 summary = s.get("summary", "")
                 if summary:
                     lines.append(f"[{mode_tag}] {title}: {summary}")
-            return "\n".join(lines) if lines else "No previous session summaries."
+            summaries = "\n".join(lines) or "No previous session summaries."
+            self.user_context.set(user_id, ("summaries", limit), summaries, token)
+            return summaries
         except Exception as e:
             print(f"❌ Session Service Error fetching summaries: {e}")
             return "No previous session summaries."
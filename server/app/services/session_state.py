@@ -0,0 +1,411 @@
+"""
+SessionStateStore — live-session state shared by the session / consultant routes.
+Replaces the module-level LIVE_SESSIONS / SESSION_TIMESTAMPS / SESSION_METADATA /
+TURN_COUNTERS dicts with `__slots__` records, user↔session indexes and a
+min-heap on last activity, so eviction and idle sweeps cost O(log n) per removed
+session instead of a sort plus a reverse scan.
+The same heap drives TTL expiry: `next_expiry()` tells the scheduler when to
+wake and `expire_due()` pops only the sessions whose idle time ran out, running
+`on_expire` hooks (flush logs, graphs) before the state is released.
+An optional backend (e.g. Redis) mirrors the durable fields and last activity,
+so another worker can pick up a session it has not seen and a worker does not
+expire a session that is still active elsewhere.
+"""
+
+import heapq
+import itertools
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.utils.metrics import metrics
+
+
+class SessionRecord:
+    """Per-session live state."""
+
+    __slots__ = (
+        "session_id", "user_id", "started_at", "last_active", "turns",
+        "is_ephemeral", "is_multiplayer", "persona", "target_entity_id",
+        "last_context", "saved_at",
+    )
+
+    # Fields mirrored to a shared backend (last_context stays process-local)
+    DURABLE = (
+        "session_id", "user_id", "started_at", "is_ephemeral", "is_multiplayer",
+        "persona", "target_entity_id",
+    )
+
+    def __init__(
+        self,
+        session_id: str,
+        user_id: str,
+        is_ephemeral: bool = False,
+        is_multiplayer: bool = False,
+        persona: str = "casual",
+        target_entity_id=None,
+        started_at: Optional[float] = None,
+    ):
+        now = time.time()
+        self.session_id = session_id
+        self.user_id = user_id
+        self.started_at = started_at or now
+        self.last_active = now
+        self.turns = 0
+        self.is_ephemeral = is_ephemeral
+        self.is_multiplayer = is_multiplayer
+        self.persona = persona
+        self.target_entity_id = target_entity_id
+        self.last_context: Optional[Tuple[str, str]] = None  # (graph, vector) of last turn
+        self.saved_at = 0.0  # last backend write (drives the coarse TTL refresh)
+
+    def to_dict(self) -> dict:
+        # last_active lets other workers see activity they did not serve
+        return {**{f: getattr(self, f) for f in self.DURABLE}, "last_active": self.last_active}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SessionRecord":
+        record = cls(**{f: data.get(f) for f in cls.DURABLE if f in data})
+        if data.get("last_active"):
+            record.last_active = data["last_active"]
+        return record
+
+
+# ── Backends ──────────────────────────────────────────────────────────────────
+
+class SessionStateBackend:
+    """Shared store for durable session fields. Default: process-local only."""
+
+    def load(self, session_id: str) -> Optional[dict]:
+        return None
+
+    def save(self, record: SessionRecord, ttl_seconds: int):
+        pass
+
+    def delete(self, session_id: str, user_id: Optional[str]):
+        pass
+
+    def last_active(self, session_id: str) -> Optional[float]:
+        """Latest activity any worker saved for the session (None if unknown / gone)."""
+        return None
+
+    def live_session(self, user_id: str) -> Optional[str]:
+        return None
+
+
+class RedisSessionBackend(SessionStateBackend):
+    """Redis mirror so all workers see the same live sessions (needs `redis`)."""
+
+    def __init__(self, url: str, prefix: str = "bubbles:session:"):
+        import redis  # optional dependency, only when SESSION_STATE_BACKEND=redis
+
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def load(self, session_id: str) -> Optional[dict]:
+        raw = self.r.get(self.prefix + session_id)
+        return json.loads(raw) if raw else None
+
+    def save(self, record: SessionRecord, ttl_seconds: int):
+        pipe = self.r.pipeline()
+        pipe.set(self.prefix + record.session_id, json.dumps(record.to_dict()), ex=ttl_seconds)
+        pipe.set(self.prefix + "user:" + record.user_id, record.session_id, ex=ttl_seconds)
+        pipe.execute()
+
+    def delete(self, session_id: str, user_id: Optional[str]):
+        self.r.delete(self.prefix + session_id)
+        if user_id:
+            # Only clear the user pointer if it still points at this session
+            key = self.prefix + "user:" + user_id
+            if self.r.get(key) == session_id:
+                self.r.delete(key)
+
+    def live_session(self, user_id: str) -> Optional[str]:
+        return self.r.get(self.prefix + "user:" + user_id)
+
+    def last_active(self, session_id: str) -> Optional[float]:
+        data = self.load(session_id)
+        return data.get("last_active") if data else None
+
+
+def build_backend(settings) -> SessionStateBackend:
+    if settings.SESSION_STATE_BACKEND == "redis":
+        try:
+            return RedisSessionBackend(settings.REDIS_URL)
+        except Exception as e:
+            print(f"⚠️ Session State: Redis backend unavailable, using local state: {e}")
+    return SessionStateBackend()
+
+
+# ── Store ─────────────────────────────────────────────────────────────────────
+
+class SessionStateStore:
+    """Indexed live-session records with heap-ordered eviction."""
+
+    def __init__(
+        self,
+        max_sessions: int = 500,
+        ttl_seconds: int = 6 * 3600,
+        backend: Optional[SessionStateBackend] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend or SessionStateBackend()
+        # Touches re-save to the backend at most this often, so its TTL keeps
+        # up with local activity without a write per turn
+        self.refresh_seconds = max(1.0, ttl_seconds / 10)
+        self._records: Dict[str, SessionRecord] = {}   # session_id → record
+        self._by_user: Dict[str, str] = {}              # user_id → live session_id
+        # (last_active, seq, session_id); stale entries skipped lazily on pop
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._lock = threading.RLock()
+        self._on_expire: List[Callable[[SessionRecord], None]] = []
+        self._on_remove: List[Callable[[SessionRecord], None]] = []
+
+    # ── Hooks ─────────────────────────────────────────────────────────────────
+
+    def on_expire(self, fn: Callable[[SessionRecord], None]):
+        """Register a flush run before an idle / evicted session is released."""
+        self._on_expire.append(fn)
+
+    def on_remove(self, fn: Callable[[SessionRecord], None]):
+        """Register cleanup run for every record that leaves the store."""
+        self._on_remove.append(fn)
+
+    def _release(self, removed: List[SessionRecord], reason: str):
+        """Run hooks outside the lock: expiry flushes first, then cleanup.
+
+        Only an explicit end deletes the shared copy; idle / capacity releases
+        are local, and the backend key lapses on its own TTL.
+        """
+        if reason == "ended":
+            hooks = self._on_remove
+            self._forget_remote(removed)
+        else:
+            hooks = self._on_expire + self._on_remove
+        for record in removed:
+            for fn in hooks:
+                try:
+                    fn(record)
+                except Exception as e:
+                    print(f"⚠️ Session State: cleanup hook failed for {record.session_id}: {e}")
+        metrics.inc("live_sessions_released_total", len(removed), reason=reason)
+        metrics.set_gauge("live_sessions", len(self._records))
+
+    # ── Heap ──────────────────────────────────────────────────────────────────
+
+    def _push(self, record: SessionRecord):
+        heapq.heappush(self._heap, (record.last_active, next(self._seq), record.session_id))
+        # Touches leave stale entries behind; rebuild when they dominate
+        if len(self._heap) > 2 * len(self._records) + 64:
+            self._heap = [
+                (r.last_active, next(self._seq), sid) for sid, r in self._records.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def _pop_oldest(self) -> Optional[SessionRecord]:
+        """Pop the least recently active live record (skipping stale heap entries)."""
+        while self._heap:
+            ts, _, sid = heapq.heappop(self._heap)
+            record = self._records.get(sid)
+            if record is not None and record.last_active == ts:
+                self._unindex(record)
+                return record
+        return None
+
+    def _unindex(self, record: SessionRecord):
+        self._records.pop(record.session_id, None)
+        if self._by_user.get(record.user_id) == record.session_id:
+            del self._by_user[record.user_id]
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def create(self, session_id: str, user_id: str, **fields) -> SessionRecord:
+        """Register a new live session; it becomes the user's live session.
+
+        Blocking: evicted sessions' hooks run inline (call via a thread from async code).
+        """
+        record = SessionRecord(session_id, user_id, **fields)
+        with self._lock:
+            old = self._records.get(session_id)
+            if old is not None:
+                self._unindex(old)
+            self._records[session_id] = record
+            self._by_user[user_id] = session_id
+            self._push(record)
+            evicted = []
+            while len(self._records) > self.max_sessions:
+                oldest = self._pop_oldest()
+                if oldest is None:
+                    break
+                evicted.append(oldest)
+        if not record.is_ephemeral:
+            self._save_remote(record)
+        if evicted:
+            print(f"🧹 Evicted {len(evicted)} oldest session(s) from global state")
+            self._release(evicted, "capacity")
+        else:
+            metrics.set_gauge("live_sessions", len(self._records))
+        return record
+
+    def touch(self, session_id: Optional[str]) -> Optional[SessionRecord]:
+        """Mark activity (pushes the expiry back by a full TTL, locally and — coarsely — in the backend)."""
+        if not session_id:
+            return None
+        with self._lock:
+            record = self._records.get(session_id)
+        if record is None:
+            # Served here for the first time: pick it up from the backend
+            record = self.get(session_id)
+            if record is None:
+                return None
+        with self._lock:
+            record.last_active = time.time()
+            self._push(record)
+            refresh = (
+                not record.is_ephemeral
+                and record.last_active - record.saved_at >= self.refresh_seconds
+            )
+            if refresh:
+                record.saved_at = record.last_active  # claimed under the lock: one writer
+        if refresh:
+            self._save_remote(record)
+        return record
+
+    def bump_turn(self, session_id: str) -> int:
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is None:
+                return 0
+            record.turns += 1
+            return record.turns
+
+    def remove(self, session_id: str) -> Optional[SessionRecord]:
+        """Drop a session (end_session); O(1) — its heap entry goes stale."""
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is not None:
+                self._unindex(record)
+        if record is not None:
+            self._release([record], "ended")
+        return record
+
+    def pop_idle(self, cutoff: float) -> List[SessionRecord]:
+        """Remove every session last active before `cutoff` (epoch seconds)."""
+        removed = []
+        with self._lock:
+            while self._heap and self._heap[0][0] < cutoff:
+                record = self._pop_oldest()
+                if record is None:
+                    break
+                if record.last_active >= cutoff:  # popped a fresher entry; put it back
+                    self._reinsert(record)
+                    break
+                removed.append(record)
+        # Idle here may still be live on another worker: keep those
+        kept = []
+        for record in removed:
+            if record.is_ephemeral:
+                continue
+            remote = self._backend_call(self.backend.last_active, record.session_id)
+            if remote and remote >= cutoff:
+                kept.append((record, remote))
+        if kept:
+            with self._lock:
+                for record, remote in kept:
+                    record.last_active = remote
+                    if record.session_id not in self._records:  # not re-created meanwhile
+                        self._reinsert(record)
+            kept_ids = {record.session_id for record, _ in kept}
+            removed = [r for r in removed if r.session_id not in kept_ids]
+            metrics.inc("live_sessions_kept_remote_total", len(kept))
+        if removed:
+            self._release(removed, "idle")
+        return removed
+
+    def _reinsert(self, record: SessionRecord):
+        """Put a popped record back (caller holds the lock)."""
+        self._records[record.session_id] = record
+        self._by_user.setdefault(record.user_id, record.session_id)
+        self._push(record)
+
+    def next_expiry(self) -> Optional[float]:
+        """Epoch time the least recently active session expires (None if empty)."""
+        with self._lock:
+            # Discard stale tops left by touches so the scheduler doesn't wake early
+            while self._heap:
+                ts, _, sid = self._heap[0]
+                record = self._records.get(sid)
+                if record is not None and record.last_active == ts:
+                    return ts + self.ttl_seconds
+                heapq.heappop(self._heap)
+        return None
+
+    def expire_due(self, now: Optional[float] = None) -> List[SessionRecord]:
+        """Pop sessions idle for longer than the TTL."""
+        return self.pop_idle((now or time.time()) - self.ttl_seconds)
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def get(self, session_id: Optional[str]) -> Optional[SessionRecord]:
+        """Local record, else one hydrated from the shared backend."""
+        if not session_id:
+            return None
+        with self._lock:
+            record = self._records.get(session_id)
+        if record is not None:
+            return record
+        data = self._backend_call(self.backend.load, session_id)
+        if not data:
+            return None
+        record = SessionRecord.from_dict(data)
+        record.saved_at = record.last_active  # the backend copy is fresh
+        with self._lock:
+            existing = self._records.get(session_id)
+            if existing is not None:
+                return existing
+            self._records[session_id] = record
+            self._by_user.setdefault(record.user_id, session_id)
+            self._push(record)
+        return record
+
+    def session_for_user(self, user_id: str) -> Optional[str]:
+        with self._lock:
+            sid = self._by_user.get(user_id)
+        return sid or self._backend_call(self.backend.live_session, user_id)
+
+    def is_ephemeral(self, session_id: Optional[str]) -> bool:
+        record = self.get(session_id)
+        return bool(record and record.is_ephemeral)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._records),
+                "users": len(self._by_user),
+                "heap_entries": len(self._heap),
+                "backend": type(self.backend).__name__,
+            }
+
+    # ── Backend Helpers ───────────────────────────────────────────────────────
+
+    def _save_remote(self, record: SessionRecord):
+        record.saved_at = time.time()
+        self._backend_call(self.backend.save, record, self.ttl_seconds)
+
+    def _forget_remote(self, records: List[SessionRecord]):
+        for record in records:
+            self._backend_call(self.backend.delete, record.session_id, record.user_id)
+
+    @staticmethod
+    def _backend_call(fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"⚠️ Session State: backend {fn.__name__} failed: {e}")
+            return None
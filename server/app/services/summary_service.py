@@ -0,0 +1,156 @@
+"""
+SummaryService — incremental, hierarchical rolling summaries for live sessions.
+Each roll summarizes only the turns after the session's cursor into a chunk
+summary. Recent chunk summaries are kept verbatim and older ones are folded
+into a single digest, so `sessions.summary` stays compact and end_session can
+reuse the hierarchy instead of re-summarizing the whole transcript.
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.database import db
+from app.services.transcript_buffer import render_transcript
+from app.utils.metrics import metrics
+
+
+class _SummaryState:
+    __slots__ = ("cursor", "chunks", "digest", "lock", "finalized")
+
+    def __init__(self):
+        self.cursor = 0                                   # last summarized turn_index
+        self.chunks: List[Tuple[int, int, str]] = []      # (first_turn, last_turn, summary)
+        self.digest = ""                                  # folded older chunks
+        self.lock = threading.Lock()
+        self.finalized = False                            # final_summary took over
+
+
+class SummaryService:
+    """Cursor-based rolling summarizer; one state per live session."""
+
+    KEEP_CHUNKS = 3       # recent chunk summaries kept verbatim
+    MAX_CHUNK_TURNS = 80  # cap on turns per chunk summary
+
+    def __init__(self, brain, sessions):
+        self.brain = brain
+        self.sessions = sessions
+        self._states: Dict[str, _SummaryState] = {}
+        self._lock = threading.Lock()
+        print("✅ Summary Service: Initialized")
+
+    def _state(self, session_id: str) -> _SummaryState:
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                state = self._states[session_id] = _SummaryState()
+            return state
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._states.pop(session_id, None)
+
+    # ── Rolling ───────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _after(rows: List[dict], cursor: int) -> List[dict]:
+        return [
+            r for r in rows
+            if (r.get("turn_index") is None and cursor == 0)
+            or (r.get("turn_index") or 0) > cursor
+        ]
+
+    def _new_turns(self, session_id: str, cursor: int) -> List[dict]:
+        """Every turn after the cursor (a tail read, or the transcript if it falls short)."""
+        rows = self.sessions.recent_transcript_rows(session_id, self.MAX_CHUNK_TURNS)
+        new = self._after(rows, cursor)
+        if (
+            len(new) == len(rows) >= self.MAX_CHUNK_TURNS
+            and (new[0].get("turn_index") or 0) != cursor + 1
+        ):
+            # More turns since the cursor than one tail read covers
+            new = self._after(self.sessions.transcript_rows(session_id), cursor)
+            metrics.inc("rolling_summary_backfills_total")
+        return new
+
+    def _advance(self, session_id: str, state: _SummaryState) -> bool:
+        """Summarize turns after the cursor into new chunks; fold old chunks. Caller holds state.lock."""
+        rows = self._new_turns(session_id, state.cursor)
+        advanced = False
+        for i in range(0, len(rows), self.MAX_CHUNK_TURNS):
+            chunk = rows[i:i + self.MAX_CHUNK_TURNS]
+            summary = self.brain.generate_summary(render_transcript(chunk))
+            if not summary:
+                break  # the cursor stays put; the rest is retried next roll
+            first = chunk[0].get("turn_index") or state.cursor + 1
+            last = max((r.get("turn_index") or 0) for r in chunk) or state.cursor + len(chunk)
+            state.chunks.append((first, last, summary))
+            state.cursor = last
+            advanced = True
+            metrics.inc("rolling_summary_chunks_total")
+            metrics.observe("rolling_summary_chunk_turns", len(chunk), (5, 10, 20, 40, 80))
+        if not advanced:
+            return False
+
+        if len(state.chunks) > self.KEEP_CHUNKS:
+            overflow = state.chunks[: -self.KEEP_CHUNKS]
+            folded = self.brain.fold_summaries([state.digest] + [c[2] for c in overflow])
+            if folded:
+                state.digest = folded
+                state.chunks = state.chunks[-self.KEEP_CHUNKS:]
+                metrics.inc("rolling_summary_folds_total")
+        return True
+
+    @staticmethod
+    def render(state: _SummaryState) -> str:
+        """Compact stored form: digest, then the recent chunk summaries."""
+        parts = [state.digest] if state.digest else []
+        parts += [f"[Turns {a}-{b}] {text}" for a, b, text in state.chunks]
+        return "\n---\n".join(parts)
+
+    def roll(self, session_id: str) -> Optional[str]:
+        """Summarize new turns and store the compact summary on the session row."""
+        state = self._state(session_id)
+        if not state.lock.acquire(blocking=False):
+            return None  # a roll for this session is already running
+        try:
+            if not self._advance(session_id, state):
+                return None
+            rendered = self.render(state)
+            # Written under the lock, and only while the session is live, so a
+            # late roll can't overwrite the final summary stored by end_session
+            with self._lock:
+                live = self._states.get(session_id) is state and not state.finalized
+            if not live:
+                return None
+            if db:
+                try:
+                    db.table("sessions").update({"summary": rendered}).eq("id", session_id).execute()
+                except Exception as e:
+                    print(f"❌ Summary Service Error saving rolling summary: {e}")
+        finally:
+            state.lock.release()
+        print(f"🔄 Rolling summary updated through turn {state.cursor}")
+        return rendered
+
+    # ── Final ─────────────────────────────────────────────────────────────────
+
+    def final_summary(self, session_id: str, full_transcript: str = "") -> str:
+        """Session summary for end_session.
+
+        With rolling chunks available, only the turns after the cursor are
+        summarized and the hierarchy is folded (short inputs); otherwise the
+        transcript is summarized once, as before.
+        """
+        with self._lock:
+            state = self._states.pop(session_id, None)
+        if state is not None:
+            with state.lock:  # waits out a roll that is still writing
+                state.finalized = True
+        if state is None or not (state.chunks or state.digest):
+            metrics.inc("final_summary_total", source="transcript")
+            return self.brain.generate_summary(full_transcript) if full_transcript else ""
+        with state.lock:
+            self._advance(session_id, state)
+            parts = [state.digest] + [c[2] for c in state.chunks]
+        metrics.inc("final_summary_total", source="hierarchy")
+        return self.brain.fold_summaries(parts) or self.render(state)
@@ -0,0 +1,116 @@
+"""
+TranscriptBuffer — bounded in-memory transcript per live session.
+Appended by SessionService as turns are logged, so the rolling summary,
+end_session, analytics and coaching reports can read a session's turns without
+re-selecting session_logs. A buffer is "complete" when it holds every turn of
+the session since turn 1; otherwise callers fall back to the DB.
+"""
+
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+
+# Fields kept per turn — everything the transcript consumers read
+TURN_FIELDS = (
+    "turn_index", "role", "content", "sentiment_score", "sentiment_label", "latency_ms",
+)
+
+
+class _SessionTranscript:
+    __slots__ = ("turns", "complete", "version")
+
+    def __init__(self, max_turns: int, complete: bool):
+        self.turns: Deque[dict] = deque(maxlen=max_turns)
+        self.complete = complete
+        self.version = 0  # bumped on every append; guards DB hydration races
+
+
+class TranscriptBuffer:
+    """LRU-bounded map of session_id → ring buffer of recent turns."""
+
+    def __init__(self, max_turns: int = 2000, max_sessions: int = 1000):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, _SessionTranscript]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, session_id: str, create: bool = False) -> Optional[_SessionTranscript]:
+        entry = self._sessions.get(session_id)
+        if entry is None and create:
+            entry = self._sessions[session_id] = _SessionTranscript(self.max_turns, False)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        if entry is not None:
+            self._sessions.move_to_end(session_id)
+        return entry
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def open(self, session_id: str):
+        """Start an empty, complete buffer for a session created in this process."""
+        with self._lock:
+            entry = self._get(session_id, create=True)
+            if not entry.turns:
+                entry.complete = True
+
+    def append(self, session_id: str, row: dict):
+        with self._lock:
+            entry = self._get(session_id, create=True)
+            if len(entry.turns) == entry.turns.maxlen:
+                entry.complete = False  # oldest turn falls off
+            entry.turns.append({k: row.get(k) for k in TURN_FIELDS})
+            entry.version += 1
+
+    def hydrate(self, session_id: str, rows: List[dict], version: int) -> bool:
+        """Install a full transcript read from the DB, unless turns were appended meanwhile."""
+        if len(rows) > self.max_turns:
+            return False
+        with self._lock:
+            entry = self._get(session_id, create=True)
+            if entry.version != version:
+                return False
+            entry.turns.clear()
+            entry.turns.extend({k: r.get(k) for k in TURN_FIELDS} for r in rows)
+            entry.complete = True
+            return True
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def version(self, session_id: str) -> int:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return entry.version if entry else 0
+
+    def full(self, session_id: str) -> Optional[List[dict]]:
+        """Every turn of the session, or None if the buffer can't vouch for that."""
+        with self._lock:
+            entry = self._get(session_id)
+            if entry is None or not entry.complete:
+                return None
+            return list(entry.turns)
+
+    def recent(self, session_id: str, n: int) -> Optional[List[dict]]:
+        """The last `n` turns, or None if the buffer holds fewer than the session has."""
+        with self._lock:
+            entry = self._get(session_id)
+            if entry is None:
+                return None
+            if len(entry.turns) >= n or entry.complete:
+                return list(entry.turns)[-n:]
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "turns": sum(len(e.turns) for e in self._sessions.values()),
+            }
+
+
+def render_transcript(rows: List[dict]) -> str:
+    """The "ROLE: content" transcript format every LLM consumer uses."""
+    return "\n".join(f"{r['role'].upper()}: {r['content']}" for r in rows)
@@ -0,0 +1,113 @@
+"""
+EntitySnapshot — one user's entities with their attributes and relations,
+plus a lookup index for /ask_entity.
+Replaces `ilike '%name%' limit 1` (a sequential scan with an arbitrary pick)
+with a prefix trie over every word start of each name, falling back to
+trigram postings for substrings and typos. Matches are ranked by match
+quality, then by mention_count.
+"""
+
+from typing import Dict, List, Set, Tuple
+
+from app.utils.name_index import trigrams
+
+# Match quality tiers
+EXACT, NAME_PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = 1.0, 0.9, 0.8, 0.7, 0.6
+_MIN_FUZZY_JACCARD = 0.3
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.ids: Set[str] = set()  # every entity with a word starting with this prefix
+
+
+class EntitySnapshot:
+    """Entities (id → row with "attributes" / "relations") + trie + trigram postings."""
+
+    def __init__(self, rows: List[dict]):
+        self.entities: Dict[str, dict] = {}
+        self._root = _TrieNode()
+        self._grams: Dict[str, Set[str]] = {}
+        for row in rows:
+            self.add(row)
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def add(self, row: dict):
+        entity_id = row["id"]
+        name = row["canonical_name"]
+        self.entities[entity_id] = row
+        # Insert the name from every word start ("ahmed khan", "khan")
+        starts = [0] + [i + 1 for i, ch in enumerate(name) if ch == " "]
+        for start in starts:
+            node = self._root
+            for ch in name[start:]:
+                node = node.children.setdefault(ch, _TrieNode())
+                node.ids.add(entity_id)
+        for gram in trigrams(name):
+            self._grams.setdefault(gram, set()).add(entity_id)
+
+    def remove(self, entity_id: str) -> bool:
+        """Forget an entity (the trie / postings skip ids no longer present)."""
+        return self.entities.pop(entity_id, None) is not None
+
+    # ── Lookup ────────────────────────────────────────────────────────────────
+
+    def _prefix_ids(self, query: str) -> Set[str]:
+        node = self._root
+        for ch in query:
+            node = node.children.get(ch)
+            if node is None:
+                return set()
+        return node.ids
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[float, dict]]:
+        """[(quality, entity row)] best first: quality tier, then mention_count."""
+        query = " ".join(query.strip().lower().split())
+        if not query:
+            return []
+        scored: Dict[str, float] = {}
+        for entity_id in self._prefix_ids(query):
+            name = self.entities.get(entity_id, {}).get("canonical_name")
+            if name is None:
+                continue
+            scored[entity_id] = (
+                EXACT if name == query
+                else NAME_PREFIX if name.startswith(query)
+                else WORD_PREFIX
+            )
+        if not scored:
+            q_grams = trigrams(query)
+            shared: Dict[str, int] = {}
+            for gram in q_grams:
+                for entity_id in self._grams.get(gram, ()):
+                    shared[entity_id] = shared.get(entity_id, 0) + 1
+            for entity_id, count in shared.items():
+                row = self.entities.get(entity_id)
+                if row is None:
+                    continue
+                name = row["canonical_name"]
+                if query in name:
+                    scored[entity_id] = SUBSTRING
+                    continue
+                jaccard = count / (len(q_grams) + len(trigrams(name)) - count)
+                if jaccard >= _MIN_FUZZY_JACCARD:
+                    scored[entity_id] = FUZZY * jaccard
+        ranked = sorted(
+            scored.items(),
+            key=lambda item: (item[1], self.entities[item[0]].get("mention_count") or 0),
+            reverse=True,
+        )
+        return [(quality, self.entities[eid]) for eid, quality in ranked[:limit]]
+
+    def relations_of(self, entity_id: str) -> List[Tuple[str, str]]:
+        """[(relation, target display name)] from the snapshot."""
+        out = []
+        for rel in self.entities.get(entity_id, {}).get("relations") or []:
+            target = self.entities.get(rel["target_id"])
+            out.append((rel["relation"], target.get("display_name") if target else rel["target_id"]))
+        return out
@@ -0,0 +1,298 @@
+"""
+Shared LLM call policy — exponential backoff with jitter, Retry-After support,
+and a per-model circuit breaker that fails fast while upstream is unhealthy.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from app.utils.metrics import metrics
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while a model's breaker is open."""
+
+    def __init__(self, model: str, retry_in: float):
+        super().__init__(f"circuit open for {model} (retry in {retry_in:.1f}s)")
+        self.model = model
+        self.retry_in = retry_in
+
+
+# ── Error Classification ──────────────────────────────────────────────────────
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    return getattr(exc, "status_code", None)
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Parse `retry-after-ms` / `retry-after` from an API error's response."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms is not None:
+            return max(float(ms) / 1000.0, 0.0)
+        secs = headers.get("retry-after")
+        if secs is not None:
+            return max(float(secs), 0.0)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """429, 408/409, 5xx and transport errors are retryable; other 4xx are not."""
+    status = _status_code(exc)
+    if status is None:
+        # Connection errors, timeouts and malformed payloads
+        return not isinstance(exc, (ValueError, TypeError, KeyError))
+    return status in (408, 409, 429) or status >= 500
+
+
+# ── Retry Policy ──────────────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How many attempts to make and how long to wait between them."""
+
+    attempts: int = 2
+    base_delay: float = 0.25
+    max_delay: float = 4.0
+    # Retry-After hints longer than this fail fast instead of stalling the caller
+    max_retry_after: float = 5.0
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given 0-based attempt."""
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def delay_for(self, attempt: int, exc: BaseException) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to stop retrying."""
+        if attempt + 1 >= self.attempts or not is_retryable(exc):
+            return None
+        hinted = retry_after_seconds(exc)
+        if hinted is not None:
+            if hinted > self.max_retry_after:
+                return None
+            return hinted + random.uniform(0, self.base_delay)
+        return self.backoff(attempt)
+
+
+# ── Circuit Breaker ───────────────────────────────────────────────────────────
+
+class CircuitBreaker:
+    """Closed → open after N consecutive failures → half-open probe → closed."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 20.0,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.state = state
+            metrics.inc("llm_circuit_transitions_total", model=self.name, state=state)
+            metrics.set_gauge(
+                "llm_circuit_open", 1 if state == self.OPEN else 0, model=self.name
+            )
+            print(f"⚡ Circuit breaker [{self.name}] → {state}")
+
+    def allow(self) -> bool:
+        """Return True if a call may go upstream right now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() < self.opened_until:
+                    return False
+                self._transition(self.HALF_OPEN)
+            # Half-open: let exactly one probe through
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def retry_in(self) -> float:
+        return max(self.opened_until - time.monotonic(), 0.0)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._transition(self.CLOSED)
+
+    def record_failure(self, cooldown: Optional[float] = None):
+        """Count a failure; `cooldown` (e.g. Retry-After) extends the open window."""
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_until = time.monotonic() + max(
+                    self.reset_timeout, cooldown or 0.0
+                )
+                self._transition(self.OPEN)
+
+    def release_probe(self):
+        """Free the half-open probe slot without a verdict (cancelled / client error)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in_s": round(self.retry_in(), 1) if self.state == self.OPEN else 0,
+        }
+
+
+# ── Guarded Calls ─────────────────────────────────────────────────────────────
+
+class LLMCallGuard:
+    """Runs LLM calls through one breaker per model plus a retry policy."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 20.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self.breakers:
+                self.breakers[model] = CircuitBreaker(
+                    model, self.failure_threshold, self.reset_timeout
+                )
+            return self.breakers[model]
+
+    def _before_attempt(self, breaker: CircuitBreaker, op: str):
+        if not breaker.allow():
+            metrics.inc("llm_circuit_rejections_total", model=breaker.name, op=op)
+            raise CircuitOpenError(breaker.name, breaker.retry_in())
+
+    def _on_failure(
+        self, breaker: CircuitBreaker, policy: RetryPolicy, attempt: int,
+        exc: BaseException, op: str,
+    ) -> Optional[float]:
+        # Client errors (bad request, auth) say nothing about upstream health:
+        # neither a failure nor a successful probe, but the probe slot is freed
+        if is_retryable(exc):
+            breaker.record_failure(cooldown=retry_after_seconds(exc))
+        else:
+            breaker.release_probe()
+        delay = policy.delay_for(attempt, exc)
+        if delay is not None:
+            metrics.inc("llm_retries_total", model=breaker.name, op=op)
+        return delay
+
+    def _record(self, model: str, op: str, outcome: str, started: float, attempts: int):
+        metrics.inc("llm_calls_total", model=model, op=op, outcome=outcome)
+        metrics.observe(
+            "llm_call_duration_ms", (time.perf_counter() - started) * 1000,
+            model=model, op=op,
+        )
+        if attempts:
+            metrics.observe(
+                "llm_call_attempts", attempts, buckets=(1, 2, 3, 4, 5),
+                model=model, op=op,
+            )
+
+    def call(
+        self, fn: Callable[[], T], *, model: str, op: str, policy: RetryPolicy
+    ) -> T:
+        """Invoke `fn` with retries; raises the last error or CircuitOpenError."""
+        breaker = self.breaker(model)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                self._before_attempt(breaker, op)
+            except CircuitOpenError:
+                self._record(model, op, "circuit_open", started, attempt)
+                raise
+            try:
+                result = fn()
+            except Exception as exc:
+                delay = self._on_failure(breaker, policy, attempt, exc, op)
+                attempt += 1
+                if delay is None:
+                    self._record(model, op, "error", started, attempt)
+                    raise
+                print(
+                    f"⏳ LLM [{op}] {model} attempt {attempt} failed "
+                    f"({exc}); retrying in {delay:.2f}s"
+                )
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled mid-call: no verdict on upstream health, but a
+                # half-open probe must not stay claimed forever
+                breaker.release_probe()
+                self._record(model, op, "cancelled", started, attempt + 1)
+                raise
+            breaker.record_success()
+            self._record(model, op, "ok", started, attempt + 1)
+            return result
+
+    async def acall(
+        self, fn: Callable[[], Awaitable[T]], *, model: str, op: str,
+        policy: RetryPolicy,
+    ) -> T:
+        """Async twin of `call` — awaits `fn()` and sleeps without blocking the loop."""
+        breaker = self.breaker(model)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                self._before_attempt(breaker, op)
+            except CircuitOpenError:
+                self._record(model, op, "circuit_open", started, attempt)
+                raise
+            try:
+                result = await fn()
+            except Exception as exc:
+                delay = self._on_failure(breaker, policy, attempt, exc, op)
+                attempt += 1
+                if delay is None:
+                    self._record(model, op, "error", started, attempt)
+                    raise
+                print(
+                    f"⏳ LLM [{op}] {model} attempt {attempt} failed "
+                    f"({exc}); retrying in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled mid-call: no verdict on upstream health, but a
+                # half-open probe must not stay claimed forever
+                breaker.release_probe()
+                self._record(model, op, "cancelled", started, attempt + 1)
+                raise
+            breaker.record_success()
+            self._record(model, op, "ok", started, attempt + 1)
+            return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {m: b.snapshot() for m, b in self.breakers.items()}
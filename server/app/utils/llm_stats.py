@@ -0,0 +1,150 @@
+"""
+Per-call LLM instrumentation — wall time, queue wait, time-to-first-token,
+token usage and retry count for every BrainService call.
+The latest call's stats are readable from the current request context via
+`last_llm_call()` so routes can persist them with the matching session_logs row.
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from app.utils.metrics import metrics
+
+_TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000)
+
+_last_call: ContextVar[Optional["LLMCallStats"]] = ContextVar("last_llm_call", default=None)
+
+
+class LLMCallStats:
+    """Timing + usage for one logical LLM call (all retry attempts included)."""
+
+    __slots__ = (
+        "op", "model", "started", "dispatched", "first_token", "finished",
+        "attempts", "prompt_tokens", "completion_tokens", "upstream_queue_ms",
+        "outcome",
+    )
+
+    def __init__(self, op: str, model: str):
+        self.op = op
+        self.model = model
+        self.started = time.perf_counter()
+        self.dispatched: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.attempts = 0
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.upstream_queue_ms = 0.0
+        self.outcome = "pending"
+        _last_call.set(self)
+
+    # ── Recording ─────────────────────────────────────────────────────────────
+
+    def mark_dispatch(self):
+        """Called right before each upstream attempt is sent."""
+        self.attempts += 1
+        self.dispatched = time.perf_counter()
+
+    def mark_first_token(self):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def add_usage(self, usage):
+        """Copy token counts (and Groq's upstream queue_time) from a usage object."""
+        if usage is None:
+            return
+        self.prompt_tokens = getattr(usage, "prompt_tokens", None)
+        self.completion_tokens = getattr(usage, "completion_tokens", None)
+        queue_time = getattr(usage, "queue_time", None)
+        if queue_time:
+            self.upstream_queue_ms = queue_time * 1000
+
+    def finish(self, outcome: str = "ok"):
+        """Freeze timings and export histograms; idempotent."""
+        if self.finished is not None:
+            return
+        self.finished = time.perf_counter()
+        self.outcome = outcome
+        # Streams may start in a helper task; re-publish where they complete
+        _last_call.set(self)
+        labels = {"model": self.model, "op": self.op}
+        metrics.observe("llm_wall_ms", self.wall_ms, **labels)
+        metrics.observe("llm_queue_wait_ms", self.queue_ms, **labels)
+        if self.ttft_ms is not None:
+            metrics.observe("llm_ttft_ms", self.ttft_ms, **labels)
+        if self.prompt_tokens is not None:
+            metrics.observe("llm_prompt_tokens", self.prompt_tokens, _TOKEN_BUCKETS, **labels)
+        if self.completion_tokens is not None:
+            metrics.observe(
+                "llm_completion_tokens", self.completion_tokens, _TOKEN_BUCKETS, **labels
+            )
+
+    # ── Derived Values ────────────────────────────────────────────────────────
+
+    @property
+    def wall_ms(self) -> float:
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return (end - self.started) * 1000
+
+    @property
+    def queue_ms(self) -> float:
+        """Local wait before the final attempt (lease, failed tries, backoff) + upstream queue."""
+        local = ((self.dispatched or self.started) - self.started) * 1000
+        return local + self.upstream_queue_ms
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        if self.first_token is None:
+            return None
+        return (self.first_token - self.started) * 1000
+
+    @property
+    def retries(self) -> int:
+        return max(self.attempts - 1, 0)
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        if self.prompt_tokens is None and self.completion_tokens is None:
+            return None
+        return (self.prompt_tokens or 0) + (self.completion_tokens or 0)
+
+    def log_fields(self) -> dict:
+        """Columns for the session_logs row that carries this call's output (sql/session_logs.sql)."""
+        fields = {
+            "latency_ms": int(round(self.wall_ms)),
+            "model_used": self.model,
+            "queue_ms": int(round(self.queue_ms)),
+            "retries": self.retries,
+        }
+        if self.ttft_ms is not None:
+            fields["ttft_ms"] = int(round(self.ttft_ms))
+        if self.total_tokens is not None:
+            fields["tokens_used"] = self.total_tokens
+            fields["prompt_tokens"] = self.prompt_tokens
+            fields["completion_tokens"] = self.completion_tokens
+        return fields
+
+    def as_dict(self) -> dict:
+        return {
+            "op": self.op,
+            "model": self.model,
+            "outcome": self.outcome,
+            "wall_ms": round(self.wall_ms, 1),
+            "queue_ms": round(self.queue_ms, 1),
+            "ttft_ms": round(self.ttft_ms, 1) if self.ttft_ms is not None else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "retries": self.retries,
+        }
+
+
+def last_llm_call(*ops: str) -> Optional[LLMCallStats]:
+    """Stats of the most recent BrainService call in this context.
+
+    Pass `ops` to only accept a call made for one of those operations.
+    """
+    stats = _last_call.get()
+    if stats is None or (ops and stats.op not in ops):
+        return None
+    return stats
@@ -0,0 +1,136 @@
+"""
+In-process metrics registry — labelled counters and latency histograms.
+Exposed as JSON on GET /metrics; import `metrics` wherever you need to record.
+"""
+
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+# Millisecond buckets tuned for LLM / DB latencies (upper bounds, inclusive)
+DEFAULT_BUCKETS_MS: Tuple[float, ...] = (
+    25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000,
+)
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _render(name: str, key: _LabelKey) -> str:
+    if not key:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in key) + "}"
+
+
+class Histogram:
+    """Fixed-bucket histogram with count/sum and bucket-interpolated quantiles."""
+
+    __slots__ = ("buckets", "counts", "count", "total", "max")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot = +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                idx = i
+                break
+        self.counts[idx] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate quantile: upper bound of the bucket holding rank q."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "avg": round(self.total / self.count, 3) if self.count else None,
+            "max": round(self.max, 3),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {
+                **{str(b): c for b, c in zip(self.buckets, self.counts)},
+                "+Inf": self.counts[-1],
+            },
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe store of counters, gauges and histograms keyed by name + labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, _LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, _LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, _LabelKey], Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: Sequence[float] = DEFAULT_BUCKETS_MS,
+        **labels,
+    ):
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def histogram(self, name: str, **labels) -> Optional[dict]:
+        """Snapshot of a single histogram series, or None if never observed."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            return hist.snapshot() if hist else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": {
+                    _render(n, k): v for (n, k), v in sorted(self._counters.items())
+                },
+                "gauges": {
+                    _render(n, k): v for (n, k), v in sorted(self._gauges.items())
+                },
+                "histograms": {
+                    _render(n, k): h.snapshot()
+                    for (n, k), h in sorted(self._histograms.items())
+                },
+            }
+
+
+# Module-level singleton — import `metrics` anywhere
+metrics = MetricsRegistry()
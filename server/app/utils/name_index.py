@@ -0,0 +1,125 @@
+"""
+NameIndex — resident canonical-name index for one user's entities.
+Fuzzy dedup used to score a new name against every entity row with
+SequenceMatcher. Here names are blocked by padded character trigrams: only
+names sharing a trigram and within the length bound of the threshold are
+scored, and the same upper bounds as SequenceMatcher's real_quick_ratio /
+quick_ratio (length, character multiset) are checked from precomputed counts
+before building a matcher for the full ratio(). Matches are the same as a
+full scan with `SequenceMatcher(None, query, name).ratio() >= threshold`.
+"""
+
+import threading
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def _char_counts(name: str) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for ch in name:
+        counts[ch] = counts.get(ch, 0) + 1
+    return counts
+
+
+def trigrams(name: str) -> Set[str]:
+    """Padded character trigrams ("  a", " an", "ann", "nn ")."""
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """canonical_name → entity_id with trigram postings for fuzzy lookup."""
+
+    def __init__(self):
+        self._ids: Dict[str, str] = {}             # canonical → entity_id
+        self._names: Dict[str, str] = {}           # entity_id → canonical
+        self._rank: Dict[str, int] = {}            # canonical → insertion order
+        self._chars: Dict[str, Dict[str, int]] = {}  # canonical → character counts
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, canonical: str, entity_id: str):
+        with self._lock:
+            if canonical in self._ids:
+                self._names.pop(self._ids[canonical], None)
+            else:
+                self._rank[canonical] = self._seq
+                self._seq += 1
+                self._chars[canonical] = _char_counts(canonical)
+                for gram in trigrams(canonical):
+                    self._grams[gram].add(canonical)
+            self._ids[canonical] = entity_id
+            self._names[entity_id] = canonical
+
+    def remove_id(self, entity_id: str) -> bool:
+        with self._lock:
+            canonical = self._names.pop(entity_id, None)
+            if canonical is None:
+                return False
+            self._ids.pop(canonical, None)
+            self._rank.pop(canonical, None)
+            self._chars.pop(canonical, None)
+            for gram in trigrams(canonical):
+                names = self._grams.get(gram)
+                if names is not None:
+                    names.discard(canonical)
+                    if not names:
+                        del self._grams[gram]
+            return True
+
+    def get(self, canonical: str) -> Optional[str]:
+        return self._ids.get(canonical)
+
+    def _candidates(self, canonical: str, threshold: float) -> List[Tuple[int, str, str, dict]]:
+        """(rank, name, id, char counts) sharing a trigram and within the length bound, most shared grams first."""
+        n = len(canonical)
+        # ratio <= 2·min(n, m) / (n + m)  ⇒  m ∈ [n·t / (2 - t), n·(2 - t) / t]
+        lo, hi = n * threshold / (2 - threshold), n * (2 - threshold) / threshold
+        with self._lock:
+            shared: Dict[str, int] = {}
+            for gram in trigrams(canonical):
+                for name in self._grams.get(gram, ()):
+                    shared[name] = shared.get(name, 0) + 1
+            rank = self._rank
+            ordered = sorted(
+                (name for name in shared if lo <= len(name) <= hi),
+                key=lambda name: (-shared[name], rank[name]),
+            )
+            return [(rank[name], name, self._ids[name], self._chars[name]) for name in ordered]
+
+    def best_match(
+        self, canonical: str, threshold: float = 0.85,
+    ) -> Tuple[Optional[str], float, int]:
+        """(entity_id, ratio, candidates scored) of the most similar name at/above threshold."""
+        candidates = self._candidates(canonical, threshold)
+        matcher = SequenceMatcher(None, canonical)
+        query_chars = _char_counts(canonical)
+        n = len(canonical)
+        best_id, best_ratio, best_rank = None, 0.0, -1
+        for rank, name, entity_id, chars in candidates:
+            # Most-overlapping names come first, so the upper bounds prune the
+            # rest against an early best (real_quick_ratio, then quick_ratio)
+            floor = max(threshold, best_ratio)
+            total = n + len(name)
+            if 2.0 * min(n, len(name)) / total < floor:
+                continue
+            common = 0
+            for ch, count in chars.items():
+                have = query_chars.get(ch)
+                if have:
+                    common += count if count < have else have
+            if 2.0 * common / total < floor:
+                continue
+            matcher.set_seq2(name)
+            ratio = matcher.ratio()
+            if ratio < floor:
+                continue
+            # Ties go to the earlier-indexed name, as in the full scan
+            if ratio > best_ratio or rank < best_rank:
+                best_id, best_ratio, best_rank = entity_id, ratio, rank
+        return best_id, best_ratio, len(candidates)
@@ -0,0 +1,71 @@
+"""
+Lexicon sentiment + stress scoring for transcript turns.
+Messages are tokenized once into whole words that are looked up in a hash
+lexicon, so "good" no longer matches inside "goodbye"; punctuation (! ? - ...)
+is counted directly. Scores and labels follow the original inline rules in
+SessionService.log_message.
+"""
+
+import re
+from typing import Iterable, List, NamedTuple
+
+POSITIVE_WORDS = frozenset({
+    "great", "awesome", "good", "happy", "love",
+    "excited", "amazing", "perfect", "thanks", "glad",
+})
+NEGATIVE_WORDS = frozenset({
+    "bad", "angry", "hate", "terrible", "sad",
+    "frustrated", "annoyed", "worst", "failed", "mad",
+})
+FILLER_WORDS = frozenset({"um", "uh", "like", "literally"})
+
+_POS, _NEG, _FILLER = 0, 1, 2
+# word → category; one hash lookup per word
+_LEXICON = {
+    **{w: _POS for w in POSITIVE_WORDS},
+    **{w: _NEG for w in NEGATIVE_WORDS},
+    **{w: _FILLER for w in FILLER_WORDS},
+}
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_YOU_KNOW_RE = re.compile(r"\byou\s+know\b")
+
+
+class Sentiment(NamedTuple):
+    score: float   # -1.0 … 1.0
+    label: str     # positive|negative|neutral, optionally "_tense" / "_stressed"
+    stress: float  # 0.0 … 1.0
+
+
+def analyze(text: str) -> Sentiment:
+    """Score one message."""
+    lower = text.lower()
+    counts = [0, 0, 0]
+    lexicon = _LEXICON
+    for word in _WORD_RE.findall(lower):
+        cat = lexicon.get(word)
+        if cat is not None:
+            counts[cat] += 1
+    pos, neg, fillers = counts
+    if "know" in lower:
+        fillers += len(_YOU_KNOW_RE.findall(lower))
+    # Punctuation is plain character counting, same as before
+    arousal = text.count("!") + text.count("?")
+    hesitation = text.count("-") + text.count("...")
+
+    score, label = 0.0, "neutral"
+    if pos > neg:
+        score, label = min(0.4 * pos, 1.0), "positive"
+    elif neg > pos:
+        score, label = max(-0.4 * neg, -1.0), "negative"
+
+    stress = min(fillers * 0.2 + arousal * 0.1 + hesitation * 0.2, 1.0)
+    if stress > 0.5:
+        label += "_stressed"
+    elif stress > 0.2:
+        label += "_tense"
+    return Sentiment(score, label, stress)
+
+
+def analyze_batch(texts: Iterable[str]) -> List[Sentiment]:
+    """Score many messages (e.g. a saved session's turns) in one call."""
+    return [analyze(t or "") for t in texts]
@@ -0,0 +1,107 @@
+"""
+Speculative generation — start an LLM stream on stale-but-ready context while
+full context is still loading; restart only if the fresh context arrives before
+the first token and materially changes the prompt.
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Tuple
+
+from app.utils.metrics import metrics
+
+Context = Tuple[str, ...]
+
+
+def _fact_lines(ctx: Context) -> set:
+    return {
+        line.strip().lower()
+        for part in ctx
+        for line in (part or "").splitlines()
+        if line.strip()
+    }
+
+
+def context_overlap(a: Context, b: Context) -> float:
+    """Jaccard overlap of context lines (1.0 = identical facts)."""
+    la, lb = _fact_lines(a), _fact_lines(b)
+    if not la and not lb:
+        return 1.0
+    return len(la & lb) / len(la | lb)
+
+
+async def speculative_stream(
+    op: str,
+    start_stream: Callable[..., AsyncIterator[str]],
+    speculative_ctx: Context,
+    full_ctx: "asyncio.Future[Context]",
+    min_overlap: float = 0.6,
+) -> AsyncIterator[str]:
+    """
+    Yield tokens from `start_stream(*speculative_ctx)`, racing its first token
+    against `full_ctx`. Outcomes (recorded as `speculation_total{op,outcome}`):
+      - committed  first token beat full context; speculative answer kept
+      - confirmed  full context arrived first but was close enough; kept
+      - restarted  full context arrived first and differed; re-ran on it
+      - empty      speculative stream produced nothing (caller falls back)
+    """
+    started = time.perf_counter()
+    stream = start_stream(*speculative_ctx)
+    first = asyncio.ensure_future(stream.__anext__())
+    try:
+        done, _ = await asyncio.wait({first, full_ctx}, return_when=asyncio.FIRST_COMPLETED)
+
+        outcome = "committed"
+        fresh = (
+            first not in done
+            and not full_ctx.cancelled()
+            and full_ctx.exception() is None
+        )
+        if fresh:
+            overlap = context_overlap(speculative_ctx, full_ctx.result())
+            metrics.observe(
+                "speculation_context_overlap", overlap,
+                buckets=(0.2, 0.4, 0.6, 0.8, 0.9, 1.0), op=op,
+            )
+            if overlap < min_overlap:
+                outcome = "restarted"
+                first.cancel()
+                try:
+                    await first
+                except (asyncio.CancelledError, Exception):
+                    pass  # the speculative attempt is discarded, even if it failed
+                await stream.aclose()
+                stream = start_stream(*full_ctx.result())
+                first = asyncio.ensure_future(stream.__anext__())
+            else:
+                outcome = "confirmed"
+
+        try:
+            token = await first
+        except StopAsyncIteration:
+            metrics.inc("speculation_total", op=op, outcome="empty")
+            return
+
+        ttft_ms = (time.perf_counter() - started) * 1000
+        metrics.inc("speculation_total", op=op, outcome=outcome)
+        metrics.observe("speculation_ttft_ms", ttft_ms, op=op, outcome=outcome)
+        if outcome == "committed":
+            # How long the full-context path would still have made us wait
+            def _record_saved(fut):
+                if not fut.cancelled() and fut.exception() is None:
+                    saved = (time.perf_counter() - started) * 1000 - ttft_ms
+                    metrics.observe("speculation_saved_ms", max(saved, 0.0), op=op)
+            full_ctx.add_done_callback(_record_saved)
+
+        yield token
+        async for token in stream:
+            yield token
+    finally:
+        # Consumer stopped early (client disconnect) or we failed: free the stream
+        if not first.done():
+            first.cancel()
+            await asyncio.wait({first})
+        try:
+            await stream.aclose()
+        except Exception as e:
+            print(f"⚠️ Speculation [{op}]: closing stream failed: {e}")
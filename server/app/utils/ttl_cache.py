@@ -0,0 +1,77 @@
+"""
+Grouped TTL cache — entries live under a group key (e.g. a user_id) so a whole
+group can be invalidated at once. LRU-bounded by number of groups.
+`set` takes the fetch start time (from `token()`) so a slow fetch that began
+before an invalidation can't write its stale result back.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+from app.utils.metrics import metrics
+
+_MISSING = object()
+
+
+class GroupedTTLCache:
+    """`get/set(group, key)` with TTL, `invalidate(group)`, LRU over groups."""
+
+    def __init__(self, name: str, ttl_seconds: float = 300, max_groups: int = 1000):
+        self.name = name
+        self.ttl = ttl_seconds
+        self.max_groups = max_groups
+        self._groups: "OrderedDict[Hashable, Dict[Hashable, Tuple[float, Any]]]" = OrderedDict()
+        self._invalidated: Dict[Hashable, float] = {}  # group → last invalidation time
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def token() -> float:
+        """Take before fetching; pass to `set`."""
+        return time.monotonic()
+
+    def get(self, group: Hashable, key: Hashable, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entries = self._groups.get(group)
+            hit = entries.get(key, _MISSING) if entries else _MISSING
+            if hit is not _MISSING and hit[0] > now:
+                self._groups.move_to_end(group)
+                metrics.inc("cache_requests_total", cache=self.name, outcome="hit")
+                return hit[1]
+            if hit is not _MISSING:
+                del entries[key]
+        metrics.inc("cache_requests_total", cache=self.name, outcome="miss")
+        return default
+
+    def peek(self, group: Hashable, key: Hashable, default=None):
+        """Live value without counting a hit/miss or touching LRU order."""
+        with self._lock:
+            entries = self._groups.get(group)
+            hit = entries.get(key, _MISSING) if entries else _MISSING
+            if hit is not _MISSING and hit[0] > time.monotonic():
+                return hit[1]
+        return default
+
+    def set(self, group: Hashable, key: Hashable, value: Any, token: float = None):
+        with self._lock:
+            if token is not None and self._invalidated.get(group, float("-inf")) >= token:
+                return  # invalidated while the value was being fetched
+            self._groups.setdefault(group, {})[key] = (time.monotonic() + self.ttl, value)
+            self._groups.move_to_end(group)
+            while len(self._groups) > self.max_groups:
+                self._groups.popitem(last=False)
+
+    def invalidate(self, group: Hashable):
+        now = time.monotonic()
+        with self._lock:
+            self._groups.pop(group, None)
+            self._invalidated[group] = now
+            if len(self._invalidated) > self.max_groups:
+                # Only fetches still in flight care; anything older than a TTL is moot
+                cutoff = now - self.ttl
+                self._invalidated = {
+                    g: t for g, t in self._invalidated.items() if t > cutoff
+                }
+        metrics.inc("cache_invalidations_total", cache=self.name)
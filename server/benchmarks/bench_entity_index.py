@@ -0,0 +1,130 @@
+"""
+Equivalence check + latency benchmark for app.utils.name_index.
+
+Builds one user's worth of entity names (default 10k) and compares the
+trigram-blocked NameIndex against the original full scan from
+EntityService._find_fuzzy_match:
+  * every query must resolve to the same entity (or no match) in both;
+  * latency per lookup and the trigram-blocked candidate count are reported.
+Queries mix near-duplicates (typos, plurals, dropped/added letters) with names
+that are not in the index.
+
+Usage (from server/):
+    python -m benchmarks.bench_entity_index -e 10000 -q 200
+"""
+
+import argparse
+import random
+import string
+import time
+from difflib import SequenceMatcher
+
+from app.utils.name_index import NameIndex
+
+THRESHOLD = 0.85
+
+FIRST = [
+    "alex", "sara", "jordan", "maria", "li", "noah", "priya", "omar", "emma", "lucas",
+    "chen", "fatima", "diego", "hannah", "ivan", "aiko", "ben", "chloe", "david", "elena",
+]
+LAST = [
+    "smith", "garcia", "nguyen", "patel", "kim", "müller", "rossi", "silva", "cohen",
+    "okafor", "tanaka", "johansson", "dubois", "kowalski", "haddad", "moreau",
+]
+THINGS = [
+    "project", "budget review", "offsite", "team", "launch", "cafe", "gym", "clinic",
+    "roadmap", "hackathon", "book club", "apartment", "studio", "conference",
+]
+
+
+def make_names(n: int, rng: random.Random):
+    names = set()
+    while len(names) < n:
+        kind = rng.random()
+        if kind < 0.5:
+            name = f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+        elif kind < 0.8:
+            name = f"{rng.choice(LAST)} {rng.choice(THINGS)}"
+        else:
+            name = rng.choice(FIRST)
+        name += f" {rng.randint(1, n)}" if rng.random() < 0.7 else ""
+        names.add(name)
+    return sorted(names, key=lambda _: rng.random())
+
+
+def perturb(name: str, rng: random.Random) -> str:
+    op = rng.randrange(4)
+    i = rng.randrange(len(name))
+    if op == 0:
+        return name[:i] + name[i + 1:]
+    if op == 1:
+        return name[:i] + rng.choice(string.ascii_lowercase) + name[i:]
+    if op == 2:
+        return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+    return name + "s"
+
+
+def legacy_match(rows, canonical: str):
+    """Verbatim scan from the original _find_fuzzy_match (reference only)."""
+    best_id, best_ratio = None, 0.0
+    for ent in rows:
+        ratio = SequenceMatcher(None, canonical, ent["canonical_name"]).ratio()
+        if ratio > best_ratio:
+            best_ratio = ratio
+            best_id = ent["id"]
+    return best_id if best_ratio >= THRESHOLD else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-e", "--entities", type=int, default=10_000)
+    parser.add_argument("-q", "--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = make_names(args.entities, rng)
+    rows = [{"id": f"e{i}", "canonical_name": name} for i, name in enumerate(names)]
+
+    started = time.perf_counter()
+    index = NameIndex()
+    for row in rows:
+        index.add(row["canonical_name"], row["id"])
+    build_ms = (time.perf_counter() - started) * 1000
+
+    queries = [
+        perturb(rng.choice(names), rng) if rng.random() < 0.6
+        else f"{rng.choice(FIRST)} {rng.choice(THINGS)} {rng.randint(1, 99)}"
+        for _ in range(args.queries)
+    ]
+
+    started = time.perf_counter()
+    expected = [legacy_match(rows, q) for q in queries]
+    legacy_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = [index.best_match(q, THRESHOLD) for q in queries]
+    indexed_s = time.perf_counter() - started
+
+    mismatches = [
+        (q, exp, got[0]) for q, exp, got in zip(queries, expected, results) if exp != got[0]
+    ]
+    for q, exp, got in mismatches[:10]:
+        print(f"   ❌ {q!r}: full scan={exp} index={got}")
+    matched = sum(1 for e in expected if e)
+    scored = sum(r[2] for r in results) / len(results)
+
+    print(f"🧪 {len(queries)} queries over {len(rows):,} entities "
+          f"({matched} near-duplicates): "
+          f"{'PASS' if not mismatches else f'FAIL ({len(mismatches)} differ)'}")
+    print("\n📈 fuzzy lookup latency")
+    print(f"   index build        {build_ms:10.1f} ms")
+    print(f"   full scan          {legacy_s / len(queries) * 1000:10.3f} ms/lookup")
+    print(f"   trigram index      {indexed_s / len(queries) * 1000:10.3f} ms/lookup   "
+          f"({legacy_s / indexed_s:.0f}x, {scored:.0f} candidates/lookup)")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
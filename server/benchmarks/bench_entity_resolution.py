@@ -0,0 +1,146 @@
+"""
+Quality + latency report for entity resolution (lexical vs embedding mode).
+
+A small labeled sample of existing entities and incoming mentions — each
+mention is labeled with the entity it should resolve to, or None when it is a
+new entity — is resolved by:
+  * lexical:   the trigram NameIndex (SequenceMatcher ratio >= 0.85);
+  * embedding: lexical first, then EntityResolver's combined score
+               (cached name embeddings + trigram + token containment, type-blocked).
+Precision / recall / F1 of merges are reported for a sweep of thresholds, and
+latency is measured for a padded user of `-e` entities (matrix build and one
+batched resolution pass).
+
+Needs the real embedding model (settings.EMBEDDING_MODEL).
+
+Usage (from server/):
+    python -m benchmarks.bench_entity_resolution -e 10000
+"""
+
+import argparse
+import random
+import time
+
+from sentence_transformers import SentenceTransformer
+
+from app.config import settings
+from app.services.entity_resolver import EntityResolver, _UserVectors
+from app.utils.name_index import NameIndex
+
+# (canonical_name, entity_type) already stored for the user
+ENTITIES = [
+    ("ahmed khan", "person"), ("sara malik", "person"), ("omar farooq", "person"),
+    ("fatima zahra", "person"), ("john miller", "person"), ("emily chen", "person"),
+    ("imran khan", "person"), ("lahore university of management sciences", "organization"),
+    ("google", "organization"), ("city hospital", "place"), ("blue lagoon cafe", "place"),
+    ("product launch", "event"), ("quarterly budget review", "event"),
+    ("new york", "place"), ("my sister", "person"), ("macbook pro", "object"),
+]
+
+# (mention, type, expected canonical or None for a genuinely new entity)
+MENTIONS = [
+    ("dr. khan", "person", "ahmed khan"),
+    ("dr. ahmed khan", "person", "ahmed khan"),
+    ("sarah malik", "person", "sara malik"),
+    ("sara", "person", "sara malik"),
+    ("omar", "person", "omar farooq"),
+    ("mr. farooq", "person", "omar farooq"),
+    ("fatima", "person", "fatima zahra"),
+    ("johnny miller", "person", "john miller"),
+    ("emily", "person", "emily chen"),
+    ("lums", "organization", "lahore university of management sciences"),
+    ("google inc", "organization", "google"),
+    ("the city hospital", "place", "city hospital"),
+    ("blue lagoon", "place", "blue lagoon cafe"),
+    ("launch", "event", "product launch"),
+    ("budget review", "event", "quarterly budget review"),
+    ("nyc", "place", "new york"),
+    ("macbook", "object", "macbook pro"),
+    # new entities — merging any of these is a false positive
+    ("ali raza", "person", None),
+    ("dr. smith", "person", None),
+    ("hamza khan", "person", None),
+    ("microsoft", "organization", None),
+    ("central park", "place", None),
+    ("team offsite", "event", None),
+    ("iphone", "object", None),
+    ("my brother", "person", None),
+    ("sara's wedding", "event", None),
+    ("khan market", "place", None),
+]
+
+
+def evaluate(predicted, label: str):
+    tp = sum(1 for (_, _, exp), got in zip(MENTIONS, predicted) if exp and got == exp)
+    wrong = sum(1 for (_, _, exp), got in zip(MENTIONS, predicted) if got and got != exp)
+    positives = sum(1 for _, _, exp in MENTIONS if exp)
+    precision = tp / (tp + wrong) if tp + wrong else 1.0
+    recall = tp / positives
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    print(f"   {label:<22} P={precision:.2f}  R={recall:.2f}  F1={f1:.2f}  "
+          f"(merged {tp}/{positives}, wrong merges {wrong})")
+    return f1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-e", "--entities", type=int, default=10_000)
+    parser.add_argument("--show", action="store_true", help="print every decision")
+    args = parser.parse_args()
+
+    model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    ids = [name for name, _ in ENTITIES]
+
+    index = NameIndex()
+    for name in ids:
+        index.add(name, name)
+    lexical = [index.best_match(m, 0.85)[0] for m, _, _ in MENTIONS]
+
+    weights = tuple(float(w) for w in settings.ENTITY_EMBEDDING_WEIGHTS.split(","))
+    resolver = EntityResolver(weights=weights)
+    resolver.model = model
+    vectors = _UserVectors(resolver._encode(["_"]).shape[1])
+    vectors.append([(n, n, t) for n, t in ENTITIES], resolver._encode(ids))
+    combined = resolver.scores(vectors, [(m, t) for m, t, _ in MENTIONS])
+
+    print(f"🧪 Labeled sample: {len(ENTITIES)} entities, {len(MENTIONS)} mentions "
+          f"({sum(1 for *_, e in MENTIONS if e)} should merge)")
+    evaluate(lexical, "lexical (0.85)")
+    for threshold in (0.55, 0.6, 0.65, 0.7, 0.75, 0.8):
+        predicted = []
+        for qi, lex in enumerate(lexical):
+            col = combined[qi].argmax()
+            semantic = ids[col] if combined[qi, col] >= threshold else None
+            predicted.append(lex or semantic)
+        marker = "  ← configured" if abs(threshold - settings.ENTITY_EMBEDDING_THRESHOLD) < 1e-9 else ""
+        evaluate(predicted, f"embedding @ {threshold:.2f}{marker}")
+        if args.show and marker:
+            for (m, _, exp), got, row in zip(MENTIONS, predicted, combined):
+                flag = "✔" if got == exp else "✘"
+                print(f"      {flag} {m!r:>24} → {got!r} (best {row.max():.2f}, want {exp!r})")
+
+    # Latency on a padded user
+    rng = random.Random(5)
+    filler = [
+        (f"{rng.choice(['alex', 'maria', 'noah', 'priya', 'lucas'])} "
+         f"{rng.choice(['smith', 'garcia', 'patel', 'rossi', 'silva'])} {i}",
+         rng.choice(["person", "place", "organization", "event", "object", "concept"]))
+        for i in range(args.entities)
+    ]
+    started = time.perf_counter()
+    big = _UserVectors(vectors.emb.shape[1], capacity=args.entities)
+    big.append([(n, n, t) for n, t in filler], resolver._encode([n for n, _ in filler]))
+    build_s = time.perf_counter() - started
+
+    queries = [(m, t) for m, t, _ in MENTIONS[:8]]
+    started = time.perf_counter()
+    resolver.scores(big, queries)
+    pass_ms = (time.perf_counter() - started) * 1000
+    print(f"\n📈 {args.entities:,}-entity user")
+    print(f"   matrix build (one-off, cached)  {build_s:8.2f} s")
+    print(f"   resolve {len(queries)} names in one pass    {pass_ms:8.1f} ms "
+          f"({pass_ms / len(queries):.1f} ms/name)")
+
+
+if __name__ == "__main__":
+    main()
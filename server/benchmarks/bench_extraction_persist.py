@@ -0,0 +1,296 @@
+"""
+Atomicity check + round-trip count for EntityService's extraction writes.
+
+Runs the bulk persist path against a local sqlite stand-in for Supabase: a
+small PostgREST-style client (select / eq / in_ / insert / upsert / delete)
+plus the two RPCs from sql/entity_functions.sql, with `persist_extraction`
+executed in one sqlite transaction. Both write backends are compared:
+  * rpc:    one persist_extraction call (ENTITY_PERSIST_RPC=true);
+  * tables: one request per table, deleting new entities again on failure.
+For each backend the script persists a clean extraction (the resulting rows
+must match across backends), then one whose relation write fails halfway —
+optionally with the compensating deletes failing too — and reports the
+requests made and any rows left behind.
+
+Usage (from server/):
+    python -m benchmarks.bench_extraction_persist -e 30
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import string
+import threading
+
+import app.services.entity_service as entity_module
+from app.config import settings
+
+SCHEMA = """
+create table entities (
+    id text primary key, user_id text not null, canonical_name text not null,
+    display_name text, entity_type text, description text,
+    mention_count integer default 1, last_seen_at text
+);
+create table entity_attributes (
+    entity_id text not null references entities(id), attribute_key text not null,
+    attribute_value text, updated_at text, source_session text,
+    unique (entity_id, attribute_key)
+);
+create table entity_relations (
+    user_id text, source_id text not null references entities(id),
+    target_id text not null references entities(id), relation text not null,
+    updated_at text, source_session text,
+    unique (source_id, target_id, relation)
+);
+-- failure injection: any relation named 'explode' aborts the statement
+create trigger fail_relation before insert on entity_relations
+when new.relation = 'explode'
+begin select raise(abort, 'injected failure'); end;
+"""
+
+CONFLICT_KEYS = {
+    "entity_attributes": ("entity_id", "attribute_key"),
+    "entity_relations": ("source_id", "target_id", "relation"),
+}
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, db, table: str):
+        self.db, self.table = db, table
+        self.op, self.payload, self.columns = "select", None, "*"
+        self.filters, self.params = [], []
+
+    def select(self, columns: str = "*"):
+        self.op, self.columns = "select", columns
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: str = None):
+        self.op, self.payload = "upsert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append(f"{column} = ?")
+        self.params.append(value)
+        return self
+
+    def in_(self, column: str, values):
+        values = list(values)
+        self.filters.append(f"{column} in ({', '.join('?' * len(values))})")
+        self.params.extend(values)
+        return self
+
+    def execute(self) -> _Result:
+        with self.db.lock:
+            self.db.requests.append(f"{self.op} {self.table}")
+            if self.op == "delete" and self.db.fail_deletes:
+                raise RuntimeError("connection reset")
+            where = f" where {' and '.join(self.filters)}" if self.filters else ""
+            cur = self.db.conn.cursor()
+            if self.op == "select":
+                cur.execute(f"select {self.columns} from {self.table}{where}", self.params)
+                names = [d[0] for d in cur.description]
+                return _Result([dict(zip(names, row)) for row in cur.fetchall()])
+            # Each write request is one statement: all rows or none
+            cur.execute("begin")
+            try:
+                if self.op == "delete":
+                    cur.execute(f"delete from {self.table}{where}", self.params)
+                else:
+                    _write_rows(cur, self.table, self.payload, upsert=self.op == "upsert")
+            except Exception:
+                cur.execute("rollback")
+                raise
+            cur.execute("commit")
+            return _Result([] if self.op == "delete" else self.payload)
+
+
+def _write_rows(cur, table: str, rows, upsert: bool):
+    """Multi-row insert / upsert (PostgREST: uniform keys per request)."""
+    if not rows:
+        return
+    columns = list(rows[0])
+    sql = f"insert into {table} ({', '.join(columns)}) values ({', '.join('?' * len(columns))})"
+    if upsert:
+        keys = CONFLICT_KEYS[table]
+        updates = [c for c in columns if c not in keys]
+        sql += f" on conflict ({', '.join(keys)}) do update set " + ", ".join(
+            f"{c} = excluded.{c}" for c in updates
+        )
+    cur.executemany(sql, [[row.get(c) for c in columns] for row in rows])
+
+
+class _Rpc:
+    def __init__(self, db, name: str, params: dict):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self) -> _Result:
+        with self.db.lock:
+            self.db.requests.append(f"rpc {self.name}")
+            if self.name not in self.db.functions:
+                raise RuntimeError(f"PGRST202: Could not find the function public.{self.name}")
+            # One transaction per call, like a Postgres function
+            cur = self.db.conn.cursor()
+            cur.execute("begin")
+            try:
+                data = getattr(self, "_" + self.name)(cur)
+            except Exception:
+                cur.execute("rollback")
+                raise
+            cur.execute("commit")
+            return _Result(data)
+
+    def _persist_extraction(self, cur):
+        p = json.loads(json.dumps(self.params))  # jsonb round-trip
+        _write_rows(cur, "entities", p["p_entities"], upsert=False)
+        _write_rows(cur, "entity_attributes", _uniform(p["p_attributes"]), upsert=True)
+        _write_rows(cur, "entity_relations", _uniform(p["p_relations"]), upsert=True)
+        return {k[2:]: len(p[k]) for k in ("p_entities", "p_attributes", "p_relations")}
+
+    def _bump_entity_mentions(self, cur):
+        for u in self.params["updates"]:
+            cur.execute(
+                "update entities set mention_count = coalesce(mention_count, 1) + ?, "
+                "last_seen_at = max(coalesce(last_seen_at, ''), ?) where id = ?",
+                (u["delta"], u["last_seen_at"], u["id"]),
+            )
+
+
+def _uniform(rows):
+    """jsonb_populate_recordset leaves absent keys null."""
+    keys = sorted({k for row in rows for k in row})
+    return [{k: row.get(k) for k in keys} for row in rows]
+
+
+class SqliteDB:
+    """In-memory stand-in for the Supabase client used by EntityService."""
+
+    def __init__(self, functions=("persist_extraction", "bump_entity_mentions")):
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        self.conn.execute("pragma foreign_keys = on")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.RLock()
+        self.functions = set(functions)
+        self.requests = []
+        self.fail_deletes = False
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: dict) -> _Rpc:
+        return _Rpc(self, name, params)
+
+    def state(self):
+        """Rows keyed by canonical names (ids differ between runs)."""
+        names = dict(self.conn.execute("select id, canonical_name from entities"))
+        return {
+            "entities": sorted(
+                self.conn.execute(
+                    "select canonical_name, display_name, entity_type, description from entities"
+                )
+            ),
+            "attributes": sorted(
+                (names[e], k, v) for e, k, v in self.conn.execute(
+                    "select entity_id, attribute_key, attribute_value from entity_attributes")
+            ),
+            "relations": sorted(
+                (names[s], names[t], r) for s, t, r in self.conn.execute(
+                    "select source_id, target_id, relation from entity_relations")
+            ),
+        }
+
+
+def _names(n: int, seed: int = 3):
+    """Random names far enough apart that fuzzy dedup keeps them separate."""
+    rng = random.Random(seed)
+    return [
+        " ".join("".join(rng.choices(string.ascii_lowercase, k=7)) for _ in range(2)).title()
+        for _ in range(n)
+    ]
+
+
+def make_extraction(n: int, poison: bool = False) -> dict:
+    people, projects = _names(n), _names(5, seed=4)
+    entities = [
+        {
+            "name": people[i],
+            "type": "person",
+            "description": f"colleague #{i}",
+            "attributes": {"team": f"team {i % 4}", "city": f"city {i % 7}"},
+        }
+        for i in range(n)
+    ]
+    relations = [
+        {"source": people[i], "target": projects[i % 5], "relation": "works_on"}
+        for i in range(n)
+    ]
+    if poison:
+        relations.append({"source": people[0], "target": people[1], "relation": "explode"})
+    return {"entities": entities, "relations": relations}
+
+
+def run(backend: str, extraction: dict, fail_deletes: bool = False):
+    db = SqliteDB(() if backend == "tables" else ("persist_extraction", "bump_entity_mentions"))
+    entity_module.db = db
+    svc = entity_module.EntityService()
+    svc.mentions.flush_interval = 3600  # flushed explicitly below
+    db.fail_deletes = fail_deletes
+    svc.persist_extraction("bench-user", extraction, source_session="bench-session")
+    requests = [r for r in db.requests if "bump_entity_mentions" not in r]
+    db.fail_deletes = False
+    svc.close()
+    return db, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-e", "--entities", type=int, default=30)
+    args = parser.parse_args()
+    settings.ENTITY_BULK_PERSIST = True
+    settings.ENTITY_PERSIST_RPC = True
+
+    clean = make_extraction(args.entities)
+    poisoned = make_extraction(args.entities, poison=True)
+    failed = False
+
+    print(f"🧪 Extraction: {args.entities} people, {len(clean['relations'])} relations")
+    states = {}
+    for backend in ("rpc", "tables"):
+        db, requests = run(backend, clean)
+        states[backend] = db.state()
+        print(f"   {backend:<7} clean        {len(requests):3d} requests  "
+              f"{len(states[backend]['entities'])} entities, "
+              f"{len(states[backend]['attributes'])} attributes, "
+              f"{len(states[backend]['relations'])} relations")
+    same = states["rpc"] == states["tables"]
+    failed |= not same
+    print(f"   rows identical across backends: {'PASS' if same else 'FAIL'}")
+
+    print("\n🧪 Relation write fails halfway")
+    for backend, fail_deletes in (("rpc", False), ("tables", False), ("tables", True)):
+        db, requests = run(backend, poisoned, fail_deletes)
+        left = db.state()
+        leftover = sum(len(rows) for rows in left.values())
+        label = f"{backend}{' + failing cleanup' if fail_deletes else ''}"
+        print(f"   {label:<26} {len(requests):3d} requests  {leftover} rows left behind")
+        if backend == "rpc" and leftover:
+            failed = True
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Throughput / tail-latency benchmark for the wingman and consultant pipelines.
+
+Runs the real FastAPI app in-process against the fake LLM backend, so no Groq
+quota is spent. Latency and error injection are controlled by FAKE_LLM_* env
+vars (see app/config.py).
+
+Usage (from server/):
+    python -m benchmarks.bench_pipeline --endpoint wingman -n 200 -c 20
+    FAKE_LLM_LATENCY_MS=300 FAKE_LLM_ERROR_RATE=0.05 \\
+        python -m benchmarks.bench_pipeline --endpoint consultant_stream
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import httpx  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.utils.metrics import metrics  # noqa: E402
+from app.utils.rate_limit import limiter  # noqa: E402
+
+_TRANSCRIPTS = [
+    "Sara said the budget review with Omar moved to next Friday 3pm.",
+    "I think we should um maybe talk about the launch plan?",
+    "Honestly I'm frustrated, the demo failed again yesterday!",
+    "Ali mentioned he is moving to Lahore for a new job at Acme.",
+    "That sounds great, thanks for sharing, I'm really excited.",
+]
+
+_ENDPOINTS = {
+    "wingman": ("/v1/process_transcript_wingman", False),
+    "wingman_stream": ("/v1/process_transcript_wingman_stream", True),
+    "consultant": ("/v1/ask_consultant", False),
+    "consultant_stream": ("/v1/ask_consultant_stream", True),
+}
+
+
+def _payload(endpoint: str, i: int, session_id: str) -> dict:
+    text = _TRANSCRIPTS[i % len(_TRANSCRIPTS)]
+    if endpoint.startswith("wingman"):
+        return {
+            "user_id": f"bench-user-{i % 10}",
+            "transcript": text,
+            "session_id": session_id,
+            "speaker_role": "others",
+        }
+    return {
+        "user_id": f"bench-user-{i % 10}",
+        "question": f"What should I know about this? {text}",
+        "session_id": session_id,
+    }
+
+
+async def _one(client, endpoint: str, i: int, session_id: str):
+    path, streaming = _ENDPOINTS[endpoint]
+    started = time.perf_counter()
+    ttft = None
+    if streaming:
+        async with client.stream("POST", path, json=_payload(endpoint, i, session_id)) as r:
+            async for line in r.aiter_lines():
+                if ttft is None and '"token"' in line:
+                    ttft = time.perf_counter() - started
+            ok = r.status_code == 200
+    else:
+        r = await client.post(path, json=_payload(endpoint, i, session_id))
+        ok = r.status_code == 200
+    return ok, time.perf_counter() - started, ttft
+
+
+def _pct(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] * 1000
+
+
+async def run(endpoint: str, total: int, concurrency: int):
+    limiter.enabled = False
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=120
+    ) as client:
+        session = await client.post(
+            "/v1/start_session", json={"user_id": "bench-user-0"}
+        )
+        session_id = session.json()["session_id"]
+
+        sem = asyncio.Semaphore(concurrency)
+
+        async def bounded(i):
+            async with sem:
+                return await _one(client, endpoint, i, session_id)
+
+        wall = time.perf_counter()
+        results = await asyncio.gather(*(bounded(i) for i in range(total)))
+        wall = time.perf_counter() - wall
+
+    latencies = [lat for ok, lat, _ in results if ok]
+    ttfts = [t for ok, _, t in results if ok and t is not None]
+    errors = sum(1 for ok, _, _ in results if not ok)
+
+    print(f"\n📈 {endpoint}: {total} requests, concurrency {concurrency}")
+    print(f"   throughput   {total / wall:8.1f} req/s   (wall {wall:.2f}s, errors {errors})")
+    if latencies:
+        print(
+            f"   latency ms   p50 {_pct(latencies, .5):7.1f}  p95 {_pct(latencies, .95):7.1f}"
+            f"  p99 {_pct(latencies, .99):7.1f}  mean {statistics.mean(latencies) * 1000:7.1f}"
+        )
+    if ttfts:
+        print(
+            f"   ttft ms      p50 {_pct(ttfts, .5):7.1f}  p95 {_pct(ttfts, .95):7.1f}"
+            f"  p99 {_pct(ttfts, .99):7.1f}"
+        )
+    snap = metrics.snapshot()
+    llm = {k: v for k, v in snap["counters"].items() if k.startswith("llm_calls_total")}
+    for name, value in sorted(llm.items()):
+        print(f"   {name} = {value:g}")
+    for name, hist in sorted(snap["histograms"].items()):
+        if name.startswith(("llm_wall_ms", "llm_queue_wait_ms", "llm_ttft_ms")):
+            print(f"   {name}  p50 {hist['p50']}  p95 {hist['p95']}  n {hist['count']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--endpoint", choices=sorted(_ENDPOINTS), default="wingman")
+    parser.add_argument("-n", "--requests", type=int, default=100)
+    parser.add_argument("-c", "--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.endpoint, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
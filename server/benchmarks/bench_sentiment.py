@@ -0,0 +1,140 @@
+"""
+Golden-set check + throughput benchmark for app.utils.sentiment.
+
+Compares the compiled lexicon scorer against the original inline substring
+implementation from SessionService.log_message:
+  * GOLDEN messages must get identical labels from both;
+  * BOUNDARY messages are where the old substring matching was wrong
+    ("goodbye" ⊃ "good", "made" ⊃ "mad") and only the new labels are expected;
+  * throughput is reported in messages/second for both, single and batch.
+
+Usage (from server/):
+    python -m benchmarks.bench_sentiment -n 200000
+"""
+
+import argparse
+import random
+import time
+
+from app.utils.sentiment import analyze, analyze_batch
+
+# (message, expected label)
+GOLDEN = [
+    ("That sounds great, thanks for sharing.", "positive"),
+    ("I'm really excited about the launch!", "positive"),
+    ("Perfect. Glad we sorted it out.", "positive"),
+    ("Honestly I'm frustrated, the demo failed again yesterday!", "negative"),
+    ("This is the worst meeting, I hate it.", "negative"),
+    ("He was angry and annoyed after the call.", "negative"),
+    ("Sara said the budget review moved to next Friday.", "neutral"),
+    ("Can you send me the file?", "neutral"),
+    ("Ok.", "neutral"),
+    ("", "neutral"),
+    ("Good news - bad news - which first?", "neutral_tense"),
+    ("Wait... what? Really?!", "neutral_tense"),
+    ("I think we should um maybe, you know, talk about it?", "neutral_tense"),
+    ("Um, uh, I literally don't know... sorry - it's hard", "neutral_stressed"),
+    ("Great! Amazing! Awesome!", "positive_tense"),
+    ("We failed, it's terrible, I'm so sad... really mad!", "negative_tense"),
+    ("I love it but I hate the price.", "neutral"),
+    ("Good good good great", "positive"),
+    ("Thanks! Is it ready? Send it now!", "positive_tense"),
+    ("So, you know, it was like, um, fine?", "neutral_stressed"),
+]
+
+# Substring false positives in the old implementation: (message, new label)
+BOUNDARY = [
+    ("Goodbye everyone, see you Monday.", "neutral"),
+    ("I made the slides yesterday.", "neutral"),
+    ("The goods arrived on time.", "neutral"),
+    ("Please grab an umbrella, it's likely to rain.", "neutral"),
+    ("She was saddened by the news.", "neutral"),
+]
+
+
+def legacy_analyze(content: str):
+    """Verbatim copy of the original inline scoring (reference only)."""
+    sentiment_score = 0.0
+    sentiment_label = "neutral"
+    lower_content = content.lower()
+    positive_words = [
+        "great", "awesome", "good", "happy", "love",
+        "excited", "amazing", "perfect", "thanks", "glad",
+    ]
+    negative_words = [
+        "bad", "angry", "hate", "terrible", "sad",
+        "frustrated", "annoyed", "worst", "failed", "mad",
+    ]
+    pos_count = sum(lower_content.count(w) for w in positive_words)
+    neg_count = sum(lower_content.count(w) for w in negative_words)
+    if pos_count > neg_count:
+        sentiment_score = min(0.4 * pos_count, 1.0)
+        sentiment_label = "positive"
+    elif neg_count > pos_count:
+        sentiment_score = max(-0.4 * neg_count, -1.0)
+        sentiment_label = "negative"
+    fillers = [" um", " uh", " like", " literally", " you know"]
+    filler_count = sum(lower_content.count(f) for f in fillers)
+    arousal = content.count("!") + content.count("?")
+    hesitation = content.count("-") + content.count("...")
+    stress_level = min(
+        (filler_count * 0.2) + (arousal * 0.1) + (hesitation * 0.2), 1.0
+    )
+    if stress_level > 0.5:
+        sentiment_label += "_stressed"
+    elif stress_level > 0.2:
+        sentiment_label += "_tense"
+    return sentiment_score, sentiment_label
+
+
+def check_golden() -> bool:
+    ok = True
+    for text, expected in GOLDEN:
+        new, old = analyze(text).label, legacy_analyze(text)[1]
+        if not (new == old == expected):
+            ok = False
+            print(f"   ❌ {text!r}: new={new} legacy={old} expected={expected}")
+    for text, expected in BOUNDARY:
+        new, old = analyze(text).label, legacy_analyze(text)[1]
+        if new != expected:
+            ok = False
+            print(f"   ❌ {text!r}: new={new} expected={expected}")
+        else:
+            print(f"   ✔ boundary fix {text!r}: legacy={old} → {new}")
+    print(f"🧪 Golden set: {len(GOLDEN)} identical, {len(BOUNDARY)} boundary cases — "
+          f"{'PASS' if ok else 'FAIL'}")
+    return ok
+
+
+def _rate(fn, messages) -> float:
+    started = time.perf_counter()
+    fn(messages)
+    return len(messages) / (time.perf_counter() - started)
+
+
+def bench(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    corpus = [t for t, _ in GOLDEN + BOUNDARY if t]
+    messages = [
+        " ".join(rng.choice(corpus) for _ in range(rng.randint(1, 4))) for _ in range(n)
+    ]
+    legacy = _rate(lambda ms: [legacy_analyze(m) for m in ms], messages)
+    single = _rate(lambda ms: [analyze(m) for m in ms], messages)
+    batch = _rate(analyze_batch, messages)
+    print(f"\n📈 sentiment throughput over {n} messages")
+    print(f"   legacy substring   {legacy:12,.0f} msgs/s")
+    print(f"   lexicon analyze    {single:12,.0f} msgs/s   ({single / legacy:.2f}x)")
+    print(f"   lexicon batch      {batch:12,.0f} msgs/s   ({batch / legacy:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", "--messages", type=int, default=100_000)
+    args = parser.parse_args()
+    if not check_golden():
+        raise SystemExit(1)
+    bench(args.messages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+-- Server-side helpers for EntityService (Supabase / Postgres).
+-- Apply in the Supabase SQL editor; the API falls back to plain table
+-- requests when a function is missing.
+
+-- ── bump_entity_mentions ────────────────────────────────────────────────────
+-- Apply aggregated mention increments in one statement. Increments are added
+-- in place (no read-modify-write), last_seen_at only moves forward.
+-- updates: [{"id": uuid, "delta": int, "last_seen_at": timestamp}, ...]
+create or replace function bump_entity_mentions(updates jsonb)
+returns void
+language sql
+as $$
+  update entities e
+     set mention_count = coalesce(e.mention_count, 1) + (u->>'delta')::int,
+         last_seen_at  = greatest(e.last_seen_at, (u->>'last_seen_at')::timestamptz)
+    from jsonb_array_elements(updates) as u
+   where e.id = (u->>'id')::uuid;
+$$;
+
+-- ── persist_extraction ──────────────────────────────────────────────────────
+-- Write one extraction in a single transaction: new entities (ids assigned by
+-- the client), attribute upserts and relation upserts. Any error rolls back
+-- the whole payload, so a failed call leaves no partial state to clean up.
+-- Rows use the same keys as the table requests; missing keys are null.
+-- p_entities:   [{"id", "user_id", "canonical_name", "display_name", "entity_type", "description"}]
+-- p_attributes: [{"entity_id", "attribute_key", "attribute_value", "updated_at", "source_session"?}]
+-- p_relations:  [{"user_id", "source_id", "target_id", "relation", "updated_at", "source_session"?}]
+create or replace function persist_extraction(
+  p_entities jsonb, p_attributes jsonb, p_relations jsonb
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  n_entities   int;
+  n_attributes int;
+  n_relations  int;
+begin
+  insert into entities (id, user_id, canonical_name, display_name, entity_type, description)
+  select id, user_id, canonical_name, display_name, entity_type, description
+    from jsonb_populate_recordset(null::entities, p_entities);
+  get diagnostics n_entities = row_count;
+
+  insert into entity_attributes (entity_id, attribute_key, attribute_value, updated_at, source_session)
+  select entity_id, attribute_key, attribute_value, updated_at, source_session
+    from jsonb_populate_recordset(null::entity_attributes, p_attributes)
+  on conflict (entity_id, attribute_key) do update
+     set attribute_value = excluded.attribute_value,
+         updated_at      = excluded.updated_at,
+         source_session  = coalesce(excluded.source_session, entity_attributes.source_session);
+  get diagnostics n_attributes = row_count;
+
+  insert into entity_relations (user_id, source_id, target_id, relation, updated_at, source_session)
+  select user_id, source_id, target_id, relation, updated_at, source_session
+    from jsonb_populate_recordset(null::entity_relations, p_relations)
+  on conflict (source_id, target_id, relation) do update
+     set updated_at     = excluded.updated_at,
+         source_session = coalesce(excluded.source_session, entity_relations.source_session);
+  get diagnostics n_relations = row_count;
+
+  return jsonb_build_object(
+    'entities', n_entities, 'attributes', n_attributes, 'relations', n_relations
+  );
+end;
+$$;
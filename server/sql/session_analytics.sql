@@ -0,0 +1,36 @@
+-- Columns for the running session metrics kept by SessionService
+-- (app/services/session_metrics.py). Rows are upserted on session_id while a
+-- session is live, so GET /session_analytics reads a single row.
+-- Apply in the Supabase SQL editor.
+
+alter table session_analytics
+  add column if not exists talk_time_user_seconds    double precision,
+  add column if not exists talk_time_others_seconds  double precision,
+  add column if not exists longest_monologue_seconds double precision,
+  add column if not exists user_filler_count         integer,
+  add column if not exists mutual_engagement_score   double precision,
+  add column if not exists sentiment_trend           jsonb;
+
+-- Upserts use on_conflict=session_id
+create unique index if not exists session_analytics_session_id_key
+  on session_analytics (session_id);
+
+-- ── session_analytics_inputs ────────────────────────────────────────────────
+-- Everything an end-of-session analytics job reads besides the transcript,
+-- in one round-trip: session timestamps and memory / event / highlight counts.
+create or replace function session_analytics_inputs(p_session_id uuid, p_user_id uuid)
+returns jsonb
+language sql
+stable
+as $$
+  select jsonb_build_object(
+    'created_at',         s.created_at,
+    'ended_at',           s.ended_at,
+    'memories_saved',     (select count(*) from memory m
+                            where m.user_id = p_user_id and m.session_id = p_session_id),
+    'events_extracted',   (select count(*) from events e where e.session_id = p_session_id),
+    'highlights_created', (select count(*) from highlights h where h.session_id = p_session_id)
+  )
+  from (select 1) as one
+  left join sessions s on s.id = p_session_id;
+$$;
@@ -0,0 +1,14 @@
+-- Per-call LLM stats on the session_logs row that carries the call's output
+-- (LLMCallStats.log_fields in app/utils/llm_stats.py), so wall time, queue
+-- wait, TTFT, token split and retries can be joined to the turn they served.
+-- Apply in the Supabase SQL editor before deploying.
+
+alter table session_logs
+  add column if not exists latency_ms        integer,
+  add column if not exists model_used        text,
+  add column if not exists tokens_used       integer,
+  add column if not exists queue_ms          integer,
+  add column if not exists ttft_ms           integer,
+  add column if not exists retries           integer,
+  add column if not exists prompt_tokens     integer,
+  add column if not exists completion_tokens integer;